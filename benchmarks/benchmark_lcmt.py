@@ -0,0 +1,194 @@
+"""Benchmarks of the LCMT hot paths on a plain machine, without Maya.
+
+	python benchmarks/benchmark_lcmt.py [--scales 10,1000,100000] [--names keyword]
+	                                    [--only renderAllLights] [--update-thresholds]
+
+Every benchmark builds a synthetic scene with the stand-in maya.cmds of this
+folder (N lights, N geometry shapes), creates a new LCMT, warms up its scene
+index and then times one action while counting the cmds calls it makes.
+The results are checked against thresholds.json: the call counts are exact
+(the stand-in is deterministic) and gate the run, the times depend on the
+machine and its load so going over them is only reported, unless
+--check-seconds is given. Exits with 1 when something regressed."""
+
+import argparse
+import imp
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+folder = os.path.dirname(os.path.abspath(__file__))
+#the stand-in maya package has to be found before anything imports maya
+sys.path.insert(0, folder)
+
+from maya import cmds
+
+toolPath = os.path.join(os.path.dirname(folder), 'lcmtv_current_release.py')
+thresholdsPath = os.path.join(folder, 'thresholds.json')
+
+
+class Silence(object):
+	"""LCMT prints every step, keep it out of the benchmark output."""
+
+	def __enter__(self):
+		self.stdout = sys.stdout
+		sys.stdout = open(os.devnull, 'w')
+
+	def __exit__(self, *args):
+		sys.stdout.close()
+		sys.stdout = self.stdout
+
+
+def loadTool():
+	with Silence():
+		module = imp.load_source('lcmt_benchmark_target', toolPath)
+	return module.LCMT
+
+#--- benchmarks: each one prepares the tool and returns the action to time ---
+
+
+def groupLightsByName(tool):
+	lights = tool.sceneIndex.getLights()
+	return lambda: tool.groupLightsByName(lights)
+
+
+def createLayersFromLights(tool):
+	return lambda: tool.createLayersFromLights()
+
+
+def createRenderElementsFromLights(tool):
+	return lambda: tool.createRenderElementsFromLights()
+
+
+def changeLightParams(tool):
+	lights = tool.sceneIndex.getLights()
+	return lambda: tool.changeLightParams(None, None, 'intensity', '*1.1', lights=lights)
+
+
+def updateScollList(tool):
+	listName = tool.virtualList()
+
+	def update():
+		tool.updateScollList(True, listName)
+		tool.updateScollList(False, listName)
+	return update
+
+
+def renderAllLights(tool):
+	#every contribution is rendered, the render cache would skip them after the first run
+	tool.useRenderCache = False
+	lights = tool.sceneIndex.getLights(visibleOnly=True)
+	return lambda: tool.renderAllLights(lights)
+
+benchmarks = [groupLightsByName, createLayersFromLights, createRenderElementsFromLights,
+			changeLightParams, updateScollList, renderAllLights]
+
+
+def run(toolClass, benchmark, scale, names, project, repeat):
+	best = None
+	for attempt in range(repeat):
+		if os.path.exists(project):
+			shutil.rmtree(project)
+		cmds.newScene(lights=scale, geometry=scale, names=names, project=project)
+		with Silence():
+			tool = toolClass()
+			tool.sceneIndex.getLights()
+			tool.sceneIndex.getLights(visibleOnly=True)
+			tool.sceneIndex.getGeometry()
+			action = benchmark(tool)
+			cmds.scene.calls.clear()
+			start = time.time()
+			action()
+			seconds = time.time() - start
+		if best == None or seconds < best['seconds']:
+			best = {'seconds': seconds, 'calls': sum(cmds.scene.calls.values()), 'commands': dict(cmds.scene.calls)}
+	return best
+
+
+def check(result, threshold, checkSeconds=False):
+	#(regressions, warnings) against the threshold of that benchmark and scale, the seconds are
+	#only a warning unless checkSeconds
+	failures = []
+	warnings = []
+	if threshold == None:
+		return failures, warnings
+	if result['calls'] > threshold['calls']:
+		failures.append('%d cmds calls, threshold %d' % (result['calls'], threshold['calls']))
+	if result['seconds'] > threshold['seconds']:
+		if checkSeconds:
+			failures.append('%.3fs, threshold %.3fs' % (result['seconds'], threshold['seconds']))
+		else:
+			warnings.append('%.3fs, threshold %.3fs' % (result['seconds'], threshold['seconds']))
+	return failures, warnings
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Benchmarks of LCMT on a synthetic scene, without Maya')
+	parser.add_argument('--scales', default='10,1000,100000', help='comma separated numbers of lights (and geometry shapes)')
+	parser.add_argument('--names', default='keyword', choices=['keyword', 'unique', 'mixed'], help='name distribution of the lights')
+	parser.add_argument('--only', default='', help='comma separated benchmarks to run')
+	parser.add_argument('--repeat', type=int, default=3, help='runs of the scales up to 1000, the fastest one is kept')
+	parser.add_argument('--thresholds', default=thresholdsPath)
+	parser.add_argument('--update-thresholds', action='store_true', help='write the results as the new thresholds')
+	parser.add_argument('--slack', type=float, default=3.0, help='times given to the measured seconds with --update-thresholds')
+	parser.add_argument('--check-seconds', action='store_true', help='fail when a time is over its threshold too, not only the calls')
+	parser.add_argument('--verbose', action='store_true', help='print the calls of every cmds command')
+	args = parser.parse_args(argv)
+
+	scales = [int(scale) for scale in args.scales.split(',')]
+	selected = [benchmark for benchmark in benchmarks if not args.only or benchmark.__name__ in args.only.split(',')]
+	thresholds = dict()
+	if os.path.exists(args.thresholds):
+		thresholds = json.load(open(args.thresholds))
+	#the thresholds were measured with the keyword names, other distributions are only reported
+	checked = args.names == 'keyword' and not args.update_thresholds
+
+	toolClass = loadTool()
+	project = tempfile.mkdtemp(prefix='lcmt_benchmark_')
+	regressions = []
+	try:
+		print '%-32s %8s %10s %12s' % ('benchmark', 'lights', 'seconds', 'cmds calls')
+		for benchmark in selected:
+			for scale in scales:
+				repeat = 1
+				if scale <= 1000:
+					repeat = args.repeat
+				result = run(toolClass, benchmark, scale, args.names, project + '/project/', repeat)
+				threshold = thresholds.get(benchmark.__name__, {}).get(str(scale))
+				failures, warnings = [], []
+				if checked:
+					failures, warnings = check(result, threshold, args.check_seconds)
+				notes = ''
+				if failures:
+					notes += ' REGRESSION: ' + ', '.join(failures)
+				if warnings:
+					notes += ' slower: ' + ', '.join(warnings)
+				print '%-32s %8d %10.3f %12d %s' % (benchmark.__name__, scale, result['seconds'], result['calls'], notes)
+				if args.verbose:
+					for command in sorted(result['commands'], key=lambda command: -result['commands'][command]):
+						print '%44s %12d' % (command, result['commands'][command])
+				if failures:
+					regressions.append((benchmark.__name__, scale, failures))
+				if args.update_thresholds:
+					thresholds.setdefault(benchmark.__name__, {})[str(scale)] = {
+						'seconds': round(max(result['seconds'] * args.slack, 0.05), 3),
+						'calls': result['calls']}
+	finally:
+		shutil.rmtree(project, ignore_errors=True)
+
+	if args.update_thresholds:
+		f = open(args.thresholds, 'w')
+		json.dump(thresholds, f, indent=1, sort_keys=True)
+		f.write('\n')
+		f.close()
+		print 'Thresholds written to', args.thresholds
+	if regressions:
+		print len(regressions), 'regressions'
+		return 1
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
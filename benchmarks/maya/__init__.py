@@ -0,0 +1,3 @@
+"""Stand-in for the maya package so LCMT can be benchmarked without Maya.
+Only maya.cmds, maya.mel and maya.utils exist: OpenMaya, Render Setup and the
+renderer plugins fail to import, the same as a Maya without them."""
@@ -0,0 +1,719 @@
+"""Stand-in maya.cmds over an in-memory scene.
+
+Only the commands and flags LCMT uses are implemented, with the same return
+values as Maya (None instead of empty lists where Maya does it, showType
+pairs, [(r, g, b)] for colors...). Every call made from outside this module is
+counted in scene.calls so the benchmarks can track how many round trips to
+Maya each action takes. Scenes are made with newScene()."""
+
+import fnmatch
+import os
+import random
+
+#node type -> the types it inherits from, like cmds.nodeType(inherited=True)
+nodeTypes = {
+	'transform': ['dagNode', 'transform'],
+	'camera': ['dagNode', 'shape', 'camera'],
+	'mesh': ['dagNode', 'shape', 'geometryShape', 'surfaceShape', 'mesh'],
+	'nurbsSurface': ['dagNode', 'shape', 'geometryShape', 'surfaceShape', 'nurbsSurface'],
+	'pointLight': ['dagNode', 'shape', 'light', 'renderLight', 'nonAmbientLightShapeNode', 'nonExtendedLightShapeNode', 'pointLight'],
+	'spotLight': ['dagNode', 'shape', 'light', 'renderLight', 'nonAmbientLightShapeNode', 'nonExtendedLightShapeNode', 'spotLight'],
+	'directionalLight': ['dagNode', 'shape', 'light', 'renderLight', 'nonAmbientLightShapeNode', 'directionalLight'],
+	'areaLight': ['dagNode', 'shape', 'light', 'renderLight', 'nonAmbientLightShapeNode', 'nonExtendedLightShapeNode', 'areaLight'],
+	#the IBL and the Arnold lights are geometry shapes for ls -geometry, LCMT has to take them out
+	'mentalrayIblShape': ['dagNode', 'shape', 'geometryShape', 'surfaceShape', 'mentalrayIblShape'],
+	'aiAreaLight': ['dagNode', 'shape', 'geometryShape', 'surfaceShape', 'aiAreaLight'],
+	'aiSkyDomeLight': ['dagNode', 'shape', 'geometryShape', 'surfaceShape', 'aiSkyDomeLight'],
+	'VRayLightRectShape': ['dagNode', 'shape', 'VRayLightRectShape'],
+	'VRayLightSphereShape': ['dagNode', 'shape', 'VRayLightSphereShape'],
+	'VRayLightDomeShape': ['dagNode', 'shape', 'VRayLightDomeShape'],
+	'VRayEnvironmentPreview': ['dagNode', 'shape', 'geometryShape', 'VRayEnvironmentPreview'],
+	'lambert': ['shadingDependNode', 'lambert'],
+	'blinn': ['shadingDependNode', 'lambert', 'reflect', 'blinn'],
+	'aiStandardSurface': ['shadingDependNode', 'aiStandardSurface'],
+	'objectSet': ['objectSet'],
+	'shadingEngine': ['objectSet', 'shadingEngine'],
+	'VRayRenderElementSet': ['objectSet', 'VRayRenderElementSet'],
+	'renderLayer': ['renderLayer'],
+	'renderGlobals': ['renderGlobals'],
+	'resolution': ['resolution'],
+	'renderQuality': ['renderQuality'],
+	'VRaySettingsNode': ['VRaySettingsNode'],
+	'rmanDisplayChannel': ['rmanDisplayChannel'],
+}
+
+#node types of each renderer plugin, newScene() only knows the ones of the renderers asked for
+pluginTypes = {
+	'mentalray': ['mentalrayIblShape'],
+	'vray': ['VRayLightRectShape', 'VRayLightSphereShape', 'VRayLightDomeShape', 'VRayEnvironmentPreview', 'VRayRenderElementSet', 'VRaySettingsNode'],
+	'arnold': ['aiAreaLight', 'aiSkyDomeLight', 'aiStandardSurface'],
+}
+
+materialTypes = ['lambert', 'blinn', 'aiStandardSurface']
+
+identity = [1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0]
+
+
+def lightAttributes(nodeType):
+	#default attributes of a light of that type, colors are (r, g, b) tuples
+	if nodeType.startswith('VRay'):
+		attributes = {'intensityMult': 1.0, 'lightColor': (1.0, 1.0, 1.0), 'temperature': 6500.0, 'colorMode': 0}
+		if nodeType == 'VRayLightDomeShape':
+			attributes['invisible'] = 0
+		return attributes
+	attributes = {'intensity': 1.0, 'color': (1.0, 1.0, 1.0), 'aiExposure': 0.0,
+				'aiColorTemperature': 6500.0, 'aiUseColorTemperature': 0}
+	if nodeType == 'mentalrayIblShape':
+		attributes = {'visibleInFinalGather': 1, 'visibleInEnvironment': 1}
+	elif nodeType.startswith('ai'):
+		attributes['aiAov'] = 'default'
+		if nodeType == 'aiSkyDomeLight':
+			attributes['camera'] = 1.0
+	return attributes
+
+
+class Node(object):
+
+	__slots__ = ('name', 'type', 'parent', 'children', 'attributes', 'uuid', 'index', 'members', 'locked', 'referenced')
+
+	def __init__(self, name, nodeType, parent, index):
+		self.name = name
+		self.type = nodeType
+		self.parent = parent
+		self.children = []
+		self.attributes = {}
+		self.uuid = '%08X-LCMT-BENCH' % index
+		self.index = index
+		self.members = None
+		self.locked = False
+		self.referenced = False
+
+
+class Scene(object):
+	"""The nodes of the stand-in scene and the counters of the benchmark."""
+
+	def __init__(self, project='/tmp/lcmt_benchmark/', engines=('mentalray', 'vray', 'arnold')):
+		self.project = project
+		self.sceneName = project + 'scenes/benchmark.mb'
+		self.nodes = {}
+		self.uuids = {}
+		self.byType = {}
+		self.selection = []
+		self.calls = {}
+		self.depth = 0
+		self.renders = 0
+		self.time = 1.0
+		self.counter = 0
+		self.ui = {}
+		self.promptText = ''
+		self.knownTypes = set(nodeType for nodeType in nodeTypes if not any(nodeType in types for types in pluginTypes.values()))
+		for engine in engines:
+			self.knownTypes.update(pluginTypes[engine])
+		self.typeCache = {}
+		#light -> the shapes it is linked to, the lights missing are linked to every shape
+		self.lightLinks = {}
+
+	def add(self, name, nodeType, parent=None, attributes=None):
+		if nodeType not in self.knownTypes:
+			raise RuntimeError('Unknown object type: %s' % nodeType)
+		name = self.uniqueName(name)
+		self.counter += 1
+		node = Node(name, nodeType, parent, self.counter)
+		if 'dagNode' in nodeTypes[nodeType]:
+			node.attributes['visibility'] = True
+		if 'objectSet' in nodeTypes[nodeType] or nodeType == 'renderLayer':
+			node.members = []
+		if attributes:
+			node.attributes.update(attributes)
+		if parent != None:
+			parent.children.append(node)
+		self.nodes[name] = node
+		self.uuids[node.uuid] = node
+		self.byType.setdefault(nodeType, {})[node.index] = node
+		return node
+
+	def uniqueName(self, name):
+		if name not in self.nodes:
+			return name
+		base = name.rstrip('0123456789')
+		index = 1
+		while '%s%d' % (base, index) in self.nodes:
+			index += 1
+		return '%s%d' % (base, index)
+
+	def remove(self, node):
+		for child in list(node.children):
+			self.remove(child)
+		if node.parent != None and node in node.parent.children:
+			node.parent.children.remove(node)
+		self.nodes.pop(node.name, None)
+		self.uuids.pop(node.uuid, None)
+		self.byType[node.type].pop(node.index, None)
+		if node in self.selection:
+			self.selection.remove(node)
+
+	def typesMatching(self, wanted):
+		#concrete node types that are or inherit from wanted
+		if wanted not in self.typeCache:
+			if wanted not in self.knownTypes and not any(wanted in nodeTypes[nodeType] for nodeType in self.knownTypes):
+				raise RuntimeError('Unknown object type: %s' % wanted)
+			self.typeCache[wanted] = set(nodeType for nodeType in self.knownTypes if wanted in nodeTypes[nodeType])
+		return self.typeCache[wanted]
+
+	def find(self, name):
+		#node of a name, long name, uuid or plug
+		name = name.split('.')[0]
+		if '|' in name:
+			name = name.rsplit('|', 1)[1]
+		node = self.nodes.get(name)
+		if node == None:
+			node = self.uuids.get(name)
+		return node
+
+	def get(self, name):
+		node = self.find(name)
+		if node == None:
+			raise ValueError('No object matches name: %s' % name)
+		return node
+
+	def ofTypes(self, types):
+		found = []
+		for nodeType in types:
+			found.extend(self.byType.get(nodeType, {}).values())
+		found.sort(key=lambda node: node.index)
+		return found
+
+	def longName(self, node):
+		names = []
+		while node != None:
+			names.append(node.name)
+			node = node.parent
+		return '|' + '|'.join(reversed(names))
+
+	def isVisible(self, node):
+		while node != None:
+			if not node.attributes.get('visibility', True):
+				return False
+			node = node.parent
+		return True
+
+#light shape types newScene() creates, the IBL and domes are added once
+lightTypes = ['pointLight', 'spotLight', 'areaLight', 'directionalLight', 'VRayLightRectShape', 'VRayLightSphereShape', 'aiAreaLight']
+environmentTypes = ['mentalrayIblShape', 'VRayLightDomeShape', 'aiSkyDomeLight']
+
+#name distributions of newScene(): words the light DB classifies and words it doesn't
+keywordNames = ['key', 'rim', 'bounce', 'kick', 'background', 'wall']
+otherNames = ['fill', 'lamp', 'sun', 'practical', 'window', 'spec', 'table', 'street']
+
+scene = Scene()
+
+
+def newScene(lights=10, geometry=10, names='keyword', hiddenRatio=0.1, engines=('mentalray', 'vray', 'arnold'), project=None, seed=1):
+	"""Replace the scene by one with that many lights and geometry shapes.
+	names is the name distribution of the lights: 'keyword' (every light has a
+	light DB keyword, a few groups), 'unique' (no keyword, one group per light)
+	or 'mixed' (half and half)."""
+	global scene
+	generator = random.Random(seed)
+	scene = Scene(project or scene.project, engines)
+	add = scene.add
+	add('defaultRenderGlobals', 'renderGlobals', attributes={'currentRenderer': 'mayaSoftware'})
+	add('defaultResolution', 'resolution', attributes={'width': 960, 'height': 540})
+	add('defaultRenderQuality', 'renderQuality', attributes={'edgeAntiAliasing': 0, 'shadingSamples': 1, 'maxShadingSamples': 8})
+	if 'vray' in engines:
+		add('vraySettings', 'VRaySettingsNode', attributes={'vfbOn': 0})
+	camera = add('persp', 'transform', attributes={'matrix': identity})
+	add('perspShape', 'camera', camera, {'renderable': True})
+	for index in range(8):
+		add('%s_MTL' % materialTypes[index % len(materialTypes)], materialTypes[index % len(materialTypes)] if materialTypes[index % len(materialTypes)] in scene.knownTypes else 'lambert')
+	types = [lightType for lightType in lightTypes if lightType in scene.knownTypes]
+	environments = [lightType for lightType in environmentTypes if lightType in scene.knownTypes]
+	for index in range(lights):
+		if names == 'unique' or (names == 'mixed' and index % 2):
+			word = generator.choice(otherNames)
+		else:
+			word = generator.choice(keywordNames)
+		side = generator.choice(['L', 'R', 'C', 'Top', 'Back'])
+		lightType = types[index % len(types)]
+		if index < len(environments) and lights > len(environments) * 4:
+			lightType = environments[index]
+		transform = add('%s%s_%05d' % (word, side, index), 'transform', attributes={'matrix': identity})
+		add(transform.name + 'Shape', lightType, transform, lightAttributes(lightType))
+		if generator.random() < hiddenRatio:
+			transform.attributes['visibility'] = False
+	for index in range(geometry):
+		transform = add('geo_%05d' % index, 'transform', attributes={'matrix': identity})
+		add(transform.name + 'Shape', 'mesh', transform)
+	scene.calls.clear()
+	return scene
+
+
+def command(function):
+	#count the calls made from outside the stand-in
+	name = function.__name__
+
+	def counted(*args, **kwargs):
+		if scene.depth == 0:
+			scene.calls[name] = scene.calls.get(name, 0) + 1
+		scene.depth += 1
+		try:
+			return function(*args, **kwargs)
+		finally:
+			scene.depth -= 1
+	counted.__name__ = name
+	counted.__doc__ = function.__doc__
+	return counted
+
+
+def flatten(objects):
+	names = []
+	for item in objects:
+		if isinstance(item, (list, tuple)):
+			names.extend(flatten(item))
+		elif item != None:
+			names.append(item)
+	return names
+
+
+def flag(kwargs, *names):
+	for name in names:
+		if name in kwargs:
+			return kwargs[name]
+	return None
+
+#--- scene queries ---
+
+
+@command
+def ls(*objects, **kwargs):
+	if objects:
+		nodes = []
+		for name in flatten(objects):
+			if '*' in name:
+				nodes.extend([node for node in scene.nodes.values() if fnmatch.fnmatchcase(node.name, name)])
+				continue
+			node = scene.find(name)
+			if node != None:
+				nodes.append(node)
+	elif flag(kwargs, 'selection', 'sl'):
+		nodes = list(scene.selection)
+	elif flag(kwargs, 'type', 'typ'):
+		wanted = flag(kwargs, 'type', 'typ')
+		if not isinstance(wanted, (list, tuple)):
+			wanted = [wanted]
+		types = set()
+		for nodeType in wanted:
+			types |= scene.typesMatching(nodeType)
+		nodes = scene.ofTypes(types)
+	elif flag(kwargs, 'geometry', 'g'):
+		nodes = scene.ofTypes(scene.typesMatching('geometryShape'))
+	elif flag(kwargs, 'materials', 'mat'):
+		nodes = scene.ofTypes(set(materialTypes) & scene.knownTypes)
+	else:
+		nodes = sorted(scene.nodes.values(), key=lambda node: node.index)
+	if flag(kwargs, 'dag') and flag(kwargs, 'selection', 'sl'):
+		#-dag -sl lists the selection and everything below it
+		below = []
+		stack = list(nodes)
+		while stack:
+			node = stack.pop()
+			below.append(node)
+			stack.extend(node.children)
+		nodes = sorted(set(below), key=lambda node: node.index)
+	wanted = flag(kwargs, 'type', 'typ')
+	if wanted and (objects or flag(kwargs, 'selection', 'sl')):
+		if not isinstance(wanted, (list, tuple)):
+			wanted = [wanted]
+		types = set()
+		for nodeType in wanted:
+			types |= scene.typesMatching(nodeType)
+		nodes = [node for node in nodes if node.type in types]
+	if flag(kwargs, 'geometry', 'g') and objects:
+		geometryTypes = scene.typesMatching('geometryShape')
+		nodes = [node for node in nodes if node.type in geometryTypes]
+	if flag(kwargs, 'visible', 'v'):
+		nodes = [node for node in nodes if scene.isVisible(node)]
+	if flag(kwargs, 'referencedNodes', 'rn'):
+		nodes = [node for node in nodes if node.referenced]
+	if flag(kwargs, 'uuid'):
+		return [node.uuid for node in nodes]
+	if flag(kwargs, 'long', 'l'):
+		names = [scene.longName(node) for node in nodes]
+	else:
+		names = [node.name for node in nodes]
+	if flag(kwargs, 'showType', 'st'):
+		typed = []
+		for node, name in zip(nodes, names):
+			typed.extend([name, node.type])
+		return typed
+	return names
+
+
+@command
+def listRelatives(*objects, **kwargs):
+	nodes = [scene.get(name) for name in flatten(objects)]
+	if flag(kwargs, 'parent', 'p'):
+		found = []
+		seen = set()
+		for node in nodes:
+			if node.parent != None and node.parent.name not in seen:
+				seen.add(node.parent.name)
+				found.append(node.parent)
+	else:
+		found = []
+		for node in nodes:
+			found.extend(node.children)
+		if flag(kwargs, 'shapes', 's'):
+			found = [node for node in found if 'shape' in nodeTypes[node.type]]
+	if not found:
+		return None
+	if flag(kwargs, 'fullPath', 'f'):
+		return [scene.longName(node) for node in found]
+	return [node.name for node in found]
+
+
+@command
+def listAttr(name, **kwargs):
+	node = scene.get(name)
+	attributes = sorted(node.attributes)
+	if flag(kwargs, 'scalar', 's'):
+		attributes = [attribute for attribute in attributes if not isinstance(node.attributes[attribute], (tuple, list))]
+	return attributes
+
+
+@command
+def listConnections(*args, **kwargs):
+	return None
+
+
+@command
+def lightlink(query=False, light=None, **kwargs):
+	#only the query of the shapes linked to any of the lights
+	linked = set()
+	everything = None
+	for name in flatten([light]):
+		node = scene.get(name)
+		if node.name in scene.lightLinks:
+			linked.update(scene.lightLinks[node.name])
+		elif everything == None:
+			everything = [shape.name for shape in scene.ofTypes(['mesh', 'nurbsSurface'])]
+			linked.update(everything)
+	return sorted(linked)
+
+
+@command
+def objExists(name):
+	node = scene.find(name)
+	if node == None:
+		return False
+	if '.' in name:
+		return name.split('.', 1)[1] in node.attributes
+	return True
+
+
+@command
+def objectType(name, isType=None, isAType=None, **kwargs):
+	node = scene.get(name)
+	if isType != None:
+		return node.type == isType
+	if isAType != None:
+		return isAType in nodeTypes[node.type]
+	return node.type
+
+
+@command
+def nodeType(name, isTypeName=False, inherited=False, **kwargs):
+	if isTypeName:
+		if name not in scene.knownTypes:
+			return None
+		if inherited:
+			return list(nodeTypes[name])
+		return name
+	node = scene.get(name)
+	if inherited:
+		return list(nodeTypes[node.type])
+	return node.type
+
+
+@command
+def allNodeTypes(**kwargs):
+	return sorted(scene.knownTypes)
+
+
+@command
+def attributeQuery(attribute, node=None, type=None, exists=False, **kwargs):
+	if node != None:
+		return attribute in scene.get(node).attributes
+	if 'dagNode' in nodeTypes.get(type, []) and attribute == 'visibility':
+		return True
+	if type in lightTypes or type in environmentTypes:
+		return attribute in lightAttributes(type)
+	return False
+
+
+@command
+def getAttr(plug, **kwargs):
+	node = scene.get(plug)
+	attribute = plug.split('.', 1)[1]
+	if attribute not in node.attributes:
+		raise ValueError('No object matches name: %s' % plug)
+	value = node.attributes[attribute]
+	if isinstance(value, tuple):
+		return [value]
+	return value
+
+
+@command
+def setAttr(plug, *values, **kwargs):
+	node = scene.get(plug)
+	attribute = plug.split('.', 1)[1]
+	if len(values) == 1:
+		node.attributes[attribute] = values[0]
+	else:
+		node.attributes[attribute] = tuple(values)
+
+
+@command
+def xform(name, **kwargs):
+	return list(scene.get(name).attributes.get('matrix', identity))
+
+
+@command
+def listHistory(*objects, **kwargs):
+	#no connections in the stand-in, so nothing upstream
+	return None
+
+
+@command
+def currentTime(*args, **kwargs):
+	if flag(kwargs, 'query', 'q'):
+		return scene.time
+	scene.time = float(args[0])
+	return scene.time
+
+
+@command
+def editRenderLayerGlobals(**kwargs):
+	if flag(kwargs, 'query', 'q'):
+		return 'defaultRenderLayer'
+	return None
+
+
+@command
+def exactWorldBoundingBox(*objects, **kwargs):
+	for name in flatten(objects):
+		scene.get(name)
+	return [-1.0, -1.0, -1.0, 1.0, 1.0, 1.0]
+
+#--- scene edits ---
+
+
+@command
+def select(*objects, **kwargs):
+	nodes = [scene.get(name) for name in flatten(objects)]
+	if flag(kwargs, 'clear', 'cl'):
+		scene.selection = []
+	elif flag(kwargs, 'add'):
+		scene.selection.extend([node for node in nodes if node not in scene.selection])
+	else:
+		scene.selection = nodes
+
+
+@command
+def hide(*objects, **kwargs):
+	for name in flatten(objects):
+		scene.get(name).attributes['visibility'] = False
+
+
+@command
+def showHidden(*objects, **kwargs):
+	for name in flatten(objects):
+		node = scene.get(name)
+		while node != None:
+			node.attributes['visibility'] = True
+			node = node.parent if flag(kwargs, 'above', 'a') else None
+
+
+@command
+def lockNode(*objects, **kwargs):
+	nodes = [scene.get(name) for name in flatten(objects)]
+	if flag(kwargs, 'query', 'q'):
+		return [node.locked for node in nodes]
+	for node in nodes:
+		node.locked = bool(flag(kwargs, 'lock', 'l'))
+
+
+@command
+def rename(name, newName, **kwargs):
+	if isinstance(name, list):
+		name = name[0]
+	node = scene.get(name)
+	if node.locked or node.referenced:
+		raise RuntimeError('Cannot rename a read only node \'%s\'.' % node.name)
+	del scene.nodes[node.name]
+	node.name = scene.uniqueName(newName)
+	scene.nodes[node.name] = node
+	return node.name
+
+
+@command
+def delete(*objects, **kwargs):
+	for name in flatten(objects):
+		node = scene.find(name)
+		if node != None:
+			scene.remove(node)
+
+
+@command
+def createNode(nodeType, name=None, parent=None, **kwargs):
+	if parent != None:
+		parent = scene.get(parent)
+	return scene.add(name or nodeType + '1', nodeType, parent).name
+
+
+@command
+def shadingNode(nodeType, name=None, **kwargs):
+	if flag(kwargs, 'asLight', 'al'):
+		#lights are created as a transform with the light shape below it
+		transform = scene.add(name or nodeType + '1', 'transform', attributes={'matrix': identity})
+		scene.add(transform.name + 'Shape', nodeType, transform, lightAttributes(nodeType))
+		return transform.name
+	return scene.add(name or nodeType + '1', nodeType).name
+
+
+@command
+def connectAttr(source, destination, **kwargs):
+	scene.get(source)
+	scene.get(destination)
+
+
+@command
+def sets(*objects, **kwargs):
+	members = [scene.get(name) for name in flatten(objects)]
+	if flag(kwargs, 'query', 'q'):
+		found = scene.get(members[0].name).members
+		return [node.name for node in found] or None
+	if flag(kwargs, 'clear', 'cl'):
+		scene.get(flag(kwargs, 'clear', 'cl')).members = []
+		return None
+	target = flag(kwargs, 'add', 'addElement', 'forceElement', 'fe')
+	if target != None:
+		target = scene.get(target)
+		known = set(target.members)
+		target.members.extend([node for node in members if node not in known])
+		return None
+	node = scene.add(flag(kwargs, 'name', 'n') or 'set1', 'objectSet')
+	if not flag(kwargs, 'empty', 'em'):
+		node.members = members or list(scene.selection)
+	return node.name
+
+
+@command
+def createRenderLayer(*objects, **kwargs):
+	node = scene.add(flag(kwargs, 'name', 'n') or 'layer1', 'renderLayer')
+	node.members = [scene.get(name) for name in flatten(objects)]
+	return node.name
+
+
+@command
+def undoInfo(**kwargs):
+	return None
+
+#--- files and render ---
+
+
+@command
+def workspace(*args, **kwargs):
+	if flag(kwargs, 'rootDirectory', 'rd'):
+		return scene.project
+	return scene.project
+
+
+@command
+def file(*args, **kwargs):
+	if flag(kwargs, 'sceneName', 'sn'):
+		return scene.sceneName
+	if flag(kwargs, 'modified', 'mf'):
+		return False
+	return None
+
+
+@command
+def renderSettings(**kwargs):
+	return [os.path.splitext(os.path.basename(scene.sceneName))[0] + '.iff']
+
+
+@command
+def playbackOptions(**kwargs):
+	if flag(kwargs, 'maxTime', 'max'):
+		return 24.0
+	return 1.0
+
+
+@command
+def getPanel(**kwargs):
+	return 'renderView'
+
+
+@command
+def renderWindowEditor(*args, **kwargs):
+	if flag(kwargs, 'query', 'q'):
+		return scene.ui.get('renderView', {}).get('pca', '')
+	path = flag(kwargs, 'writeImage', 'wi')
+	if path != None:
+		folder = os.path.dirname(path)
+		if folder and not os.path.exists(folder):
+			os.makedirs(folder)
+		image = open(path, 'wb')
+		image.write(b'LCMT stand-in image')
+		image.close()
+	elif flag(kwargs, 'pca') != None:
+		scene.ui.setdefault('renderView', {})['pca'] = kwargs['pca']
+	return None
+
+#--- UI ---
+
+
+def control(name):
+	#UI commands only remember their flags: created, edited and queried
+	def ui(*args, **kwargs):
+		if flag(kwargs, 'exists', 'ex'):
+			return bool(args) and args[0] in scene.ui
+		if flag(kwargs, 'query', 'q'):
+			state = scene.ui.get(args[0], {})
+			for key in kwargs:
+				if key not in ('query', 'q') and key in state:
+					return state[key]
+			return None
+		if flag(kwargs, 'edit', 'e') and args:
+			state = scene.ui.setdefault(args[0], {})
+			if flag(kwargs, 'removeAll', 'ra'):
+				state['allItems'] = []
+			if flag(kwargs, 'append', 'a') != None:
+				items = flag(kwargs, 'append', 'a')
+				state.setdefault('allItems', []).extend(items if isinstance(items, (list, tuple)) else [items])
+			state.update(kwargs)
+			return None
+		scene.counter += 1
+		controlName = args[0] if args and isinstance(args[0], str) else '%s%d' % (name, scene.counter)
+		scene.ui[controlName] = dict(kwargs)
+		return controlName
+	ui.__name__ = name
+	return command(ui)
+
+for uiCommand in ['window', 'showWindow', 'deleteUI', 'setParent', 'columnLayout', 'rowLayout', 'paneLayout',
+				'menu', 'menuItem', 'button', 'checkBox', 'text', 'iconTextStaticLabel', 'iconTextScrollList',
+				'progressBar', 'optionMenu', 'textField', 'intFieldGrp', 'floatFieldGrp', 'floatSliderGrp', 'colorSliderGrp', 'scriptJob']:
+	globals()[uiCommand] = control(uiCommand)
+
+
+@command
+def promptDialog(*args, **kwargs):
+	if flag(kwargs, 'query', 'q'):
+		return scene.promptText
+	return 'OK'
+
+
+@command
+def confirmDialog(*args, **kwargs):
+	return flag(kwargs, 'defaultButton', 'db') or 'OK'
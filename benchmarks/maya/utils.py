@@ -0,0 +1,5 @@
+"""Stand-in maya.utils, deferred calls run right away."""
+
+
+def executeDeferred(function, *args, **kwargs):
+	return function(*args, **kwargs)
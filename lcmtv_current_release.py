@@ -2,6 +2,2183 @@ import maya.cmds as cmds
 import re
 import maya.mel as mel
 import os
+import json
+import tempfile
+import sys
+import time
+import subprocess
+import threading
+import multiprocessing
+import glob
+import ctypes
+import hashlib
+import shutil
+import Queue
+import bisect
+import weakref
+from multiprocessing.pool import ThreadPool
+
+try:
+	import maya.api.OpenMaya as om2
+except ImportError:
+	#outside of a full Maya session there are no scene messages to listen to,
+	#the caches below are then only refreshed when asked to
+	om2 = None
+
+try:
+	import numpy
+except ImportError:
+	#numpy isn't shipped with every Maya version, only the relighting needs it
+	numpy = None
+
+try:
+	import OpenImageIO as oiio
+except ImportError:
+	#without OpenImageIO the images are read and written through MImage (8 bits per channel)
+	oiio = None
+
+def writeJSON(path, data, **dumpArgs):
+	#written to a temp file next to path and renamed over it, so a crash or another session
+	#reading it never sees half a file. mkstemp files are private and these are shared with
+	#the rest of the project, the mode is set on the temp file itself as the umask is process
+	#wide and shared with the threads
+	folder = os.path.dirname(path)
+	if folder and not os.path.exists(folder):
+		os.makedirs(folder)
+	handle, tmpPath = tempfile.mkstemp(prefix='.' + os.path.basename(path), dir=folder or '.')
+	try:
+		os.chmod(tmpPath, 0664)
+		f = os.fdopen(handle, 'w')
+		try:
+			json.dump(data, f, **dumpArgs)
+			f.flush()
+			os.fsync(f.fileno())
+		finally:
+			f.close()
+		try:
+			os.rename(tmpPath, path)
+		except OSError:
+			#windows doesn't rename over an existing file
+			os.remove(path)
+			os.rename(tmpPath, path)
+	except (IOError, OSError, ValueError, TypeError):
+		#what can't be written (a value json doesn't know) leaves the file as it was
+		if os.path.exists(tmpPath):
+			os.remove(tmpPath)
+		raise
+
+class RendererRegistry:
+	"""Session cache of the render engines installed in Maya.
+	cmds.allNodeTypes() is scanned once and the result is kept until a plugin
+	is loaded or unloaded, so the lookups are just set membership tests."""
+
+	#substrings of the node types that tell us a render engine is installed
+	#bug fix: 06-20-2012: if mentalRay plugin not installed maya still has nodes called mentalraytexture
+	#so for mental ray we look for the ibl shape, for Arnold the standard shader
+	engineMarkers = {'mentalray': ['mentalrayiblshape'],
+					'renderman': ['renderman', 'rmanglobals'],
+					'vray': ['vray'],
+					'arnold': ['aistandard']}
+
+	def __init__(self):
+		self.nodeTypes = set()
+		self.installed = set()
+		self.dirty = True
+		self.listeners = []
+		self.callbackIds = []
+		self.lookups = dict()
+
+	def scan(self):
+		#one single pass over all the node types for every render engine we know
+		self.nodeTypes = set(cmds.allNodeTypes())
+		lowerTypes = [nodeType.lower() for nodeType in self.nodeTypes]
+		self.installed = set()
+		for engine in self.engineMarkers:
+			for marker in self.engineMarkers[engine]:
+				if any(marker in nodeType for nodeType in lowerTypes):
+					self.installed.add(engine)
+					break
+		self.lookups = dict()
+		self.dirty = False
+		self.installCallbacks()
+
+	def installCallbacks(self):
+		if om2 == None or self.callbackIds:
+			return
+		for message in (om2.MSceneMessage.kAfterPluginLoad, om2.MSceneMessage.kAfterPluginUnload):
+			self.callbackIds.append(om2.MSceneMessage.addStringArrayCallback(message, self.pluginChanged))
+
+	def removeCallbacks(self):
+		if self.callbackIds:
+			om2.MMessage.removeCallbacks(self.callbackIds)
+		self.callbackIds = []
+
+	def pluginChanged(self, *args):
+		self.dirty = True
+		for owner, methodName in list(self.listeners):
+			instance = owner()
+			if instance != None:
+				getattr(instance, methodName)()
+		self.dropDeadListeners()
+
+	def addListener(self, listener):
+		#bound methods are kept as a weak reference to their instance plus the method name,
+		#the registry lives for the whole session and must not keep closed windows alive
+		self.dropDeadListeners()
+		entry = (weakref.ref(listener.im_self), listener.im_func.__name__)
+		if entry not in self.listeners:
+			self.listeners.append(entry)
+
+	def removeListener(self, listener):
+		entry = (weakref.ref(listener.im_self), listener.im_func.__name__)
+		if entry in self.listeners:
+			self.listeners.remove(entry)
+
+	def dropDeadListeners(self):
+		self.listeners = [(owner, methodName) for owner, methodName in self.listeners if owner() != None]
+
+	def refresh(self):
+		if self.dirty:
+			self.scan()
+
+	def isInstalled(self, renderEngineName):
+		self.refresh()
+		name = renderEngineName.lower()
+		if name in self.engineMarkers:
+			return name in self.installed
+		#any other name is looked up the old way, but only once per scan
+		if name not in self.lookups:
+			self.lookups[name] = any(name in nodeType.lower() for nodeType in self.nodeTypes)
+		return self.lookups[name]
+
+	def hasNodeType(self, nodeType):
+		self.refresh()
+		return nodeType in self.nodeTypes
+
+class LightNameClassifier:
+	"""Groups light names by the first light type keyword (key, rim...) found in them.
+	All the keywords are escaped and compiled into a single pattern that is only
+	rebuilt when the keywords change, names already seen are answered from a cache."""
+
+	def __init__(self, keywords=''):
+		self.source = None
+		self.keywords = ()
+		self.weights = dict()
+		self.weighted = False
+		self.pattern = None
+		self.cache = dict()
+		self.setKeywords(keywords)
+
+	def setKeywords(self, keywords):
+		#accepts a pipe separated string, a list of keywords or the (keyword, weight)
+		#entries of LightTypesDB, ordered from the first to the last one to match
+		if keywords is self.source or keywords == self.source:
+			return
+		self.source = keywords
+		if isinstance(keywords, basestring):
+			keywords = keywords.split('|')
+		weights = dict()
+		names = []
+		for keyword in keywords:
+			weight = 0
+			if not isinstance(keyword, basestring):
+				keyword, weight = keyword
+			keyword = keyword.strip()
+			if keyword != '' and keyword.lower() not in weights:
+				names.append(keyword)
+				weights[keyword.lower()] = weight
+		keywords = tuple(names)
+		if keywords == self.keywords and weights == self.weights:
+			return
+		self.keywords = keywords
+		self.weights = weights
+		#with equal weights the first keyword found in the name wins,
+		#otherwise the heaviest keyword found anywhere in the name does
+		self.weighted = len(set(weights.values())) > 1
+		self.cache = dict()
+		if keywords:
+			#keywords typed by the artists are taken literally, not as regular expressions
+			self.pattern = re.compile('|'.join([re.escape(keyword) for keyword in keywords]), re.IGNORECASE)
+		else:
+			self.pattern = None
+
+	def findKeyword(self, name):
+		#match object of the keyword that classifies name, or None
+		match = None
+		if self.pattern != None:
+			if self.weighted:
+				for found in self.pattern.finditer(name):
+					if match == None or self.weights[found.group().lower()] > self.weights[match.group().lower()]:
+						match = found
+			else:
+				match = self.pattern.search(name)
+		return match
+
+	def classify(self, name):
+		try:
+			return self.cache[name]
+		except KeyError:
+			pass
+		match = self.findKeyword(name)
+		if match != None:
+			group = match.group().lower()
+		else:
+			group = name
+		self.cache[name] = group
+		return group
+
+	def classify_many(self, names):
+		#group a whole list of names in one pass: {keyword: [names]}
+		groups = dict()
+		for name in names:
+			group = self.classify(name)
+			if group in groups:
+				groups[group].append(name)
+			else:
+				groups[group] = [name]
+		return groups
+
+class LightTypesDB:
+	"""Light type keywords (key, rim, bounce...) of the project.
+	They are kept in scripts/LCMT_lightTypesDB.json inside the workspace as a list of
+	{"name": keyword, "weight": priority}, normalized to lower case and without repeats.
+	Writes go to a temporary file that is renamed over the DB so they are atomic, and
+	the file is only read again when its modification time changes, which also picks up
+	the changes made by other artists working on the same project."""
+
+	defaultKeywords = ['key', 'bounce', 'rim', 'background', 'wall', 'kick']
+
+	def __init__(self, path):
+		self.path = path
+		self.fullPath = path + 'LCMT_lightTypesDB.json'
+		#pipe separated DB used up to v3.6.4, imported the first time
+		self.legacyPath = path + 'LCMT_lightTypesDB.txt'
+		self.entries = ()
+		self.stamp = None
+
+	def normalize(self, keyword):
+		return ' '.join(keyword.split()).lower()
+
+	def merge(self, entries, newEntries):
+		#de-duplicate keeping the position of the first one and the highest weight
+		weights = dict()
+		names = []
+		for name, weight in list(entries) + list(newEntries):
+			name = self.normalize(name)
+			if name == '':
+				continue
+			if name not in weights:
+				names.append(name)
+				weights[name] = weight
+			else:
+				weights[name] = max(weights[name], weight)
+		#heavier keywords first, the sort is stable so same weights keep their order
+		names.sort(key=lambda name: -weights[name])
+		return tuple([(name, weights[name]) for name in names])
+
+	def parse(self, text):
+		#"key, rim:10, fill" -> [('key', 0), ('rim', 10), ('fill', 0)]
+		entries = []
+		for keyword in re.split('[,|]', text):
+			weight = 0
+			if ':' in keyword:
+				keyword, weight = keyword.rsplit(':', 1)
+				try:
+					weight = int(weight)
+				except ValueError:
+					weight = 0
+			entries.append((keyword, weight))
+		return entries
+
+	def fileStamp(self):
+		info = os.stat(self.fullPath)
+		return (info.st_mtime, info.st_size)
+
+	def load(self):
+		#returns the current entries, only reading the file if it changed on disk.
+		#a corrupt, hand edited or unreadable DB mustn't stop the tool from opening, it is
+		#left on disk as it is and the default keywords are used until it is fixed
+		try:
+			if not os.path.exists(self.fullPath):
+				if os.path.exists(self.legacyPath):
+					f = open(self.legacyPath, 'r')
+					entries = self.parse(f.read())
+					f.close()
+				else:
+					entries = [(keyword, 0) for keyword in self.defaultKeywords]
+				self.write(self.merge([], entries))
+				return self.entries
+			stamp = self.fileStamp()
+			if stamp != self.stamp:
+				f = open(self.fullPath, 'r')
+				try:
+					content = json.load(f)
+				finally:
+					f.close()
+				self.entries = self.merge([], [(entry['name'], entry.get('weight', 0)) for entry in content['keywords']])
+				self.stamp = stamp
+		except (IOError, OSError, ValueError, KeyError, TypeError, AttributeError), e:
+			print LCMT.version, 'Could not read the light types DB', self.fullPath, e, '- using the default light types'
+			self.entries = self.merge([], [(keyword, 0) for keyword in self.defaultKeywords])
+			#not read again until the file changes
+			try:
+				self.stamp = self.fileStamp()
+			except OSError:
+				self.stamp = None
+		return self.entries
+
+	def write(self, entries):
+		#the scripts directory of the project space is made if there isn't one
+		writeJSON(self.fullPath, {'version': 1, 'keywords': [{'name': name, 'weight': weight} for name, weight in entries]}, indent=1)
+		self.entries = tuple(entries)
+		self.stamp = self.fileStamp()
+
+	def add(self, text):
+		#reload first so we don't overwrite what someone else added
+		self.write(self.merge(self.load(), self.parse(text)))
+
+	def reset(self):
+		self.write(self.merge([], [(keyword, 0) for keyword in self.defaultKeywords]))
+
+	def keywords(self):
+		return [name for name, weight in self.load()]
+
+class LightTypeResolver:
+	"""Node types of the lights, resolved in bulk: the nodes of a list that aren't
+	known yet are typed with a single ls -showType and kept by name, and what each
+	node type inherits from is asked once per type, not once per light. Knows the
+	environment (dome and IBL) lights of every renderer."""
+
+	#lights that light the scene from the environment, rendered after the others
+	environmentTypes = ('mentalrayIblShape', 'VRayLightDomeShape', 'aiSkyDomeLight', 'PxrDomeLight', 'RedshiftDomeLight')
+
+	def __init__(self):
+		self.types = dict()
+		self.inherited = dict()
+
+	def clear(self):
+		#the node types of the node names, not the type hierarchy, can change with the scene
+		self.types = dict()
+
+	def forget(self, nodes):
+		for node in nodes:
+			self.types.pop(node, None)
+
+	def add(self, types):
+		self.types.update(types)
+
+	def resolve(self, nodes):
+		#{node: type} of the nodes that exist, by the names they were asked with. ls answers with names
+		#of its own (a short one for a long path), so they are listed long and each name asked is
+		#matched to the only path it ends
+		missing = [node for node in nodes if node not in self.types]
+		if missing:
+			typed = cmds.ls(missing, showType=True, long=True)
+			paths = dict()
+			for index in range(0, len(typed), 2):
+				paths.setdefault(typed[index].rpartition('|')[2], dict())['|' + typed[index].lstrip('|')] = typed[index+1]
+			for node in missing:
+				path = '|' + node.lstrip('|')
+				found = [nodeType for longName, nodeType in paths.get(node.rpartition('|')[2], dict()).items() if longName.endswith(path)]
+				if len(found) == 1:
+					self.types[node] = found[0]
+		return dict([(node, self.types[node]) for node in nodes if node in self.types])
+
+	def nodeType(self, node):
+		return self.resolve([node]).get(node)
+
+	def inheritedTypes(self, nodeType):
+		if nodeType not in self.inherited:
+			self.inherited[nodeType] = set(cmds.nodeType(nodeType, isTypeName=True, inherited=True) or [nodeType])
+		return self.inherited[nodeType]
+
+	def isA(self, node, types):
+		#same as objectType -isAType for any of the types
+		nodeType = self.nodeType(node)
+		return nodeType != None and not self.inheritedTypes(nodeType).isdisjoint(types)
+
+	def isEnvironment(self, node):
+		return self.isA(node, self.environmentTypes)
+
+	def environmentLights(self, lights):
+		types = self.resolve(lights)
+		return [light for light in lights if light in types and not self.inheritedTypes(types[light]).isdisjoint(self.environmentTypes)]
+
+class SceneIndex:
+	"""Lights (with their type, transform and group) and geometry of the scene.
+	The scene is listed once and then kept up to date with Maya's node added,
+	removed and renamed messages, so the UI doesn't list the whole DAG again for
+	every action. Without OpenMaya it is only listed again after invalidate().
+	Nodes are kept by the name ls gives them, a path for names that aren't unique
+	(like a duplicated light rig): the messages only give the short name, so while
+	there are any the scene is listed again after a removal, rename or reparent.
+
+	Lights can be grouped by one or several keys (see groupKeys). The value of
+	every key is read once per light and the groups of each combination of keys
+	are kept, so switching the grouping or opening a group is a lookup."""
+
+	#name keyword of the light DB, node type, namespace, group node above the
+	#light transform and the tagAttribute string of the shape or its transform
+	groupKeys = ('keyword', 'type', 'namespace', 'parent', 'tag')
+	tagAttribute = 'lcmtGroup'
+
+	def __init__(self, classifier):
+		self.classifier = classifier
+		self.lightTypes = []
+		self.nonGeoTypes = []
+		self.dirty = True
+		#file open, import and references add their nodes in bulk, we just list the scene again after them
+		self.suspended = False
+		self.lightInfo = dict()
+		self.geometrySet = set()
+		self.nonGeometrySet = set()
+		#short names of the nodes kept by path
+		self.pathNames = set()
+		self.lightList = None
+		self.geometryList = None
+		#(visibleOnly, keys) -> (keywords grouped with, lights grouped, {group: [lights]})
+		self.groups = dict()
+		#key -> {light: value} of every light, the groups of any combination of keys are built from them
+		self.keyValues = dict()
+		self.pending = []
+		self.callbackIds = []
+		self.lightCallbackIds = dict()
+		#called with (node, plug) when an attribute of a light or its transform changes
+		self.attributeListeners = []
+		#edits of the geometry, its placement and its shading networks counted by the Maya messages,
+		#so the render settings are all that has to be compared besides it. Watching takes a few
+		#callbacks per node, so it only starts with watchScene() once there are contributions to
+		#keep up to date, and only for the geometry they light (watchedGeometry, by name) and the
+		#shading networks assigned to it. Lights, cameras and nodes nothing watched is plugged
+		#into don't count
+		self.sceneChanges = 0
+		self.sceneCallbackIds = []
+		self.watchedNodes = set()
+		self.watchedGeometry = set()
+		self.watchingScene = False
+		#called before the first listing when the light types weren't given yet
+		self.typesLoader = None
+		#types of the lights listed and of any node asked since the last change of the scene
+		self.typeResolver = LightTypeResolver()
+
+	def setTypes(self, lightTypes, nonGeoTypes):
+		self.lightTypes = list(lightTypes)
+		self.nonGeoTypes = list(nonGeoTypes)
+		self.typesLoader = None
+		self.dirty = True
+
+	def invalidate(self):
+		#the names may belong to other nodes by the next query, their types are looked up again
+		self.dirty = True
+		self.typeResolver.clear()
+
+	def changed(self):
+		self.lightList = None
+		self.geometryList = None
+		self.groups = dict()
+		self.keyValues = dict()
+
+	def rebuild(self):
+		self.typeResolver.clear()
+		self.removeLightCallbacks()
+		self.removeSceneCallbacks()
+		previousGeometry = self.geometrySet
+		self.lightInfo = dict()
+		self.geometrySet = set()
+		self.nonGeometrySet = set()
+		self.pathNames = set()
+		self.pending = []
+		self.addNodes(None)
+		if self.geometrySet != previousGeometry:
+			self.sceneChanges += 1
+		if self.watchingScene:
+			self.watchedGeometry &= self.geometrySet
+			self.watchGeometry(self.watchedGeometry)
+		self.dirty = False
+		self.installCallbacks()
+
+	def addNodes(self, names):
+		#classify new nodes with a few batched ls calls, names=None is the whole scene
+		if names == None:
+			lights = cmds.ls(type=self.lightTypes, showType=True)
+			geometry = cmds.ls(geometry=True)
+			nonGeometry = []
+			if self.nonGeoTypes:
+				nonGeometry = cmds.ls(type=self.nonGeoTypes)
+		elif names:
+			lights = cmds.ls(names, type=self.lightTypes, showType=True)
+			geometry = cmds.ls(names, geometry=True)
+			nonGeometry = []
+			if self.nonGeoTypes:
+				nonGeometry = cmds.ls(names, type=self.nonGeoTypes)
+		else:
+			return
+		for index in range(0, len(lights), 2):
+			light = lights[index]
+			self.lightInfo[light] = {'type': lights[index+1], 'transform': (cmds.listRelatives(light, p=1, path=True) or [None])[0]}
+			self.watchLight(light)
+		self.nonGeometrySet.update(nonGeometry)
+		#Bug fix Issue #1 and #8, lights and IBL shapes aren't geometry
+		geometry = set(geometry) - set(self.lightInfo) - self.nonGeometrySet
+		self.geometrySet.update(geometry)
+		transforms = [self.lightInfo[lights[index]]['transform'] or '' for index in range(0, len(lights), 2)]
+		for name in [lights[index] for index in range(0, len(lights), 2)] + transforms + list(geometry) + nonGeometry:
+			if '|' in name:
+				self.pathNames.add(name.rpartition('|')[2])
+		if names != None and geometry:
+			#new geometry is lit by the lights linked by default, so it's watched along
+			self.sceneChanges += 1
+			if self.watchingScene:
+				self.watchGeometry(geometry)
+		#the listing already typed the lights
+		self.typeResolver.add(dict([(lights[index], lights[index+1]) for index in range(0, len(lights), 2)]))
+		self.changed()
+
+	def removeNode(self, name):
+		if name in self.pathNames:
+			#the node may be any of the ones with that name, and the others may have a unique name now
+			self.invalidate()
+			return
+		self.typeResolver.forget([name])
+		if name in self.lightInfo:
+			del self.lightInfo[name]
+			if om2 != None and name in self.lightCallbackIds:
+				om2.MMessage.removeCallbacks(self.lightCallbackIds.pop(name))
+		self.geometrySet.discard(name)
+		self.nonGeometrySet.discard(name)
+		self.changed()
+
+	def renameNode(self, previousName, name):
+		if self.pathNames or '|' in name:
+			#the paths below the node change, or it has the name of another node now
+			self.invalidate()
+			return
+		self.typeResolver.forget([previousName, name])
+		if previousName in self.lightInfo:
+			self.lightInfo[name] = self.lightInfo.pop(previousName)
+			if previousName in self.lightCallbackIds:
+				self.lightCallbackIds[name] = self.lightCallbackIds.pop(previousName)
+		for light in self.lightInfo:
+			if self.lightInfo[light]['transform'] == previousName:
+				self.lightInfo[light]['transform'] = name
+		for nodes in (self.geometrySet, self.nonGeometrySet):
+			if previousName in nodes:
+				nodes.discard(previousName)
+				nodes.add(name)
+		self.changed()
+
+	def update(self):
+		if self.typesLoader != None:
+			self.typesLoader()
+		if self.dirty:
+			self.rebuild()
+		elif self.pending:
+			names = []
+			for handle in self.pending:
+				if handle.isValid():
+					names.append(om2.MFnDagNode(handle.object()).partialPathName())
+			self.pending = []
+			if [name for name in names if '|' in name]:
+				#a duplicate: the node listed by that name before needs its path now
+				self.rebuild()
+			else:
+				self.addNodes(names)
+
+	def getLights(self, visibleOnly=False):
+		self.update()
+		if visibleOnly:
+			#a group or display layer above the light hides it too, so the visibility is
+			#queried every time, with one ls over the lights of the index
+			if not self.lightInfo:
+				return []
+			return sorted(cmds.ls(self.lightInfo.keys(), visible=True))
+		if self.lightList == None:
+			self.lightList = sorted(self.lightInfo)
+		return list(self.lightList)
+
+	def getGeometry(self):
+		self.update()
+		if self.geometryList == None:
+			self.geometryList = sorted(self.geometrySet)
+		return list(self.geometryList)
+
+	def getNonGeometry(self):
+		self.update()
+		return set(self.nonGeometrySet)
+
+	def getGroups(self, visibleOnly=True, keys=('keyword',)):
+		#{group: [lights]}, grouped again only when the (visible) lights or the light DB keywords change
+		#several keys make composite groups named 'value/value', like 'aiAreaLight/key'
+		lights = self.getLights(visibleOnly)
+		keys = tuple(keys)
+		keywords, grouped, groups = self.groups.get((visibleOnly, keys), (None, None, None))
+		if groups == None or grouped != lights or ('keyword' in keys and keywords is not self.classifier.keywords):
+			groups = self.groupLights(lights, keys)
+			self.groups[(visibleOnly, keys)] = (self.classifier.keywords, lights, groups)
+		return groups
+
+	def groupLights(self, lights, keys=('keyword',)):
+		#{group: [lights]} of any lights of the index from the values already read
+		columns = [self.getKeyValues(key) for key in keys]
+		groups = dict()
+		for light in lights:
+			#lights listed after the index (a new light not seen yet) are a group of their own
+			group = '/'.join([values.get(light, light) for values in columns])
+			if group in groups:
+				groups[group].append(light)
+			else:
+				groups[group] = [light]
+		return groups
+
+	def getKeyValues(self, key):
+		#{light: value of the key} of every light, read once until the lights change
+		if key not in self.groupKeys:
+			raise ValueError('lights can be grouped by %s, not %r' % (', '.join(self.groupKeys), key))
+		lights = self.getLights()
+		keywords, values = self.keyValues.get(key, (None, None))
+		if values != None and (key != 'keyword' or keywords is self.classifier.keywords):
+			return values
+		values = dict()
+		if key == 'keyword':
+			for light in lights:
+				values[light] = self.classifier.classify(light)
+		elif key == 'type':
+			for light in lights:
+				values[light] = self.lightInfo[light]['type']
+		elif key == 'namespace':
+			for light in lights:
+				values[light] = light.split('|')[-1].rpartition(':')[0] or ':'
+		elif key == 'parent':
+			for light in lights:
+				parents = None
+				if self.lightInfo[light]['transform'] != None:
+					parents = cmds.listRelatives(self.lightInfo[light]['transform'], p=1)
+				values[light] = (parents or ['world'])[0]
+		else:
+			#the tag of the shape wins over the one of the transform
+			for light in lights:
+				values[light] = 'untagged'
+				for node in (self.lightInfo[light]['transform'], light):
+					if node != None and cmds.objExists('%s.%s' % (node, self.tagAttribute)):
+						values[light] = str(cmds.getAttr('%s.%s' % (node, self.tagAttribute)) or 'untagged')
+		self.keyValues[key] = (self.classifier.keywords, values)
+		return values
+
+	def lightType(self, light):
+		self.update()
+		return self.lightInfo[light]['type']
+
+	def lightTransform(self, light):
+		self.update()
+		return self.lightInfo[light]['transform']
+
+	#--- Maya messages ---
+
+	def installCallbacks(self):
+		if om2 == None or self.callbackIds:
+			return
+		self.callbackIds.append(om2.MDGMessage.addNodeAddedCallback(self.nodeAdded, 'dagNode'))
+		self.callbackIds.append(om2.MDGMessage.addNodeRemovedCallback(self.nodeRemoved, 'dagNode'))
+		self.callbackIds.append(om2.MNodeMessage.addNameChangedCallback(om2.MObject(), self.nameChanged))
+		self.callbackIds.append(om2.MDagMessage.addParentAddedCallback(self.parentChanged))
+		self.callbackIds.append(om2.MDGMessage.addConnectionCallback(self.connectionChanged))
+		sceneMessages = om2.MSceneMessage
+		for message in (sceneMessages.kBeforeOpen, sceneMessages.kBeforeNew, sceneMessages.kBeforeImport,
+						sceneMessages.kBeforeCreateReference, sceneMessages.kBeforeLoadReference,
+						sceneMessages.kBeforeUnloadReference, sceneMessages.kBeforeRemoveReference):
+			self.callbackIds.append(sceneMessages.addCallback(message, self.suspend))
+		for message in (sceneMessages.kAfterOpen, sceneMessages.kAfterNew, sceneMessages.kAfterImport,
+						sceneMessages.kAfterCreateReference, sceneMessages.kAfterLoadReference,
+						sceneMessages.kAfterUnloadReference, sceneMessages.kAfterRemoveReference):
+			self.callbackIds.append(sceneMessages.addCallback(message, self.resume))
+
+	def removeLightCallbacks(self):
+		for light in self.lightCallbackIds:
+			om2.MMessage.removeCallbacks(self.lightCallbackIds[light])
+		self.lightCallbackIds = dict()
+
+	def removeSceneCallbacks(self):
+		if om2 != None and self.sceneCallbackIds:
+			om2.MMessage.removeCallbacks(self.sceneCallbackIds)
+		self.sceneCallbackIds = []
+		self.watchedNodes = set()
+
+	def stop(self):
+		#remove every callback, the index is listed again (and listening again) on the next query
+		if om2 != None:
+			if self.callbackIds:
+				om2.MMessage.removeCallbacks(self.callbackIds)
+			self.removeLightCallbacks()
+			self.removeSceneCallbacks()
+		self.callbackIds = []
+		self.watchingScene = False
+		self.watchedGeometry = set()
+		self.dirty = True
+
+	def watchScene(self, geometry):
+		#starts counting the edits of that geometry and of its shading networks in sceneChanges, on
+		#top of the geometry watched already. It's watched again after every listing of the scene
+		if om2 == None:
+			return
+		self.update()
+		self.watchingScene = True
+		self.watchGeometry(set(cmds.ls(list(geometry)) or []) & self.geometrySet)
+
+	def changes(self):
+		#sceneChanges once the nodes added since the last query are classified
+		self.update()
+		return self.sceneChanges
+
+	def watchLight(self, light):
+		if om2 == None:
+			return
+		nodes = om2.MSelectionList()
+		nodes.add(light)
+		transform = self.lightInfo[light]['transform']
+		if transform != None:
+			nodes.add(transform)
+		ids = []
+		for index in range(nodes.length()):
+			ids.append(om2.MNodeMessage.addAttributeChangedCallback(nodes.getDependNode(index), self.attributeChanged))
+		self.lightCallbackIds[light] = ids
+
+	def watchGeometry(self, geometry):
+		#the world placement of the shapes (moving any parent above them too), their own attributes
+		#and the shading groups they are assigned to
+		if om2 == None or not self.watchingScene or not geometry:
+			return
+		geometry = set(geometry)
+		self.watchedGeometry.update(geometry)
+		nodes = om2.MSelectionList()
+		for shape in geometry:
+			nodes.add(shape)
+		for index in range(nodes.length()):
+			node = nodes.getDependNode(index)
+			if not self.isWatched(node):
+				self.sceneCallbackIds.append(om2.MDagMessage.addWorldMatrixModifiedCallback(nodes.getDagPath(index), self.geometryMoved))
+				self.watchNode(node)
+		self.watchShading(sorted(set(cmds.listConnections(list(geometry), type='shadingEngine') or [])))
+
+	def watchShading(self, nodes):
+		#those shading nodes and everything upstream of them, nodes connected later are watched from connectionChanged
+		if not nodes:
+			return
+		network = set(nodes)
+		network.update(cmds.listHistory(nodes, pruneDagObjects=True) or [])
+		selection = om2.MSelectionList()
+		for node in network:
+			selection.add(node)
+		for index in range(selection.length()):
+			self.watchNode(selection.getDependNode(index))
+
+	def watchNode(self, node):
+		if not self.isWatched(node):
+			self.watchedNodes.add(om2.MObjectHandle(node).hashCode())
+			self.sceneCallbackIds.append(om2.MNodeMessage.addAttributeChangedCallback(node, self.sceneAttributeChanged))
+
+	def isWatched(self, node):
+		return om2.MObjectHandle(node).hashCode() in self.watchedNodes
+
+	def suspend(self, *args):
+		self.suspended = True
+
+	def resume(self, *args):
+		#removals and renames were missed while suspended (File > Open or New), and any edit of the scene
+		self.suspended = False
+		self.sceneChanges += 1
+		self.invalidate()
+
+	def types(self):
+		#the LightTypeResolver once the index is up to date, so it doesn't answer with the type
+		#a name had in the scene opened before
+		self.update()
+		return self.typeResolver
+
+	def nodeAdded(self, node, *args):
+		#only the handle is kept, names and types are resolved on the next query (new geometry counts then)
+		if not self.suspended and not self.dirty:
+			self.pending.append(om2.MObjectHandle(node))
+
+	def nodeRemoved(self, node, *args):
+		if self.isWatched(node):
+			self.sceneChanges += 1
+			self.watchedNodes.discard(om2.MObjectHandle(node).hashCode())
+		if not self.suspended and not self.dirty:
+			self.removeNode(om2.MFnDependencyNode(node).name())
+
+	def nameChanged(self, node, previousName, *args):
+		if not self.suspended and not self.dirty and node.hasFn(om2.MFn.kDagNode) and previousName:
+			self.renameNode(previousName, om2.MFnDagNode(node).partialPathName())
+
+	def parentChanged(self, child, parent, *args):
+		#a watched shape moved by it is counted by geometryMoved
+		if not self.suspended and not self.dirty:
+			if self.pathNames:
+				self.invalidate()
+			self.keyValues.pop('parent', None)
+			self.groups = dict()
+
+	def connectionChanged(self, plug, otherPlug, made, *args):
+		#shading assignments and networks of the watched geometry rewired, what is plugged into them
+		#(a shading group, a texture) is watched from now on with the nodes upstream of it
+		nodes = [plug.node(), otherPlug.node()]
+		if not [node for node in nodes if self.isWatched(node)]:
+			return
+		self.sceneChanges += 1
+		if self.suspended or self.dirty:
+			return
+		for node in nodes:
+			#the render settings are compared on their own, the override of the previews changes them
+			if (not self.isWatched(node) and not node.hasFn(om2.MFn.kDagNode)
+					and om2.MFnDependencyNode(node).name() not in LCMT.renderSettingsNodes):
+				self.watchShading([om2.MFnDependencyNode(node).name()])
+
+	def geometryMoved(self, *args):
+		self.sceneChanges += 1
+
+	def sceneAttributeChanged(self, message, plug, otherPlug, *args):
+		if message & om2.MNodeMessage.kAttributeSet:
+			self.sceneChanges += 1
+
+	def attributeChanged(self, message, plug, otherPlug, *args):
+		if message & om2.MNodeMessage.kAttributeSet:
+			if plug.partialName(useLongNames=True) == self.tagAttribute:
+				self.keyValues.pop('tag', None)
+				self.groups = dict()
+			#named like the index, a path when the name isn't unique
+			node = om2.MFnDagNode(plug.node()).partialPathName()
+			for listener in self.attributeListeners:
+				listener(node, plug)
+
+class VirtualList:
+	"""iconTextScrollList that only holds one page of a long list of names, with
+	a search field and page buttons above it. The names are kept sorted by their
+	lower case so a prefix search is two bisections, and typing more letters of a
+	substring search only looks through the last matches. The selection is kept
+	here by name across pages and searches, counted under the list and dropped
+	with the Clear button, selectCommand(added, removed) gets only what changed."""
+
+	def __init__(self, pageSize=500, selectCommand=None):
+		self.pageSize = pageSize
+		self.selectCommand = selectCommand
+		self.names = []
+		self.keys = []
+		self.matches = []
+		self.filterText = ''
+		self.substring = False
+		self.offset = 0
+		self.selected = set()
+		self.pageItems = []
+		self.control = None
+		self.pageText = None
+
+	def create(self):
+		#the controls go in the current layout, returns the name of the scroll list
+		cmds.rowLayout(numberOfColumns = 5, adjustableColumn = 1)
+		try:
+			#searched as the artist types
+			cmds.textField(placeholderText='Search...', textChangedCommand = lambda text: self.setFilter(text))
+		except TypeError:
+			#Maya versions without -textChangedCommand search on enter
+			cmds.textField(placeholderText='Search...', changeCommand = lambda text: self.setFilter(text))
+		cmds.checkBox( label='Anywhere', value=self.substring, cc = lambda value: self.setFilter(self.filterText, value))
+		cmds.button(label='<', command = lambda *args: self.page(-1))
+		cmds.button(label='>', command = lambda *args: self.page(1))
+		cmds.button(label='Clear', command = lambda *args: self.clearSelection())
+		cmds.setParent('..')
+		self.control = cmds.iconTextScrollList(allowMultiSelection=True, selectCommand = lambda *args: self.selectionChanged())
+		self.pageText = cmds.text(label='', align='left')
+		return self.control
+
+	def setItems(self, names):
+		self.names = sorted(names, key=lambda name: name.lower())
+		self.keys = [name.lower() for name in self.names]
+		self.selected &= set(self.names)
+		self.setFilter(self.filterText, reset=True)
+
+	def setFilter(self, text, substring=None, reset=False):
+		#reset searches all the names again, otherwise a longer substring search narrows the last matches
+		text = text.strip().lower()
+		if substring != None and bool(substring) != self.substring:
+			self.substring = bool(substring)
+			reset = True
+		if text == '':
+			self.matches = self.names
+		elif not self.substring:
+			#every Maya name character sorts before DEL
+			start = bisect.bisect_left(self.keys, text)
+			self.matches = self.names[start:bisect.bisect_left(self.keys, text + '\x7f', start)]
+		else:
+			names = self.names
+			if not reset and self.filterText and self.filterText in text:
+				names = self.matches
+			self.matches = [name for name in names if text in name.lower()]
+		self.filterText = text
+		self.offset = 0
+		self.show()
+
+	def page(self, step):
+		offset = self.offset + step * self.pageSize
+		if 0 <= offset < len(self.matches):
+			self.offset = offset
+			self.show()
+
+	def show(self):
+		self.pageItems = self.matches[self.offset:self.offset + self.pageSize]
+		cmds.iconTextScrollList(self.control, edit=True, removeAll=True)
+		if self.pageItems:
+			cmds.iconTextScrollList(self.control, edit=True, append=self.pageItems)
+		selected = [name for name in self.pageItems if name in self.selected]
+		if selected:
+			cmds.iconTextScrollList(self.control, edit=True, selectItem=selected)
+		self.showPageText()
+
+	def showPageText(self):
+		label = 'No matches'
+		if self.pageItems:
+			label = '%d-%d of %d' % (self.offset + 1, self.offset + len(self.pageItems), len(self.matches))
+		if self.selected:
+			#items selected in other pages or searches are not seen in the list
+			label += ', %d selected' % len(self.selected)
+		cmds.text(self.pageText, edit=True, label=label)
+
+	def selectionChanged(self):
+		#only the page shown can change, the items selected in other pages stay selected
+		pageSelection = set(cmds.iconTextScrollList(self.control, query=True, selectItem=True) or [])
+		added = [name for name in self.pageItems if name in pageSelection and name not in self.selected]
+		removed = [name for name in self.pageItems if name not in pageSelection and name in self.selected]
+		self.selected.update(added)
+		self.selected.difference_update(removed)
+		if added or removed:
+			self.showPageText()
+			if self.selectCommand != None:
+				self.selectCommand(added, removed)
+
+	def clearSelection(self):
+		removed = self.selection()
+		self.selected = set()
+		self.show()
+		if self.selectCommand != None and removed:
+			self.selectCommand([], removed)
+
+	def selection(self):
+		return sorted(self.selected, key=lambda name: name.lower())
+
+class LightParameterEditor:
+	"""Edits one parameter (intensity, exposure, color, temperature) on many lights at once.
+	The lights are split by node type with a single query, every type is mapped once
+	to the attribute that parameter lives in for its renderer, and the whole edit is
+	a single undo chunk. Values can be set, scaled or offset, the same for every light
+	or given per light as {light: value}."""
+
+	#parameter -> node type (or VRay*/Pxr* for every light of that renderer) -> attribute
+	#'light' stands for every Maya light, Arnold adds its ai* attributes to them
+	attributes = {'intensity': {'light': 'intensity', 'VRay*': 'intensityMult', 'aiAreaLight': 'intensity', 'aiSkyDomeLight': 'intensity', 'Pxr*': 'intensity'},
+				'exposure': {'light': 'aiExposure', 'aiAreaLight': 'aiExposure', 'aiSkyDomeLight': 'aiExposure', 'Pxr*': 'exposure'},
+				'color': {'light': 'color', 'VRay*': 'lightColor', 'aiAreaLight': 'color', 'aiSkyDomeLight': 'color', 'Pxr*': 'lightColor'},
+				'temperature': {'light': 'aiColorTemperature', 'VRay*': 'temperature', 'aiAreaLight': 'aiColorTemperature', 'Pxr*': 'temperature'}}
+
+	#switches that have to be on for the edited attribute to be used
+	enableAttributes = {'aiColorTemperature': ('aiUseColorTemperature', 1), 'temperature': ('colorMode', 1)}
+	pxrEnableAttributes = {'temperature': ('enableTemperature', 1)}
+
+	def __init__(self):
+		self.typeAttributes = dict()
+
+	def partitionByType(self, lights):
+		#{node type: [lights]} from one ls call, the lights named as they were given
+		partitions = dict()
+		if not lights:
+			return partitions
+		types = LightTypeResolver().resolve(lights)
+		for light in lights:
+			if light in types:
+				partitions.setdefault(types[light], []).append(light)
+		return partitions
+
+	def attribute(self, parameter, nodeType):
+		#(attribute, enable switch) of a parameter for a node type, (None, None) if it doesn't have one
+		key = (parameter, nodeType)
+		if key not in self.typeAttributes:
+			mapping = self.attributes[parameter]
+			attribute = mapping.get(nodeType)
+			if attribute == None and nodeType.startswith('VRay'):
+				attribute = mapping.get('VRay*')
+			if attribute == None and nodeType.startswith('Pxr'):
+				attribute = mapping.get('Pxr*')
+			if attribute == None and 'light' in (cmds.nodeType(nodeType, isTypeName=True, inherited=True) or []):
+				attribute = mapping.get('light')
+			enable = None
+			if attribute != None and not cmds.attributeQuery(attribute, type=nodeType, exists=True):
+				attribute = None
+			if attribute != None:
+				if nodeType.startswith('Pxr'):
+					enable = self.pxrEnableAttributes.get(attribute)
+				else:
+					enable = self.enableAttributes.get(attribute)
+				if enable != None and not cmds.attributeQuery(enable[0], type=nodeType, exists=True):
+					enable = None
+			self.typeAttributes[key] = (attribute, enable)
+		return self.typeAttributes[key]
+
+	def newValue(self, current, value, operation):
+		if operation == 'scale':
+			return current * value
+		if operation == 'offset':
+			return current + value
+		return value
+
+	def apply(self, lights, parameter, value, operation='set'):
+		#operation is 'set', 'scale' (multiply) or 'offset' (add), returns the number of lights edited.
+		#value is a {light: value} of the lights when they don't all get the same one
+		edited = 0
+		lightValues = None
+		if isinstance(value, dict):
+			lightValues = value
+		cmds.undoInfo(openChunk=True, chunkName='LCMT %s %s' % (operation, parameter))
+		try:
+			partitions = self.partitionByType(lights)
+			for nodeType in partitions:
+				attribute, enable = self.attribute(parameter, nodeType)
+				if attribute == None:
+					print LCMT.version, nodeType, 'lights don\'t have a', parameter, 'parameter, skipping', len(partitions[nodeType]), 'lights'
+					continue
+				for light in partitions[nodeType]:
+					plug = '%s.%s' % (light, attribute)
+					if lightValues != None:
+						if light not in lightValues:
+							print LCMT.version, 'No', parameter, 'value given for', light, 'skipping it'
+							continue
+						value = lightValues[light]
+					if enable != None:
+						cmds.setAttr('%s.%s' % (light, enable[0]), enable[1])
+					if parameter == 'color':
+						values = value
+						if not isinstance(values, (list, tuple)):
+							values = [values] * 3
+						current = [1.0, 1.0, 1.0]
+						if operation != 'set':
+							current = cmds.getAttr(plug)[0]
+						color = [self.newValue(current[channel], values[channel], operation) for channel in range(3)]
+						cmds.setAttr(plug, color[0], color[1], color[2], type='double3')
+					else:
+						current = 0.0
+						if operation != 'set':
+							current = cmds.getAttr(plug)
+						cmds.setAttr(plug, self.newValue(current, value, operation))
+					edited += 1
+		finally:
+			cmds.undoInfo(closeChunk=True)
+		return edited
+
+class LightVisibilityState:
+	"""Visibility of a set of lights (and the renderer flags that make them light
+	the scene, like the final gather of the mental ray IBL) read once at the start
+	of a contribution run. apply() only sets the plugs that differ from the last
+	contribution and restore() puts back exactly what was read, so it is safe to
+	call from a finally block."""
+
+	#node type -> attribute: (value when it is the contribution rendered, value for every other one)
+	#the environment lights of every renderer light the scene but never show as the background
+	flags = {'mentalrayIblShape': {'visibleInFinalGather': (1, 0), 'visibleInEnvironment': (0, 0)},
+			'VRayLightDomeShape': {'invisible': (1, 1)},
+			'aiSkyDomeLight': {'camera': (0, 0)}}
+
+	def __init__(self, lights, typeResolver=None):
+		#typeResolver (LightTypeResolver) answers the light types it already knows without a query
+		self.lights = []
+		self.transforms = dict()
+		self.types = dict()
+		self.original = dict()
+		if lights:
+			if typeResolver == None:
+				typeResolver = LightTypeResolver()
+			#the types of every light in one query
+			types = typeResolver.resolve(lights)
+			for light in lights:
+				if light in types and light not in self.types:
+					self.lights.append(light)
+					self.types[light] = types[light]
+		plugs = []
+		for light in self.lights:
+			self.transforms[light] = (cmds.listRelatives(light, parent=True, path=True) or [None])[0]
+			plugs.extend(self.plugs(light))
+		self.original = self.readPlugs(plugs)
+		self.current = dict(self.original)
+		#lights of the last apply(), None while the scene is as it was read
+		self.onLights = None
+
+	@staticmethod
+	def readPlugs(plugs):
+		#{plug: value} of the 'node.attribute' plugs. With OpenMaya their nodes are looked up with
+		#one selection list and the plugs read from it, instead of a getAttr round trip each
+		nodes = []
+		if om2 != None:
+			seen = set()
+			for plug in plugs:
+				node = plug.split('.', 1)[0]
+				if node not in seen:
+					seen.add(node)
+					nodes.append(node)
+			selection = om2.MSelectionList()
+			for node in nodes:
+				selection.add(node)
+		if om2 == None or selection.length() != len(nodes):
+			#two names of the same node are only one item of the selection list
+			return dict([(plug, cmds.getAttr(plug)) for plug in plugs])
+		functions = dict([(nodes[index], om2.MFnDependencyNode(selection.getDependNode(index))) for index in range(selection.length())])
+		values = dict()
+		for plug in plugs:
+			node, attribute = plug.split('.', 1)
+			values[plug] = functions[node].findPlug(attribute, False).asDouble()
+		return values
+
+	def plugs(self, light):
+		plugs = ['%s.visibility' % light]
+		if self.transforms[light] != None:
+			plugs.append('%s.visibility' % self.transforms[light])
+		for attribute in sorted(self.flags.get(self.types[light], {})):
+			plugs.append('%s.%s' % (light, attribute))
+		return plugs
+
+	def plan(self, lights, among=None):
+		#{plug: value} for only these lights to contribute, the transforms of the other
+		#lights keep their own visibility so restoring never has to touch them.
+		#among limits the plan to the plugs of some of the lights
+		lights = set(lights)
+		if among == None:
+			among = self.lights
+		target = dict()
+		for light in among:
+			on = light in lights
+			target['%s.visibility' % light] = int(on)
+			transform = self.transforms[light]
+			if transform != None:
+				#a transform shared with a light that is on stays visible
+				if on:
+					target['%s.visibility' % transform] = 1
+				else:
+					target.setdefault('%s.visibility' % transform, self.original['%s.visibility' % transform])
+			for attribute, values in self.flags.get(self.types[light], {}).items():
+				target['%s.%s' % (light, attribute)] = values[not on]
+		return target
+
+	def changes(self, target, state):
+		return sorted([plug for plug in target if bool(target[plug]) != bool(state[plug])])
+
+	def setPlugs(self, target):
+		changed = self.changes(target, self.current)
+		for plug in changed:
+			cmds.setAttr(plug, target[plug])
+			self.current[plug] = target[plug]
+		return len(changed)
+
+	def apply(self, lights):
+		#leave only these lights on, returns how many plugs had to be set.
+		#after the first contribution every other light is already off, so only the lights
+		#that were on or will be on are looked at and a run stays linear in the lights
+		lights = set([light for light in lights if light in self.types])
+		among = None
+		if self.onLights != None:
+			among = self.onLights | lights
+		changed = self.setPlugs(self.plan(lights, among))
+		self.onLights = lights
+		return changed
+
+	def restore(self):
+		self.onLights = None
+		return self.setPlugs(self.original)
+
+	def mel(self, lights):
+		#the same changes as a MEL script for the batch renders, they start from the saved scene
+		target = self.plan(lights)
+		return ''.join(['setAttr %s %d;\n' % (plug, target[plug]) for plug in self.changes(target, self.original)])
+
+class RenderSettingsOverride:
+	"""Render settings changed for a while, like the reduced resolution and
+	sampling of the preview contributions. apply() reads every plug before
+	setting it and restore() puts back exactly what was read, so it is safe to
+	call from a finally block. Plugs the renderer doesn't have are skipped."""
+
+	#renderer -> plug: value with the lowest anti aliasing that still shows the light
+	previewSampling = {'mayaSoftware': {'defaultRenderQuality.edgeAntiAliasing': 3, 'defaultRenderQuality.shadingSamples': 1,
+									'defaultRenderQuality.maxShadingSamples': 1},
+					'mentalRay': {'miDefaultOptions.minSamples': -2, 'miDefaultOptions.maxSamples': 0},
+					'arnold': {'defaultArnoldRenderOptions.AASamples': 1, 'defaultArnoldRenderOptions.GIDiffuseSamples': 1,
+							'defaultArnoldRenderOptions.GISpecularSamples': 1},
+					'vray': {'vraySettings.dmcMinSubdivs': 1, 'vraySettings.dmcMaxSubdivs': 1},
+					'renderman': {'rmanGlobals.hider_minSamples': 1, 'rmanGlobals.hider_maxSamples': 16},
+					'redshift': {'redshiftOptions.unifiedMinSamples': 1, 'redshiftOptions.unifiedMaxSamples': 4}}
+	#renderers with their own resolution, the others render at defaultResolution
+	resolutionPlugs = {'vray': ('vraySettings.width', 'vraySettings.height')}
+	defaultResolutionPlugs = ('defaultResolution.width', 'defaultResolution.height')
+
+	def __init__(self, values):
+		#plug -> value while the override is applied
+		self.values = values
+		self.original = dict()
+
+	@staticmethod
+	def preview(scale=0.25, renderer=None):
+		#the current resolution scaled down and the lowest sampling of the renderer
+		if renderer == None:
+			renderer = cmds.getAttr('defaultRenderGlobals.currentRenderer')
+		values = dict()
+		for plug in RenderSettingsOverride.resolutionPlugs.get(renderer, RenderSettingsOverride.defaultResolutionPlugs):
+			if cmds.objExists(plug):
+				values[plug] = max(1, int(round(cmds.getAttr(plug) * scale)))
+		values.update(RenderSettingsOverride.previewSampling.get(renderer, {}))
+		return RenderSettingsOverride(values)
+
+	@staticmethod
+	def resolution(renderer):
+		#(width, height) the renderer renders at now
+		plugs = RenderSettingsOverride.resolutionPlugs.get(renderer, RenderSettingsOverride.defaultResolutionPlugs)
+		if not all([cmds.objExists(plug) for plug in plugs]):
+			plugs = RenderSettingsOverride.defaultResolutionPlugs
+		return tuple([cmds.getAttr(plug) for plug in plugs])
+
+	def isApplied(self):
+		return len(self.original) > 0
+
+	def apply(self):
+		for plug in sorted(self.values):
+			if plug in self.original or not cmds.objExists(plug):
+				continue
+			self.original[plug] = cmds.getAttr(plug)
+			cmds.setAttr(plug, self.values[plug])
+
+	def restore(self):
+		for plug in self.original:
+			cmds.setAttr(plug, self.original[plug])
+		self.original = dict()
+
+class RenderJob:
+	"""One contribution render of the batch mode: the lights that stay on, the
+	MEL that sets their visibility before rendering and where the image goes.
+	frames is (first, last, step) to render a range, None for the frame the scene
+	was saved at."""
+
+	def __init__(self, name, lights, preRender, outputDir, imageName, frames=None):
+		self.name = name
+		self.lights = lights
+		self.preRender = preRender
+		self.outputDir = outputDir
+		self.imageName = imageName
+		self.frames = frames
+		#seconds the render is expected to take, set by ContributionScheduler
+		self.estimate = 0.0
+
+	def frameCount(self):
+		if self.frames == None:
+			return 1
+		first, last, step = self.frames
+		return int((last - first) // step) + 1
+
+class CommandLineRenderRunner:
+	"""Renders a RenderJob in its own process with Maya's Render command line.
+	Any other callable taking (job, scene) and returning (returnCode, log) can be
+	given to BatchRenderer instead, e.g. a local stand-in renderer for testing."""
+
+	#the memory limit is enforced as a cap on the address space of Render (ulimit -v), which
+	#reserves far more virtual memory than it ever uses, so the cap is this many times the limit
+	addressSpaceFactor = 4
+
+	def __init__(self, renderExecutable=None, extraArgs=None, memoryLimit=0):
+		if renderExecutable == None:
+			renderExecutable = 'Render'
+			if sys.platform == 'win32':
+				renderExecutable += '.exe'
+			if os.environ.get('MAYA_LOCATION'):
+				renderExecutable = os.path.join(os.environ['MAYA_LOCATION'], 'bin', renderExecutable)
+		self.renderExecutable = renderExecutable
+		self.extraArgs = extraArgs or []
+		#MB of memory each Render process is expected to use, 0 for no limit
+		self.memoryLimit = memoryLimit
+		if memoryLimit > 0 and not sys.platform.startswith('linux'):
+			print LCMT.version, 'The memory limit of the Render processes is only enforced on Linux'
+
+	def command(self, job, scene):
+		#the preRender MEL is sourced from a file so long light lists don't hit the command line limits
+		scriptPath = os.path.join(job.outputDir, job.imageName + '_preRender.mel')
+		f = open(scriptPath, 'w')
+		f.write(job.preRender)
+		f.close()
+		frameArgs = []
+		if job.frames != None:
+			frameArgs = ['-s', '%g' % job.frames[0], '-e', '%g' % job.frames[1], '-b', '%g' % job.frames[2]]
+		return [self.renderExecutable,
+				'-preRender', 'source "%s"' % scriptPath.replace('\\', '/'),
+				'-rd', job.outputDir,
+				'-im', job.imageName] + frameArgs + self.extraArgs + [scene]
+
+	def limitMemory(self, command):
+		#the shell caps the address space before it becomes Render, so nothing runs in the forked
+		#child of these threads (preexec_fn isn't safe with threads). A render going over the cap
+		#fails instead of swapping the other workers out
+		if self.memoryLimit <= 0 or not sys.platform.startswith('linux'):
+			return command
+		limit = self.memoryLimit * self.addressSpaceFactor * 1024
+		return ['/bin/sh', '-c', 'ulimit -v %d && exec "$@"' % limit, 'sh'] + command
+
+	def __call__(self, job, scene):
+		process = subprocess.Popen(self.limitMemory(self.command(job, scene)), stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+		log = process.communicate()[0]
+		return process.returncode, log
+
+class BatchRenderer:
+	"""Runs independent contribution renders concurrently on a bounded pool of
+	local worker processes (one render process per busy worker)."""
+
+	def __init__(self, runner=None, workers=0, memoryLimit=0):
+		if runner == None:
+			runner = CommandLineRenderRunner(memoryLimit=memoryLimit)
+		self.runner = runner
+		if workers <= 0:
+			workers = BatchRenderer.defaultWorkers()
+		#with a memory limit per worker no more workers than fit in the memory of the machine
+		totalMemory = BatchRenderer.physicalMemory()
+		if memoryLimit > 0 and totalMemory:
+			workers = min(workers, max(1, totalMemory // memoryLimit))
+		self.workers = workers
+
+	@staticmethod
+	def defaultWorkers():
+		#every render is already multithreaded so we don't take a worker per core
+		return max(1, multiprocessing.cpu_count() // 4)
+
+	@staticmethod
+	def physicalMemory():
+		#MB of RAM of the machine, None where it can't be read
+		try:
+			return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+		except (AttributeError, ValueError, OSError):
+			return None
+
+	def renderJob(self, job, scene):
+		start = time.time()
+		try:
+			returnCode, log = self.runner(job, scene)
+		except Exception, e:
+			returnCode, log = -1, str(e)
+		return {'job': job, 'returnCode': returnCode, 'log': log, 'time': time.time() - start}
+
+	def run(self, jobs, scene, callback=None):
+		#blocks until every job is done, callback(result) is called as each one finishes
+		#the jobs are started in the order given, ContributionScheduler puts the longest first
+		results = []
+		pool = ThreadPool(min(self.workers, max(1, len(jobs))))
+		try:
+			for result in pool.imap_unordered(lambda job: self.renderJob(job, scene), jobs):
+				results.append(result)
+				if callback != None:
+					callback(result)
+		finally:
+			pool.close()
+			pool.join()
+		return results
+
+class ContributionScheduler:
+	"""Expands the contributions of a batch render over a frame range, one
+	RenderJob per contribution and chunk of frames, and sorts them longest first
+	so a slow contribution doesn't end up rendering alone at the end of the run.
+	The time of every job comes from the RenderTelemetry logs of the scene, the
+	contributions never rendered before take the average of the others."""
+
+	def __init__(self, logFolder, scene):
+		self.history = ContributionScheduler.loadHistory(logFolder, scene)
+
+	@staticmethod
+	def loadHistory(folder, scene):
+		#contribution name -> [renders, seconds per frame] of the successful renders logged
+		history = dict()
+		for path in glob.glob(os.path.join(folder, '*.jsonl')):
+			try:
+				f = open(path)
+				try:
+					lines = f.readlines()
+				finally:
+					f.close()
+			except IOError:
+				continue
+			for line in lines:
+				try:
+					entry = json.loads(line)
+					#the previews are rendered with other settings, they don't tell how long a job takes
+					if entry.get('scene') != scene or entry.get('mode') == 'preview' or entry.get('cached') or entry.get('returnCode', 0) != 0:
+						continue
+					name = entry['name']
+					seconds = float(entry['seconds']) / max(int(entry.get('frames', 1)), 1)
+				except (ValueError, TypeError, KeyError, AttributeError):
+					#a line cut short by a crash, or written by something else
+					continue
+				stats = history.setdefault(name, [0, 0.0])
+				stats[0] += 1
+				stats[1] += seconds
+		return history
+
+	@staticmethod
+	def frameChunks(first, last, step=1, framesPerJob=1):
+		#(first, last, step) of every job of the range, framesPerJob frames each
+		frames = []
+		frame = first
+		while frame <= last:
+			frames.append(frame)
+			frame += step
+		framesPerJob = max(1, framesPerJob)
+		return [(frames[index], frames[min(index + framesPerJob, len(frames)) - 1], step) for index in range(0, len(frames), framesPerJob)]
+
+	@staticmethod
+	def parseFrames(text):
+		#'10', '1-100' or '1-100x2' (every other frame) -> (first, last, step)
+		match = re.match(r'^\s*(-?[\d.]+)\s*(?:-\s*(-?[\d.]+)\s*(?:x\s*([\d.]+))?)?\s*$', text)
+		if not match:
+			raise ValueError('frame range should be like 1-100 or 1-100x2, not %r' % text)
+		first = float(match.group(1))
+		last = first
+		if match.group(2):
+			last = float(match.group(2))
+		step = float(match.group(3) or 1)
+		if last < first or step <= 0:
+			raise ValueError('frame range %r is empty' % text)
+		return first, last, step
+
+	def secondsPerFrame(self, name):
+		if name in self.history:
+			renders, seconds = self.history[name]
+			return seconds / renders
+		if self.history:
+			return sum([seconds / renders for renders, seconds in self.history.values()]) / len(self.history)
+		return None
+
+	def estimate(self, job):
+		seconds = self.secondsPerFrame(job.name)
+		if seconds == None:
+			#nothing was ever logged for the scene, the contributions with more lights go first
+			seconds = len(job.lights)
+		return seconds * job.frameCount()
+
+	def jobs(self, contributions, chunks, makeJob):
+		#makeJob(name, lights, frames) for every contribution and chunk, the longest first
+		jobs = []
+		for name in sorted(contributions):
+			for frames in chunks:
+				job = makeJob(name, contributions[name], frames)
+				job.estimate = self.estimate(job)
+				jobs.append(job)
+		jobs.sort(key=lambda job: -job.estimate)
+		return jobs
+
+class RelightEngine:
+	"""Relights the beauty from the saved contribution images.
+	Light transport is linear so the beauty for any intensity and colour of the lights
+	is the sum of their contributions weighted by those multipliers. The images are
+	stacked once in a memory mapped array and the composite is updated with numpy
+	every time a multiplier changes instead of rendering again.
+	With a stackFolder the stack goes to a file of its own there, deleted by close()."""
+
+	#incremental updates between two exact sums of the stack, so float errors don't add up
+	recomputeInterval = 64
+
+	def __init__(self, names, images, stackFolder=None, parts=None):
+		#parts are the EXR part names of the images packed in one file, None for the others
+		self.names = list(names)
+		self.stackPath = None
+		if parts == None:
+			parts = [None] * len(images)
+		first = self.readImage(images[0], parts[0])
+		height, width = first.shape[:2]
+		shape = (len(images), height, width, 3)
+		if stackFolder != None:
+			#every engine maps its own file, an earlier one may still have its stack open
+			handle, self.stackPath = tempfile.mkstemp(prefix='lcmt_relightStack', suffix='.npy', dir=stackFolder)
+			os.close(handle)
+			self.stack = numpy.lib.format.open_memmap(self.stackPath, mode='w+', dtype=numpy.float32, shape=shape)
+		else:
+			self.stack = numpy.empty(shape, numpy.float32)
+		for index in range(len(images)):
+			if index == 0:
+				pixels = first
+			else:
+				pixels = self.readImage(images[index], parts[index])
+			if pixels.shape[:2] != (height, width):
+				raise ValueError('%s is %dx%d, the other contributions are %dx%d' % (images[index], pixels.shape[1], pixels.shape[0], width, height))
+			self.stack[index] = pixels[:, :, :3]
+		#the gain of a contribution is its intensity times its colour, kept apart so a zero
+		#intensity doesn't lose the colour
+		self.intensities = numpy.ones(len(images), numpy.float32)
+		self.colors = numpy.ones((len(images), 3), numpy.float32)
+		self.gains = numpy.ones((len(images), 3), numpy.float32)
+		self.recompute()
+
+	def recompute(self):
+		self.composite = numpy.einsum('nhwc,nc->hwc', self.stack, self.gains)
+		self.updates = 0
+		return self.composite
+
+	def close(self):
+		#unmaps and deletes the stack file, the engine can't be used afterwards
+		self.stack = None
+		if self.stackPath != None:
+			try:
+				os.remove(self.stackPath)
+			except OSError:
+				pass
+			self.stackPath = None
+
+	def updateImage(self, index, path, part=None):
+		#a contribution rendered again, the composite swaps its old pixels for the new ones
+		pixels = self.readImage(path, part)
+		if pixels.shape[:2] != self.stack.shape[1:3]:
+			raise ValueError('%s is %dx%d, the other contributions are %dx%d' % (path, pixels.shape[1], pixels.shape[0], self.stack.shape[2], self.stack.shape[1]))
+		self.composite -= self.stack[index] * self.gains[index]
+		self.stack[index] = pixels[:, :, :3]
+		if self.updates >= self.recomputeInterval:
+			return self.recompute()
+		self.composite += self.stack[index] * self.gains[index]
+		self.updates += 1
+		return self.composite
+
+	def setGain(self, index, intensity, color=(1.0, 1.0, 1.0), exact=False):
+		#only the difference of the contribution that changed is added to the composite,
+		#exact (and every recomputeInterval changes) sums the whole stack again
+		self.intensities[index] = intensity
+		self.colors[index] = color
+		gain = intensity * numpy.asarray(color, numpy.float32)
+		delta = gain - self.gains[index]
+		self.gains[index] = gain
+		if exact or self.updates >= self.recomputeInterval:
+			return self.recompute()
+		if delta.any():
+			self.composite += self.stack[index] * delta
+			self.updates += 1
+		return self.composite
+
+	@staticmethod
+	def readImage(path, part=None):
+		#float RGBA pixels, cached as .npy next to the image so they are memory mapped from then on.
+		#part is the name of the image in a multi-part EXR (see ImageWriter.packLayers)
+		cachePath = path + '.npy'
+		if part != None:
+			cachePath = '%s.%s.npy' % (path, part)
+		if os.path.exists(cachePath) and os.path.getmtime(cachePath) >= os.path.getmtime(path):
+			return numpy.load(cachePath, mmap_mode='r')
+		if oiio != None:
+			if part != None:
+				pixels = RelightEngine.readPart(path, part)
+			else:
+				pixels = oiio.ImageBuf(path).get_pixels(oiio.FLOAT)
+			if pixels.shape[2] < 4:
+				pixels = numpy.concatenate([pixels, numpy.ones(pixels.shape[:2] + (4 - pixels.shape[2],), numpy.float32)], axis=2)
+		else:
+			#read as float, 8 bit pixels would clip every contribution brighter than 1 and the sums with it
+			image = om2.MImage()
+			image.readFromFile(path, om2.MImage.kFloat)
+			if image.pixelType() != om2.MImage.kFloat:
+				raise IOError('%s can\'t be read as float pixels without OpenImageIO' % path)
+			width, height = image.getSize()
+			size = width * height * 4
+			buffer = image.getFloatPixels()
+			if isinstance(buffer, (int, long)):
+				buffer = (ctypes.c_float * size).from_address(buffer)
+			#MImage rows go from the bottom to the top
+			pixels = numpy.frombuffer(buffer, numpy.float32, size).reshape(height, width, 4)[::-1]
+		numpy.save(cachePath, numpy.ascontiguousarray(pixels, numpy.float32))
+		return numpy.load(cachePath, mmap_mode='r')
+
+	@staticmethod
+	def readPart(path, part):
+		image = oiio.ImageInput.open(path)
+		if image == None:
+			raise IOError(oiio.geterror())
+		try:
+			index = 0
+			while image.seek_subimage(index, 0):
+				if image.spec().getattribute('name') == part:
+					return image.read_image(oiio.FLOAT)
+				index += 1
+		finally:
+			image.close()
+		raise IOError('%s has no %s part' % (path, part))
+
+	@staticmethod
+	def writeImage(path, pixels):
+		height, width = pixels.shape[:2]
+		if oiio != None:
+			output = oiio.ImageBuf(oiio.ImageSpec(width, height, pixels.shape[2], oiio.FLOAT))
+			output.set_pixels(oiio.ROI(0, width, 0, height, 0, 1, 0, pixels.shape[2]), numpy.ascontiguousarray(pixels, numpy.float32))
+			output.write(path)
+			return
+		#float like the contributions, the render view shows what is over 1 with its exposure
+		rgba = numpy.ones((height, width, 4), numpy.float32)
+		rgba[:, :, :pixels.shape[2]] = pixels
+		image = om2.MImage()
+		image.create(width, height, 4, om2.MImage.kFloat)
+		image.setFloatPixels(bytearray(numpy.ascontiguousarray(rgba[::-1]).tostring()), width, height)
+		image.writeToFile(path, os.path.splitext(path)[1][1:])
+
+class ContributionStatistics:
+	"""How much every saved contribution adds to the frame, computed with numpy
+	from the pixels RelightEngine reads: mean and peak luminance, share of the
+	energy of all the contributions of the same frame and a luminance histogram.
+	Kept in a JSON file next to the render logs as {name: {frame: entry}} so the
+	next sessions can skip the lights that don't matter in any frame, every analysis
+	is merged with what is there."""
+
+	#Rec. 709 luminance of linear RGB
+	luminanceWeights = (0.2126, 0.7152, 0.0722)
+	histogramBins = 16
+
+	def __init__(self, path):
+		self.path = path
+		self.stats = None
+
+	def load(self):
+		if self.stats == None:
+			self.stats = dict()
+			if os.path.exists(self.path):
+				try:
+					f = open(self.path, 'r')
+					try:
+						stats = json.load(f)
+					finally:
+						f.close()
+					if not isinstance(stats, dict):
+						raise ValueError('not a dictionary of contributions')
+					self.stats = stats
+				except (IOError, ValueError), e:
+					#a corrupt file only loses the statistics, it is replaced with the next analysis
+					print LCMT.version, 'Could not read the contribution statistics', self.path, e
+		return self.stats
+
+	def save(self):
+		try:
+			writeJSON(self.path, self.load(), indent=1, sort_keys=True)
+		except (IOError, OSError), e:
+			print LCMT.version, 'Could not save the contribution statistics', self.path, e
+
+	@staticmethod
+	def imageStatistics(pixels, bins=16):
+		luminance = numpy.dot(pixels[:, :, :3], numpy.asarray(ContributionStatistics.luminanceWeights, numpy.float32))
+		peak = float(luminance.max())
+		#the bins go up to the peak of the image, a black one gets them all in the first bin
+		counts, edges = numpy.histogram(luminance, bins=bins, range=(0.0, max(peak, 1e-6)))
+		return {'mean': float(luminance.mean(dtype=numpy.float64)), 'peak': peak,
+				'energy': float(luminance.sum(dtype=numpy.float64)),
+				'histogram': counts.tolist(), 'histogramMax': float(edges[-1])}
+
+	@staticmethod
+	def frameKey(frame):
+		#JSON keys are strings
+		if frame == None:
+			return 'None'
+		return repr(float(frame))
+
+	def frameStats(self, frame):
+		#{name: entry} of a frame
+		key = ContributionStatistics.frameKey(frame)
+		stats = self.load()
+		return dict([(name, stats[name][key]) for name in stats if key in stats[name]])
+
+	def analyze(self, contributions, frame=None):
+		#contributions {name: {'lights': [...], 'image': path}} rendered at frame, merged with the stored
+		#ones: they replace the entries of the same name or with any of their lights at that frame,
+		#and the shares are of the energy of every contribution stored for the frame
+		stats = self.load()
+		key = ContributionStatistics.frameKey(frame)
+		lights = set()
+		for name in contributions:
+			entry = ContributionStatistics.imageStatistics(RelightEngine.readImage(contributions[name]['image'], contributions[name].get('part')), self.histogramBins)
+			entry['lights'] = contributions[name]['lights']
+			entry['image'] = contributions[name]['image']
+			entry['frame'] = frame
+			stats.setdefault(name, dict())[key] = entry
+			lights.update(entry['lights'])
+		for name in stats.keys():
+			if name not in contributions and key in stats[name] and lights.intersection(stats[name][key]['lights']):
+				del stats[name][key]
+				if not stats[name]:
+					del stats[name]
+		frameStats = self.frameStats(frame).values()
+		total = sum([entry['energy'] for entry in frameStats])
+		for entry in frameStats:
+			entry['share'] = 0.0
+			if total > 0:
+				entry['share'] = entry['energy'] / total
+		self.save()
+		return stats
+
+	def rank(self, groups=None, frame=None):
+		#[(name, lights, mean, peak, share)] of a frame brightest first, per light group if groups
+		#(groupLightsByName) are given: the contributions whose lights are all in a group add up to it
+		stats = self.frameStats(frame)
+		if groups == None:
+			rows = [(name, stats[name]['lights'], stats[name]['mean'], stats[name]['peak'], stats[name]['share']) for name in stats]
+		else:
+			rows = []
+			for group in groups:
+				members = [entry for entry in stats.values() if entry['lights'] and set(entry['lights']) <= set(groups[group])]
+				if members:
+					#light transport is linear: the means and shares add up, the peak is the brightest one's
+					rows.append((group, groups[group], sum([entry['mean'] for entry in members]),
+								max([entry['peak'] for entry in members]), sum([entry['share'] for entry in members])))
+		return sorted(rows, key=lambda row: -row[4])
+
+	def negligibleLights(self, threshold):
+		#lights under that share of the energy in every contribution (and frame) they are in
+		lights = set()
+		significant = set()
+		for frames in self.load().values():
+			for entry in frames.values():
+				if entry['share'] < threshold:
+					lights.update(entry['lights'])
+				else:
+					significant.update(entry['lights'])
+		return lights - significant
+
+class RenderCache:
+	"""Contribution images stored under a hash of the light and scene state.
+	Lives in images/lcmt_cache/ with an index.json of the entries, when the folder
+	grows over maxBytes the least recently used images are deleted. Cache hits only
+	update the index in memory, flush() saves them once per run."""
+
+	def __init__(self, folder, maxBytes=2*1024**3):
+		self.folder = folder
+		self.indexPath = folder + 'index.json'
+		self.maxBytes = maxBytes
+		self.index = None
+		#entries read or dropped since the index was saved
+		self.modified = False
+
+	def load(self):
+		if self.index == None:
+			self.index = dict()
+			if os.path.exists(self.indexPath):
+				try:
+					f = open(self.indexPath, 'r')
+					try:
+						index = json.load(f)
+					finally:
+						f.close()
+					if not isinstance(index, dict):
+						raise ValueError('not a dictionary of cache entries')
+					self.index = index
+				except (IOError, ValueError), e:
+					#a corrupt index only loses the cached renders, it is replaced with the next one
+					print LCMT.version, 'Could not read the render cache index', self.indexPath, e
+		return self.index
+
+	def save(self):
+		#the cache can be shared by the whole project
+		writeJSON(self.indexPath, self.load())
+		self.modified = False
+
+	def flush(self):
+		#saves the recency of the hits, so the eviction of the next sessions knows about them
+		if self.modified:
+			self.save()
+
+	def get(self, key):
+		entry = self.load().get(key)
+		if entry == None:
+			return None
+		path = self.folder + entry['file']
+		self.modified = True
+		if not os.path.exists(path):
+			del self.index[key]
+			return None
+		entry['used'] = time.time()
+		return path
+
+	def path(self, key, extension):
+		if not os.path.exists(self.folder):
+			os.makedirs(self.folder)
+		return self.folder + key + extension
+
+	def add(self, key, path):
+		#path has to be inside the cache folder, see path(). An image bigger than the whole cache
+		#isn't kept (the file is deleted), returns whether it was
+		size = os.path.getsize(path)
+		if size > self.maxBytes:
+			os.remove(path)
+			return False
+		self.load()[key] = {'file': os.path.basename(path), 'size': size, 'used': time.time()}
+		self.evict(key)
+		self.save()
+		return True
+
+	def evict(self, keep=None):
+		#the least recently used entries but keep, the one just added
+		index = self.load()
+		total = sum(entry['size'] for entry in index.values())
+		for key in sorted(index, key=lambda key: index[key]['used']):
+			if total <= self.maxBytes:
+				break
+			if key == keep:
+				continue
+			total -= index[key]['size']
+			if os.path.exists(self.folder + index[key]['file']):
+				os.remove(self.folder + index[key]['file'])
+			del index[key]
+
+	def clear(self):
+		for key in self.load().keys():
+			if os.path.exists(self.folder + self.index[key]['file']):
+				os.remove(self.folder + self.index[key]['file'])
+		self.index = dict()
+		self.save()
+
+class ImageWriter:
+	"""Saves the contribution images in background threads so the next render doesn't
+	wait for the disk. The render view can only be written from the main thread, so
+	it goes to a local temp file that the writer threads move to the project, or pack
+	with the rest of the run into one multi-part EXR. The queue is bounded: when the
+	disk can't keep up submit() waits instead of piling up images in the temp folder."""
+
+	def __init__(self, workers=2, maxPending=16):
+		self.workers = workers
+		self.queue = Queue.Queue(maxPending)
+		self.threads = []
+		#(job, file it was writing, exception) of the jobs that failed, reported by wait()
+		self.errors = []
+		self.tempFolder = None
+
+	#argument of each job that is the file it writes
+	outputArguments = {'moveFile': 1, 'packLayers': 0}
+
+	def start(self):
+		#the threads are only started with the first image
+		while len(self.threads) < self.workers:
+			thread = threading.Thread(target=self.work)
+			thread.daemon = True
+			thread.start()
+			self.threads.append(thread)
+
+	def work(self):
+		while True:
+			function, args, done = self.queue.get()
+			try:
+				function(*args)
+			except Exception, e:
+				self.errors.append((function.__name__, args[self.outputArguments.get(function.__name__, 0)], e))
+			done.set()
+			self.queue.task_done()
+
+	def submit(self, function, *args):
+		#returns an event set once the job is done (or failed)
+		self.start()
+		done = threading.Event()
+		self.queue.put((function, args, done))
+		return done
+
+	def wait(self):
+		#block until every image submitted is written, returns the errors since the last wait
+		self.queue.join()
+		errors, self.errors = self.errors, []
+		for job, output, e in errors:
+			print LCMT.version, 'ERROR:', job, 'failed for', output, e
+		#the temp folder goes once nothing is left in it, the images of a failed pack stay
+		if self.tempFolder != None and not os.listdir(self.tempFolder):
+			os.rmdir(self.tempFolder)
+			self.tempFolder = None
+		return errors
+
+	def isTemporary(self, path):
+		return self.tempFolder != None and os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.tempFolder)
+
+	def tempPath(self, extension):
+		if self.tempFolder == None:
+			self.tempFolder = tempfile.mkdtemp(prefix='lcmt_images_')
+		handle, path = tempfile.mkstemp(extension, 'contribution_', self.tempFolder)
+		os.close(handle)
+		return path
+
+	@staticmethod
+	def moveFile(source, destination, keepSource=False):
+		folder = os.path.dirname(destination)
+		if folder and not os.path.exists(folder):
+			try:
+				os.makedirs(folder)
+			except OSError:
+				#made by another writer thread in the meantime
+				pass
+		if keepSource:
+			shutil.copyfile(source, destination)
+		else:
+			shutil.move(source, destination)
+
+	@staticmethod
+	def packLayers(path, layers, waitFor=(), removeAfter=()):
+		#[(layer name, image path)] into one multi-part EXR with a named part per layer,
+		#waitFor are the events of the jobs still writing those images and the images
+		#in removeAfter are deleted once they are packed
+		for event in waitFor:
+			event.wait()
+		missing = [image for name, image in layers if not os.path.exists(image)]
+		if missing:
+			raise IOError('%d images to pack are missing: %s' % (len(missing), ', '.join(missing)))
+		images = [(name, oiio.ImageBuf(image)) for name, image in layers]
+		if not images:
+			return None
+		specs = []
+		for name, image in images:
+			spec = oiio.ImageSpec(image.spec())
+			spec.set_format(oiio.HALF)
+			spec.attribute('name', name)
+			specs.append(spec)
+		folder = os.path.dirname(path)
+		if folder and not os.path.exists(folder):
+			os.makedirs(folder)
+		output = oiio.ImageOutput.create(path)
+		if output == None or not output.supports('multiimage'):
+			raise IOError('multi-part images can\'t be written to %s %s' % (path, oiio.geterror()))
+		if not output.open(path, specs):
+			raise IOError(output.geterror())
+		for index in range(len(images)):
+			if index and not output.open(path, specs[index], 'AppendSubimage'):
+				raise IOError(output.geterror())
+			output.write_image(images[index][1].get_pixels(oiio.FLOAT))
+		output.close()
+		for image in removeAfter:
+			os.remove(image)
+		return path
+
+class RenderTelemetry:
+	"""Timings of the contribution renders of one run. Every render is appended as
+	a JSON line to a log in images/lcmt_logs/ (one file per run, so the logs of
+	several artists can be gathered and aggregated) and the average so far gives
+	the time left for the progress window."""
+
+	def __init__(self, folder, scene, mode, total):
+		self.folder = folder
+		self.scene = scene
+		self.mode = mode
+		self.total = total
+		self.records = []
+		self.started = time.time()
+		self.renderer = cmds.getAttr('defaultRenderGlobals.currentRenderer')
+		#read with the first render, once a preview has scaled it down
+		self.resolution = None
+		self.path = '%s%s_%s_%s.jsonl' % (folder, scene, mode, time.strftime('%Y%m%d_%H%M%S'))
+		self.lock = threading.Lock()
+
+	def record(self, name, lights, seconds, cached=False, returnCode=0, frames=1):
+		if type(lights)!=list:
+			lights = [lights]
+		if self.resolution == None:
+			self.resolution = RenderSettingsOverride.resolution(self.renderer)
+		entry = {'time': time.time(), 'scene': self.scene, 'mode': self.mode,
+				'name': name, 'lights': lights, 'renderer': self.renderer,
+				'width': self.resolution[0], 'height': self.resolution[1],
+				'seconds': round(seconds, 3), 'cached': cached, 'returnCode': returnCode,
+				'frames': frames}
+		self.lock.acquire()
+		try:
+			self.records.append(entry)
+			try:
+				if not os.path.exists(self.folder):
+					os.makedirs(self.folder)
+				f = open(self.path, 'a')
+				f.write(json.dumps(entry) + '\n')
+				f.close()
+			except (IOError, OSError), e:
+				print LCMT.version, 'Could not write the render log', self.path, e
+		finally:
+			self.lock.release()
+		return entry
+
+	def eta(self):
+		#seconds left at the average time of the contributions done so far
+		done = len(self.records)
+		if done == 0:
+			return None
+		return (time.time() - self.started) / done * max(self.total - done, 0)
+
+	def progressLabel(self):
+		done = len(self.records)
+		eta = self.eta()
+		if eta == None:
+			return '0/%d done, estimating time left...' % self.total
+		return '%d/%d done, %s left (last one took %s)' % (done, self.total, self.formatSeconds(eta), self.formatSeconds(self.records[-1]['seconds']))
+
+	@staticmethod
+	def formatSeconds(seconds):
+		minutes, seconds = divmod(int(round(seconds)), 60)
+		hours, minutes = divmod(minutes, 60)
+		if hours:
+			return '%dh %02dm' % (hours, minutes)
+		if minutes:
+			return '%dm %02ds' % (minutes, seconds)
+		return '%ds' % seconds
+
+class CommandProxy:
+	"""Stands in for maya.cmds or maya.mel while any CommandProfiler is installed,
+	every command is looked up once and wrapped to be charged to the profilers."""
+
+	def __init__(self, module, profilers, prefix=''):
+		self.module = module
+		self.profilers = profilers
+		self.prefix = prefix
+
+	def __getattr__(self, name):
+		function = getattr(self.module, name)
+		if callable(function):
+			function = CommandProfiler.wrapCommand(self.profilers, self.prefix + name, function)
+		self.__dict__[name] = function
+		return function
+
+class CommandProfiler:
+	"""Opt-in count and time of the cmds and mel calls made inside each LCMT method.
+	While installed the cmds and mel of this file are CommandProxy objects and the
+	methods of the tool are wrapped, every command is charged to the innermost LCMT
+	method running. After each UI action (a method called from outside the tool)
+	the top offenders of that action are printed, the totals can be exported.
+	Every LCMT has its own profiler, the proxies are shared by the ones installed
+	and the module gets its cmds and mel back when the last one is uninstalled."""
+
+	#profilers installed and the cmds and mel they replaced, in every LCMT instance
+	installed = []
+	original = None
+
+	def __init__(self, top=10):
+		self.top = top
+		self.reportAfterAction = True
+		#(method, command) -> [calls, seconds]
+		self.stats = dict()
+		self.action = dict()
+		#method -> [calls, seconds] including the time of the commands
+		self.methods = dict()
+		self.local = threading.local()
+		self.lock = threading.Lock()
+		self.tool = None
+
+	def isInstalled(self):
+		return self in CommandProfiler.installed
+
+	def install(self, tool):
+		if self.isInstalled():
+			return
+		if not CommandProfiler.installed:
+			namespace = globals()
+			CommandProfiler.original = (namespace['cmds'], namespace['mel'])
+			namespace['cmds'] = CommandProxy(CommandProfiler.original[0], CommandProfiler.installed)
+			namespace['mel'] = CommandProxy(CommandProfiler.original[1], CommandProfiler.installed, 'mel.')
+		CommandProfiler.installed.append(self)
+		#methods looked up on the instance shadow the class ones, the UI callbacks go through them
+		self.tool = tool
+		for name in dir(tool.__class__):
+			if not name.startswith('_') and callable(getattr(tool.__class__, name)) and name not in tool.__dict__:
+				setattr(tool, name, self.wrapMethod(name, getattr(tool, name)))
+
+	def uninstall(self):
+		if not self.isInstalled():
+			return
+		CommandProfiler.installed.remove(self)
+		if not CommandProfiler.installed:
+			namespace = globals()
+			namespace['cmds'], namespace['mel'] = CommandProfiler.original
+			CommandProfiler.original = None
+		for name in dir(self.tool.__class__):
+			if getattr(self.tool.__dict__.get(name), 'profiledMethod', False):
+				del self.tool.__dict__[name]
+		self.tool = None
+
+	def stack(self):
+		if not hasattr(self.local, 'stack'):
+			self.local.stack = []
+		return self.local.stack
+
+	def add(self, table, key, seconds):
+		entry = table.get(key)
+		if entry == None:
+			entry = table[key] = [0, 0.0]
+		entry[0] += 1
+		entry[1] += seconds
+
+	@staticmethod
+	def wrapCommand(profilers, command, function):
+		def profiled(*args, **kwargs):
+			startTime = time.time()
+			try:
+				return function(*args, **kwargs)
+			finally:
+				seconds = time.time() - startTime
+				#charged to the tools running a method in this thread, or to all of them as a call from outside
+				running = [profiler for profiler in profilers if profiler.stack()]
+				for profiler in running or list(profilers):
+					profiler.record(command, seconds)
+		return profiled
+
+	def record(self, command, seconds):
+		stack = self.stack()
+		key = (stack and stack[-1] or '<outside LCMT>', command)
+		self.lock.acquire()
+		try:
+			self.add(self.stats, key, seconds)
+			self.add(self.action, key, seconds)
+		finally:
+			self.lock.release()
+
+	def wrapMethod(self, name, method):
+		profiler = self
+		def profiled(*args, **kwargs):
+			stack = profiler.stack()
+			if not stack:
+				profiler.action = dict()
+			stack.append(name)
+			startTime = time.time()
+			try:
+				return method(*args, **kwargs)
+			finally:
+				stack.pop()
+				profiler.lock.acquire()
+				try:
+					profiler.add(profiler.methods, name, time.time() - startTime)
+				finally:
+					profiler.lock.release()
+				if not stack and profiler.reportAfterAction and profiler.action:
+					profiler.report(profiler.action, name)
+		profiled.profiledMethod = True
+		return profiled
+
+	def rows(self, stats=None):
+		#[(seconds, calls, method, command)] from the most expensive
+		if stats == None:
+			stats = self.stats
+		return sorted([(stats[key][1], stats[key][0], key[0], key[1]) for key in stats], reverse=True)
+
+	def report(self, stats=None, action=None):
+		rows = self.rows(stats)
+		title = 'Maya calls'
+		if action != None:
+			title += ' of ' + action
+		print LCMT.version, title + ': %d calls in %.3fs' % (sum([row[1] for row in rows]), sum([row[0] for row in rows]))
+		for seconds, calls, method, command in rows[:self.top]:
+			print '    %-32s %-24s %8d calls %9.3fs' % (method, command, calls, seconds)
+
+	def reset(self):
+		self.stats = dict()
+		self.action = dict()
+		self.methods = dict()
+
+	def export(self, path):
+		#JSON, or CSV when the path ends with .csv
+		rows = self.rows()
+		folder = os.path.dirname(path)
+		if folder and not os.path.exists(folder):
+			os.makedirs(folder)
+		f = open(path, 'w')
+		if path.lower().endswith('.csv'):
+			f.write('method,command,calls,seconds\n')
+			for seconds, calls, method, command in rows:
+				f.write('%s,%s,%d,%.6f\n' % (method, command, calls, seconds))
+		else:
+			json.dump({'version': LCMT.version, 'scene': cmds.file(query=True, sceneName=True), 'time': time.time(),
+					'commands': [{'method': method, 'command': command, 'calls': calls, 'seconds': seconds} for seconds, calls, method, command in rows],
+					'methods': [{'method': method, 'calls': self.methods[method][0], 'seconds': self.methods[method][1]} for method in sorted(self.methods)]},
+					f, indent=1)
+		f.close()
+		return path
 
 class LCMT:
 	"""Light Contribution Management Tool
@@ -11,159 +2188,249 @@ class LCMT:
 	2012"""
 	
 	version = '[LCMT v. 3.6.4]'
-	lightDB = ''
+	lightDB = None
 	path = ''
 	fullPath = ''
 	saveImages = False
 	MentalRayLightTypes = ['mentalrayIblShape'] 
-	RenderManLightTypes = []#['RmanEnvLightShape'] #revise with renderman
+	RenderManLightTypes = ['PxrRectLight', 'PxrDomeLight', 'PxrDiskLight', 'PxrDistantLight', 'PxrSphereLight', 'PxrCylinderLight', 'PxrEnvDayLight']
 	VrayLightTypes = ['VRayLightIESShape', 'VRayLightMesh', 'VRayLightMeshLightLinking', 'VRayLightMtl', 'VRayLightRectShape', 'VRayLightSphereShape','VRayLightDomeShape']
 	ArnoldLightTypes = ['aiAreaLight','aiSkyDomeLight']
 	
+	#groupings of the "Group by" menu: label -> SceneIndex.groupKeys
+	groupingModes = [('Keyword', ('keyword',)), ('Type', ('type',)), ('Namespace', ('namespace',)),
+					('Parent Group', ('parent',)), ('Tag (lcmtGroup)', ('tag',)), ('Type + Keyword', ('type', 'keyword')),
+					('Namespace + Keyword', ('namespace', 'keyword')), ('Parent Group + Keyword', ('parent', 'keyword'))]
+
+	#attributes renderAllLights toggles to isolate a contribution, they don't change its image
+	visibilityAttributes = ('visibility', 'visibleInFinalGather', 'visibleInEnvironment', 'invisible', 'camera')
+
+	#render settings of every renderer, part of the render cache keys
+	renderSettingsNodes = ['defaultRenderGlobals', 'defaultResolution', 'defaultRenderQuality', 'miDefaultOptions',
+						'defaultArnoldRenderOptions', 'vraySettings', 'rmanGlobals', 'redshiftOptions']
+
+	#sets holding the geometry shared by the render layers (see createSharedGeometryLayers)
+	sharedGeometrySet = 'LCMT_sharedGeometry'
+
 	#Bug fix Issue #1 and #8 
 	NonGeoTypes = ['cylindricalLightLocator', 'discLightLocator', 'rectangularLightLocator', 'sphericalLightLocator']
 
-	lightTypes = []
+	#shared by every LCMT instance so the node types are scanned once per session
+	rendererRegistry = RendererRegistry()
 
 	def __init__(self):
-		#Create new file for database if there isn't one
+		#nothing is scanned or read from disk here: the light DB is loaded the first time a
+		#light is grouped and the render engines detected the first time lightTypes is used
 		self.path = cmds.workspace(q=True, rd=True)+'scripts/'
-		self.fullPath = self.path + 'LCMT_lightTypesDB.txt'
+		self.lightDB = LightTypesDB(self.path)
+		self.fullPath = self.lightDB.fullPath
 		self.saveImages = False
-		#if file doesn't exist
-		if not os.path.exists(self.fullPath):
-			#check to see if there is a scripts directory in the project space
-			if not os.path.exists(self.path):
-				os.makedirs(self.path)
-			f = open(self.fullPath, 'w')
-			f.write('key|bounce|rim|background|wall|kick')
-			f.close()
-			self.lightDB = 'key|bounce|rim|background|wall|kick'
-		else:
-			#if the file exists initialize write the lightDB parameter
-			f = open(self.fullPath, 'r')
-			content = f.read()
-			self.lightDB = content
-			f.close()
-		#check which rendering engines are currently installed to not have any
-		#errors when searching for light types in the future
-		#since I don't know a quick way of querying what render engines are currently installed I'll use this workarround
-
-		self.lightTypes.append('light') #default maya light types
-
+		#saved contribution images {name: {'lights': [...], 'image': path}} used for relighting
+		self.contributions = dict()
+		self.relightEngine = None
+		self.relightShown = 0.0
+		self.relightInterval = 0.2
+		#contributions are only rendered again if the light or the scene changed, opt-in as
+		#sceneFingerprint can't see every change (deformations, textures on disk)
+		self.useRenderCache = False
+		self.renderCache = RenderCache(cmds.workspace(q=True, rd=True) + 'images/lcmt_cache/')
+		self.renderSceneFingerprint = None
+		#preview mode: renderAllLights at a fraction of the resolution and low sampling first,
+		#refineContributions renders the previewed contributions again with the real settings
+		self.previewScale = 0.25
+		self.renderSettingsOverride = None
+		self.previewContributions = []
+		self.previewUseGroups = False
+		self.previewGroupingKeys = None
+		#analysis of the saved contributions, with pruneNegligible the lights under pruneThreshold
+		#of the energy are left out of the next renders and render layers
+		self.contributionStatistics = None
+		self.pruneNegligible = False
+		self.pruneThreshold = 0.01
+		#contributions rendered at full settings {contributionName: {'lights': [...], 'groups': bool, 'groupingKeys': keys}} and the
+		#lights or transforms changed since then, updateContributions only renders those again
+		self.renderedContributions = dict()
+		self.renderedFingerprint = None
+		self.renderedKey = None
+		self.dirtyNodes = set()
+		#saved images are written by background threads, optionally packed in one EXR per run
+		self.imageWriter = ImageWriter()
+		self.packContributions = False
+		self.imageEvents = []
+		self.lightParameterEditor = LightParameterEditor()
+		self.lightNameClassifier = LightNameClassifier()
+		#every method reads the lights and geometry of the scene from here
+		self.sceneIndex = SceneIndex(self.lightNameClassifier)
+		#what "Group Lights" groups by, any combination of SceneIndex.groupKeys
+		self.groupingKeys = ('keyword',)
+		#VirtualList of each scroll list of the window by control name, and whether it shows groups
+		self.virtualLists = dict()
+		self.listModes = dict()
+		self.sceneIndex.typesLoader = self.updateRenderEngineTypes
+		self.sceneIndex.attributeListeners.append(self.lightAttributeChanged)
+		#cmds and mel calls of every method, only while profiling (LCMT_PROFILE=1 or the Profiling menu)
+		self.profiler = CommandProfiler()
+		#the node types are only scanned once per session (see RendererRegistry)
+		self.rendererRegistry.addListener(self.renderEnginesChanged)
+		if os.environ.get('LCMT_PROFILE'):
+			self.toggleProfiling()
+
+	def __getattr__(self, name):
+		#check which rendering engines are installed the first time the light types are needed
+		#to not have any errors when searching for light types
+		if name == 'lightTypes':
+			self.updateRenderEngineTypes()
+			return self.__dict__['lightTypes']
+		raise AttributeError(name)
+
+	def renderEnginesChanged(self):
+		#a plugin was loaded or unloaded, only matters once the light types were detected
+		if 'lightTypes' in self.__dict__:
+			self.updateRenderEngineTypes()
+
+	def updateRenderEngineTypes(self):
+		#rebuild the light and non geometry types from the registry scan
+		#(called again by the registry whenever a plugin is loaded or unloaded)
+		registry = self.rendererRegistry
+		self.lightTypes = ['light'] #default maya light types
+		self.NonGeoTypes = list(LCMT.NonGeoTypes)
 
 		#query if mental ray is installed
-		if self.isRenderEngineInstalled('mentalRay'):
+		if registry.isInstalled('mentalRay'):
 			self.lightTypes += self.MentalRayLightTypes
 			print self.version, "Mental Ray is installed"
 
 		#query if RenderMan is installed
-		if self.isRenderEngineInstalled('renderman'):
+		if registry.isInstalled('renderman'):
 			self.lightTypes += self.RenderManLightTypes
 			print self.version, "Renderman is installed"
 			
 		#query if Vray is installed
-		if self.isRenderEngineInstalled('vray'):
+		if registry.isInstalled('vray'):
 			self.lightTypes += self.VrayLightTypes
 			self.NonGeoTypes.append('VRayEnvironmentPreview')
 			print self.version, "Vray is installed"
 
-
 		#query if Arnold is Installed
-		if self.isRenderEngineInstalled('arnold'):
+		if registry.isInstalled('arnold'):
 			self.lightTypes += self.ArnoldLightTypes
 			for types in self.ArnoldLightTypes:
 				self.NonGeoTypes.append(types)
 			print self.version, "Arnold is installed"		
 
+		#only keep the types this Maya session knows about so cmds.ls never fails on an unknown type
+		self.lightTypes = [lightType for lightType in self.lightTypes if lightType == 'light' or registry.hasNodeType(lightType)]
+		self.NonGeoTypes = [nonGeoType for nonGeoType in self.NonGeoTypes if registry.hasNodeType(nonGeoType)]
+
 		print self.version, 'current light types:', self.lightTypes	        
 		print self.version, 'current NonGeoTypes', self.NonGeoTypes	        
+		self.sceneIndex.setTypes(self.lightTypes, self.NonGeoTypes)
 
 	def isRenderEngineInstalled(self,renderEngineName):
-        
-        #bug fix: 06-20-2012: if mentalRay plugin not installed maya still has nodes called mentalraytexture
-		#this prevents LCMT from not not working when the mentalray pluguin isn't installed by default
-		if renderEngineName == 'mentalray' or renderEngineName == 'mentalRay':
-			renderEngineName =  self.MentalRayLightTypes[-1]
-		#Arnold compatibility
-		elif renderEngineName == 'arnold':
-			#Since all there is no node specifically named arnold we use the 
-			#standard shader node name to see if arnold is indeed installed or no
-			renderEngineName = 'aiStandard'
-			
-		#query all the types and look for Vray Types, and Renderman Types
-		AllTypes = cmds.allNodeTypes()
-		regex = '\w*'+renderEngineName+'\w*'    
-		to_find = re.compile(regex,re.IGNORECASE)
-		to_search = ", ".join(AllTypes)
-		match = re.search(to_find, to_search)
-
-		if match!=None:
-			#print 'Found',renderEngineName
-			#print match.group()
-			return True
-		else:
+		#O(1) lookup in the session registry instead of scanning all the node types every time
+		installed = self.rendererRegistry.isInstalled(renderEngineName)
+		if not installed:
 			print self.version, 'Didn\'t find',renderEngineName
-			return False
+		return installed
    
 	def addLightTypesToFile(self, newContents=''):
 
-		if os.path.exists(self.fullPath):
-			f = open(self.fullPath, 'a')
-			f.write('|'+newContents)
-			f.close()
-			f = open(self.fullPath, 'r')
-			self.lightDB = f.read()
-			f.close()
-
-		else:
-			print 'ERROR Writing file: ', self.fullPath, 'it doesn\'t EXIST!!'
+		try:
+			self.lightDB.add(newContents)
+		except (IOError, OSError), e:
+			print 'ERROR Writing file: ', self.fullPath, e
 			return -1
 
 
 	def extractLightName(self, name):
-		lightTypes = self.lightDB
-		to_find = re.compile(lightTypes,re.IGNORECASE)
-		to_search = name
-		match = re.search(to_find, to_search)
-		if match!=None:
-			return match.group().lower()
-		else:        return name
+		#the classifier only recompiles when the light DB changed on disk
+		self.lightNameClassifier.setKeywords(self.lightDB.load())
+		return self.lightNameClassifier.classify(name)
 
 	def groupLightsByName(self, lights):
+		self.lightNameClassifier.setKeywords(self.lightDB.load())
+		return self.lightNameClassifier.classify_many(lights)
+
+	def groupLights(self, lights, keys=None):
+		#lights grouped like the UI list (self.groupingKeys by default), the key values come from the scene index
+		if keys == None:
+			keys = self.groupingKeys
+		self.lightNameClassifier.setKeywords(self.lightDB.load())
+		indexed = set(self.sceneIndex.getLights())
+		if all([light in indexed for light in lights]):
+			return self.sceneIndex.groupLights(lights, keys)
+		if tuple(keys) == ('keyword',):
+			return self.lightNameClassifier.classify_many(lights)
+		#lights the index doesn't know (hidden by a filter, just created) are listed again first
+		self.sceneIndex.invalidate()
+		return self.sceneIndex.groupLights(lights, keys)
+
+	def getLightGroups(self, visibleOnly=True, keys=None):
+		#grouping of the lights in the scene index, only regrouped when something changed
+		if keys == None:
+			keys = self.groupingKeys
+		self.lightNameClassifier.setKeywords(self.lightDB.load())
+		return self.sceneIndex.getGroups(visibleOnly, keys)
+
+	def setGroupingKeys(self, keys, listName=None, useGroups=None):
+		#keys like ('type', 'keyword'), the UI list is regrouped right away when it shows groups
+		self.groupingKeys = tuple(keys)
+		if listName != None and useGroups != None and cmds.checkBox(useGroups, query=True, value=True):
+			self.updateScollList(True, listName)
+
+
+
+	def isRenderSetupActive(self):
+		#Render Setup (Maya 2016.5 and up) unless the scene is using legacy render layers
+		try:
+			return bool(mel.eval('mayaHasRenderSetup()'))
+		except RuntimeError:
+			return False
 
-		lightGroups = dict()
-		for light in lights:
-			lightNameType = self.extractLightName(light)
-			if lightNameType not in lightGroups.keys():
-				lightGroups[lightNameType] = [light]
-			else:
-				lightGroups[lightNameType].append(light)
-
-		return lightGroups
-
-
-
-	def createLayersFromLights(self, selectedGeometry=[], lightsSelected=[]):
+	def sharedGeometrySetOf(self, geometry):
+		#the layers made earlier keep selecting their own set, so a set is only reused when it
+		#holds exactly this geometry, otherwise a new one is made (LCMT_sharedGeometry1, 2...)
+		members = set(cmds.ls(geometry, long=True) or [])
+		for sharedSet in sorted(cmds.ls(self.sharedGeometrySet + '*', type='objectSet') or []):
+			if set(cmds.ls(cmds.sets(sharedSet, query=True) or [], long=True) or []) == members:
+				return sharedSet
+		sharedSet = cmds.sets(name=self.sharedGeometrySet, empty=True)
+		#with no arguments sets would add the current selection
+		if geometry:
+			cmds.sets(geometry, add=sharedSet)
+		return sharedSet
+
+	def createSharedGeometryLayers(self, geometry, layers):
+		#the geometry goes once into a set that every layer selects with a collection,
+		#each layer only adds its own lights, so the cost doesn't grow with groups x geometry
+		import maya.app.renderSetup.model.renderSetup as renderSetup
+		sharedSet = self.sharedGeometrySetOf(geometry)
+		setup = renderSetup.instance()
+		for layerName, layerLights in layers:
+			layer = setup.createRenderLayer(layerName)
+			geometryCollection = layer.createCollection(layerName + '_geometry')
+			geometryCollection.getSelector().setPattern(sharedSet)
+			lightsCollection = layer.createCollection(layerName + '_lights')
+			lightsCollection.getSelector().staticSelection.set(layerLights)
+
+	def createLayersFromLights(self, selectedGeometry=[], lightsSelected=[], sharedGeometry=False):
 		#select all the lights in the scene includin IBL nodes    
-		lights = cmds.ls(type=self.lightTypes)
+		lights = self.sceneIndex.getLights()
 			
 		if selectedGeometry !=None and selectedGeometry !=[]:  
-			geometry = list(set(selectedGeometry) - set(lights) -set(cmds.ls(type =self.NonGeoTypes)))
+			geometry = list(set(selectedGeometry) - set(lights) -self.sceneIndex.getNonGeometry())
 		else: 
 			
 			#UPDATE:
 			geometry =  cmds.ls(dag=True,geometry=True, selection=True)
 			#Bug Fix Issue #10 (This takes out the lights that are geo types and makes sure we only have what we understand as geo
-			geometry = list(set(geometry) - set(lights) -set(cmds.ls(type =self.NonGeoTypes)))
+			geometry = list(set(geometry) - set(lights) -self.sceneIndex.getNonGeometry())
 			if geometry == []:
 				
 		
-				#select all the geometry in the scene
-				geometry =  cmds.ls(geometry=True)
-			#take out the ibl shapes from the geo selection
-			#											   Bug fix Issue #1 and #8 
-			geometry = list(set(geometry) - set(lights) -set(cmds.ls(type =self.NonGeoTypes)))   
+				#all the geometry in the scene, the index already took out the ibl shapes
+				#											   Bug fix Issue #1 and #8 
+				geometry =  self.sceneIndex.getGeometry()
 
 		if lightsSelected !=None and lightsSelected !=[]:
 			selectedLights = lightsSelected
@@ -172,26 +2439,38 @@ class LCMT:
 			selectedLights = cmds.ls(dag=True, selection=True, type=self.lightTypes)
 
 		#if there isn't any lights selected just create one layer for each light      
+		layers = []
 		if selectedLights == []:
-			lightGroups = self.groupLightsByName(lights)
+			#layers are named after the light keyword so they always group by it
+			lightGroups = self.getLightGroups(False, ('keyword',))
 			for group in lightGroups:   
-				test = lightGroups[group]
-				lightTrans = cmds.listRelatives(test, p=1)   
-				layerElements = geometry + lightGroups[group]
-				layerName = self.extractLightName(lightGroups[group][-1])
+				groupLights = self.pruneLights(lightGroups[group])
+				if groupLights == []:
+					continue
+				layerName = self.extractLightName(groupLights[-1])
 				layerName += '_Light'
-				cmds.createRenderLayer(layerElements, name=layerName)
+				layers.append((layerName, groupLights))
 		else:
 			#if we have a certain number of lights selected create a layer with all of those lights attached
+			selectedLights = self.pruneLights(selectedLights)
+			if selectedLights == []:
+				print self.version, 'Every selected light is negligible, no layer created'
+				return
 			lightTrans = cmds.listRelatives(selectedLights, p=1)   
-			layerElements = geometry + lightTrans
-			
 			layerName = self.extractLightName(lightTrans[-1])
-			cmds.createRenderLayer(layerElements, name=layerName)
+			layers.append((layerName, lightTrans))
+
+		if sharedGeometry:
+			if self.isRenderSetupActive():
+				self.createSharedGeometryLayers(geometry, layers)
+				return
+			print self.version, 'Shared geometry layers need Render Setup, creating legacy render layers'
+		for layerName, layerLights in layers:
+			cmds.createRenderLayer(geometry + layerLights, name=layerName)
 
 	def createRenderElementsFromLights(self, selectedGeometry=[], lightsSelected=[]):
 		#select all the lights in the scene includin IBL nodes    
-		lights = cmds.ls(type=self.lightTypes)
+		lights = self.sceneIndex.getLights()
 
 		if selectedGeometry !=None and selectedGeometry !=[]:   
 			geometry = selectedGeometry
@@ -199,11 +2478,11 @@ class LCMT:
 
 			#UPDATE:
 			geometry =  cmds.ls(dag=True,geometry=True, selection=True)
-			if geometry == []:
-				#select all the geometry in the scene
-				geometry =  cmds.ls(geometry=True)
 			#take out the ibl shapes from the geo selection
 			geometry = list(set(geometry) - set(lights))   
+			if geometry == []:
+				#all the geometry in the scene
+				geometry =  self.sceneIndex.getGeometry()
 
 		if lightsSelected !=None and lightsSelected !=[]:
 			selectedLights = lightsSelected
@@ -211,131 +2490,403 @@ class LCMT:
 			#see if there is any number of lights the the artist has selected 
 			selectedLights = cmds.ls(dag=True, selection=True, type=self.lightTypes)
 
-		#if there isn't any lights selected just create one layer for each light      
+		#if there isn't any lights selected just create one element for each light group
 		if selectedLights == []:
-			lightGroups = self.groupLightsByName(lights)
+			lightGroups = self.getLightGroups(False, ('keyword',))
+			elements = dict()
 			for group in lightGroups:   
-				layerElements = lightGroups[group]
-				layerName = self.extractLightName(lightGroups[group][-1])
-
-				#instead of creating a render layer we create a render element light select in vray
-				#cmds.createRenderLayer(layerElements, name=layerName)
-
-				#create Render Element easier in mel
-				mel.eval("vrayAddRenderElement LightSelectElement") 
-				LightSelectNode = cmds.ls(selection=True)
-				#rename it to something convenient
-				LightSelectNode = cmds.rename(LightSelectNode, 'vrayRE_'+layerName)
-				cmds.setAttr('%s.vray_name_lightselect' % LightSelectNode, layerName, type="string")
-				#assign the lights to the render element that is a set in maya
-				cmds.sets(layerElements, e=True, forceElement=LightSelectNode)
-
-
+				elements[self.extractLightName(lightGroups[group][-1])] = lightGroups[group]
+			#running it again updates the elements of the last run instead of adding new ones
+			self.syncLightSelectElements(elements, prune=True)
 		else:
-			#if we have a certain number of lights selected create a layer with all of those lights attached
+			#if we have a certain number of lights selected create an element with all of those lights attached
 			lightTrans = cmds.listRelatives(selectedLights, p=1)   
-			layerElements = lightTrans
 			layerName = self.extractLightName(lightTrans[-1])
-
-			#instead of creating a render layer we create a render element light select in vray
-			#cmds.createRenderLayer(layerElements, name=layerName)
-
-			#create Render Element easier in mel
-			mel.eval("vrayAddRenderElement LightSelectElement") 
-			LightSelectNode = cmds.ls(selection=True)
-			#rename it to something convenient
-			LightSelectNode = cmds.rename(LightSelectNode, 'vrayRE_'+layerName)
-			cmds.setAttr('%s.vray_name_lightselect' % LightSelectNode, layerName, type="string")
-			#assign the lights to the render element that is a set in maya
-			cmds.sets(layerElements, e=True, forceElement=LightSelectNode)
+			self.syncLightSelectElements({layerName: lightTrans})
+
+	def getLightSelectElements(self):
+		#{light select name: [nodes]} of the VRay LightSelect render elements in the scene
+		elements = dict()
+		for node in cmds.ls(type='VRayRenderElementSet') or []:
+			if cmds.getAttr('%s.vrayClassType' % node) == 'LightSelectElement':
+				elements.setdefault(cmds.getAttr('%s.vray_name_lightselect' % node), []).append(node)
+		return elements
+
+	def syncLightSelectElements(self, elements, prune=False):
+		#make the LightSelect elements match {name: lights}: only missing ones are created,
+		#duplicates removed and memberships only touched when they changed.
+		#prune also deletes the vrayRE_ elements of light groups that don't exist anymore
+		existing = self.getLightSelectElements()
+		created = updated = removed = 0
+		cmds.undoInfo(openChunk=True, chunkName='LCMT light select elements')
+		try:
+			for name in sorted(elements):
+				nodes = existing.pop(name, [])
+				if nodes == []:
+					#create Render Element easier in mel
+					mel.eval("vrayAddRenderElement LightSelectElement") 
+					LightSelectNode = cmds.ls(selection=True)
+					#rename it to something convenient
+					LightSelectNode = cmds.rename(LightSelectNode, 'vrayRE_'+name)
+					cmds.setAttr('%s.vray_name_lightselect' % LightSelectNode, name, type="string")
+					created += 1
+				else:
+					LightSelectNode = nodes[0]
+					#every extra element adds another output buffer to the render
+					if nodes[1:]:
+						cmds.delete(nodes[1:])
+						removed += len(nodes) - 1
+				#assign the lights to the render element that is a set in maya
+				members = set(cmds.ls(cmds.sets(LightSelectNode, q=True) or [], long=True))
+				if members != set(cmds.ls(elements[name], long=True)):
+					if members:
+						cmds.sets(clear=LightSelectNode)
+					cmds.sets(elements[name], e=True, forceElement=LightSelectNode)
+					updated += 1
+			if prune:
+				stale = [node for name in existing for node in existing[name] if node.startswith('vrayRE_')]
+				if stale:
+					cmds.delete(stale)
+					removed += len(stale)
+		finally:
+			cmds.undoInfo(closeChunk=True)
+		print self.version, 'LightSelect elements: %d created, %d updated, %d removed' % (created, updated, removed)
+
+	def createLightGroupAOVsFromLights(self, lightsSelected=[], render=False):
+		#same grouping as the VRay render elements but with Arnold light group AOVs or
+		#RenderMan LPE light groups, every contribution then comes out of a single render
+		if lightsSelected !=None and lightsSelected !=[]:
+			lightTrans = cmds.listRelatives(lightsSelected, p=1)   
+			lightGroups = {self.extractLightName(lightTrans[-1]): lightsSelected}
+		else:
+			lightGroups = self.getLightGroups(False)
+		#light group names end up in AOV and LPE names so only letters, numbers and _,
+		#groups like a:b and a_b are kept apart
+		names = self.fileNames(lightGroups)
+		groups = dict()
+		for group in lightGroups:
+			groups[names[group]] = lightGroups[group]
+
+		renderer = cmds.getAttr('defaultRenderGlobals.currentRenderer')
+		if renderer == 'arnold' and self.isRenderEngineInstalled('arnold'):
+			self.createArnoldLightGroups(groups)
+		elif renderer == 'renderman' and self.isRenderEngineInstalled('renderman'):
+			self.createRenderManLightGroups(groups)
+		else:
+			print self.version, 'Light group AOVs need Arnold or RenderMan as the current renderer, not', renderer
+			return
+		print self.version, 'Light groups', sorted(groups.keys()), 'created for', renderer
+
+		if render:
+			mel.eval("renderIntoNewWindow render")   
+
+	def createArnoldLightGroups(self, groups):
+		import mtoa.aovs as aovs
+		for group in groups:
+			for light in groups[group]:
+				if cmds.attributeQuery('aiAov', node=light, exists=True):
+					cmds.setAttr('%s.aiAov' % light, group, type="string")
+		#the beauty AOV split in one output per light group
+		interface = aovs.AOVInterface()
+		aovNode = interface.getAOVNode('RGBA')
+		if aovNode == None:
+			aovNode = interface.addAOV('RGBA').node
+		existing = (cmds.getAttr('%s.lightGroupsList' % aovNode) or '').split()
+		lightGroupsList = existing + [group for group in sorted(groups) if group not in existing]
+		cmds.setAttr('%s.lightGroups' % aovNode, 0)
+		cmds.setAttr('%s.lightGroupsList' % aovNode, ' '.join(lightGroupsList), type="string")
+
+	def createRenderManLightGroups(self, groups):
+		display = 'rmanDefaultDisplay'
+		if not cmds.objExists(display):
+			print self.version, 'ERROR: RenderMan display', display, 'not found'
+			return
+		for group in groups:
+			for light in groups[group]:
+				if cmds.attributeQuery('lightGroup', node=light, exists=True):
+					cmds.setAttr('%s.lightGroup' % light, group, type="string")
+			#one LPE display channel per light group on the beauty display
+			channel = 'lcmt_' + group
+			if not cmds.objExists(channel):
+				channel = cmds.createNode('rmanDisplayChannel', name=channel)
+				cmds.connectAttr('%s.message' % channel, '%s.displayChannels' % display, nextAvailable=True)
+			cmds.setAttr('%s.channelType' % channel, 'color', type="string")
+			cmds.setAttr('%s.channelSource' % channel, "lpe:C.*<L.'%s'>" % group, type="string")
 
 	def sortLightsByType(self, lights):
-		lightTypes = []
-		type=1
-		for light in lights:
-			type=1
-			if cmds.objectType( light, isType='mentalrayIblShape' ) == True:
-				type = 2
-			lightTypes.append((light,type))
-
-
-		lightTypes = sorted(lightTypes, key=lambda light: light[-1])
-		lights = []
-		for light in lightTypes:
-			lights.append(light[0])
-		return lights
+		#the environment lights (IBL, domes) after the others, each part keeps its order
+		environment = set(self.sceneIndex.types().environmentLights(lights))
+		return [light for light in lights if light not in environment] + [light for light in lights if light in environment]
 
-	def saveCurrentImageInRenderView(self, filename):    
+	def saveCurrentImageInRenderView(self, filename, source=None, pack=False):    
+		#source is a file that already has the image (the render cache), copied instead of saving the view again.
+		#pack keeps the image in the writer temp folder until the run is packed in one EXR
 		path = cmds.file(query=True,sceneName=True)
 		sceneName = os.path.split(path)[1].rsplit('.')[0]
 		projectSpace = cmds.workspace(q=True, rd=True)
 		imagesFolder = projectSpace + 'images/tmp/'
 		editor = 'renderView'
-		print 'Saving file', imagesFolder+sceneName+'_'+filename 
-		cmds.renderWindowEditor(editor, e=True, writeImage=imagesFolder+sceneName+'_'+filename)
+		#keep the extension of the image format in the render settings so the file can be read back
+		extension = self.imageExtension()
+		imagePath = imagesFolder+sceneName+'_'+filename+extension
+		if pack:
+			imagePath = self.imageWriter.tempPath(extension)
+		keepSource = source != None
+		if source == None:
+			#the render view can only be written from the main thread, to a local file
+			#that the writer threads move to its folder while the next light renders
+			source = imagePath
+			if not pack:
+				source = self.imageWriter.tempPath(extension)
+			cmds.renderWindowEditor(editor, e=True, writeImage=source)
+		print 'Saving file', imagePath 
+		if source != imagePath:
+			self.imageEvents.append(self.imageWriter.submit(ImageWriter.moveFile, source, imagePath, keepSource))
+		return imagePath
+
+	def packImages(self, path, layers):
+		#[(name, image)] of a run into one multi-part EXR, written once the images are
+		if oiio == None:
+			print self.version, 'ERROR: packing the contributions in one EXR needs OpenImageIO, the images were kept in', self.imageWriter.tempFolder
+			return None
+		partNames = self.fileNames([name for name, image in layers])
+		layers = [(partNames[name], image) for name, image in layers]
+		#the images saved for the pack only are deleted once they are in it
+		temporary = [image for name, image in layers if self.imageWriter.isTemporary(image)]
+		events, self.imageEvents = self.imageEvents, []
+		self.imageWriter.submit(ImageWriter.packLayers, path, layers, events, temporary)
+		#the saved contributions are read from the packed EXR from now on
+		parts = dict([(image, name) for name, image in layers])
+		for contribution in self.contributions.values():
+			if contribution['image'] in parts:
+				contribution['part'] = parts[contribution['image']]
+				contribution['image'] = path
+		print self.version, len(layers), 'contributions packed in', path
+		return path
+
+	@staticmethod
+	def fileNames(names):
+		#{name: name with only letters, digits and _} for file and EXR part names. Names like a:b and
+		#a_b or type/key and type_key would be the same, a counter keeps them apart (case insensitive
+		#for the Windows and macOS file systems)
+		fileNames = dict()
+		used = set()
+		for name in sorted(names):
+			fileName = base = re.sub('\W', '_', name)
+			count = 2
+			while fileName.lower() in used:
+				fileName = '%s_%d' % (base, count)
+				count += 1
+			used.add(fileName.lower())
+			fileNames[name] = fileName
+		return fileNames
+
+	def togglePackContributions(self):
+
+		self.packContributions = not(self.packContributions)
 
 	def isLightHidden(self, light):
 		lightTrans = cmds.listRelatives(light, p=1)[0]   
 		return cmds.getAttr('%s.visibility' % lightTrans) == False or cmds.getAttr('%s.visibility' % light) == False
 
-	def renderOnlyThisLight(self, lights):
+	def imageExtension(self):
+		#extension of the image format in the render settings
+		return os.path.splitext(cmds.renderSettings(firstImageName=True)[0])[1] or '.iff'
+
+	def nodeState(self, node, skip=()):
+		#values of the settable attributes of a node, anything that renders differently when edited
+		attributes = []
+		for attribute in sorted(cmds.listAttr(node, settable=True, scalar=True) or []):
+			if attribute in skip:
+				continue
+			try:
+				attributes.append((attribute, cmds.getAttr('%s.%s' % (node, attribute))))
+			except (RuntimeError, ValueError):
+				pass
+		return attributes
+
+	def globalState(self):
+		#scene, frame, render layer, render settings and cameras, a few queries whatever the size of the scene
+		cameras = [camera for camera in cmds.ls(type='camera') if cmds.getAttr('%s.renderable' % camera)]
+		state = [cmds.file(query=True, sceneName=True),
+				cmds.currentTime(query=True),
+				cmds.editRenderLayerGlobals(query=True, currentRenderLayer=True),
+				[(node, self.nodeState(node)) for node in sorted(cmds.ls(LCMT.renderSettingsNodes) or [])],
+				[(camera, cmds.xform(cmds.listRelatives(camera, p=1)[0], q=True, ws=True, matrix=True)) for camera in cameras]]
+		if self.renderSettingsOverride != None:
+			#a preview render is a different image than the full one
+			state.append(sorted(self.renderSettingsOverride.values.items()))
+		return state
+
+	def sceneFingerprint(self):
+		#what every contribution depends on besides its lights: the globalState, the placement of every
+		#piece of geometry and the shading networks. Deformations, texture files on disk and anything
+		#else outside of those aren't seen, which is why the render cache is off by default
+		geometry = self.sceneIndex.getGeometry()
+		state = self.globalState() + [geometry]
+		if geometry:
+			state.append(cmds.exactWorldBoundingBox(geometry))
+			transforms = sorted(set(cmds.listRelatives(geometry, parent=True, fullPath=True) or []))
+			state.append([(transform, cmds.xform(transform, q=True, ws=True, matrix=True)) for transform in transforms])
+		#the shading networks: what each shading group is assigned to and every attribute of the nodes upstream of it
+		shadingGroups = sorted(cmds.ls(type='shadingEngine') or [])
+		network = set(cmds.ls(materials=True) or [])
+		if shadingGroups:
+			network.update(cmds.listHistory(shadingGroups, pruneDagObjects=True) or [])
+		state.append([(shadingGroup, sorted(cmds.sets(shadingGroup, query=True) or [])) for shadingGroup in shadingGroups])
+		state.append([(node, self.nodeState(node), cmds.listConnections(node, source=True, destination=False, plugs=True, connections=True)) for node in sorted(network)])
+		return hashlib.sha1(repr(state)).hexdigest()
+
+	def changesFingerprint(self):
+		#what dirtyContributions compares to know that the whole scene changed since the last render.
+		#The scene index counts the geometry and shading edits with the Maya messages, only the global
+		#state is queried then. Without them it takes the whole sceneFingerprint, which is only worth
+		#it with the render cache (None: every contribution is out of date)
+		if om2 != None:
+			return hashlib.sha1(repr([self.sceneIndex.changes()] + self.globalState())).hexdigest()
+		if self.useRenderCache:
+			return self.renderSceneFingerprint or self.sceneFingerprint()
+		return None
+
+	def contributionKey(self, lights):
+		#hash of the attributes and transforms of the lights plus the scene fingerprint
+		sceneFingerprint = self.renderSceneFingerprint
+		if sceneFingerprint == None:
+			sceneFingerprint = self.sceneFingerprint()
+		state = [sceneFingerprint]
+		for light in sorted(lights):
+			#visibility is what renderAllLights toggles, it doesn't change the contribution
+			attributes = self.nodeState(light, LCMT.visibilityAttributes)
+			state.append((light, self.sceneIndex.types().nodeType(light), attributes,
+						cmds.listConnections(light, source=True, destination=False, plugs=True, connections=True),
+						cmds.xform(cmds.listRelatives(light, p=1)[0], q=True, ws=True, matrix=True)))
+		return hashlib.sha1(repr(state)).hexdigest()
+
+	def toggleProfiling(self):
+		if self.profiler.isInstalled():
+			self.profiler.uninstall()
+			print self.version, 'Profiling stopped'
+		else:
+			self.profiler.install(self)
+			print self.version, 'Profiling the Maya calls, a report is printed after every action'
+
+	def showProfileReport(self):
+		self.profiler.report()
+
+	def exportProfile(self, path=None):
+		if path == None:
+			defaultPath = cmds.workspace(q=True, rd=True) + 'images/lcmt_logs/lcmt_profile_%s.json' % time.strftime('%Y%m%d_%H%M%S')
+			path = cmds.fileDialog2(fileFilter='JSON (*.json);;CSV (*.csv)', dialogStyle=2, fileMode=0, startingDirectory=os.path.dirname(defaultPath))
+			if not path:
+				return None
+			path = path[0]
+		print self.version, 'Profile exported to', self.profiler.export(path)
+		return path
+
+	def toggleRenderCache(self):
 
+		self.useRenderCache = not(self.useRenderCache)
+
+	def clearRenderCache(self):
+		self.renderCache.clear()
+		print self.version, 'Render cache cleared'
+
+	def contributionName(self, lights):
+		#the transforms of the lights joined by _, the key of self.contributions
 		if type(lights)!=list:
 			lights = [lights]
-		lightNames =''
+		transforms = []
 		for light in lights:
-			lightNames += '_'+cmds.listRelatives(light, p=1)[0]
-			wasHidden = False
-			if self.isLightHidden(light) :
-				cmds.showHidden(light)
-				wasHidden = True
-
-			#-Revise!--if it is an ibl light then turn off emit Final Gather
-			if cmds.objectType( light, isType='mentalrayIblShape' ) == True:
-				if cmds.getAttr('%s.visibleInFinalGather' % light) == False:
-					cmds.setAttr('%s.visibleInFinalGather' % light, 1)
+			#the index already has the transform of the lights it knows
+			try:
+				transforms.append(self.sceneIndex.lightTransform(light))
+			except KeyError:
+				transforms.append(cmds.listRelatives(light, p=1)[0])
+		return '_'.join(transforms)
 
-					wasHidden = True
+	def renderOnlyThisLight(self, lights, visibilityState=None, preview=False):
 
-		mel.eval("renderIntoNewWindow render")   
+		if type(lights)!=list:
+			lights = [lights]
+		lightNames = '_' + self.contributionName(lights)
 
-		#See if we are rendering with vray frame buffer and save it to the maya render buffer
-		if cmds.getAttr('defaultRenderGlobals.currentRenderer') == 'vray':
-			if self.isRenderEngineInstalled('vray'):
-				if cmds.getAttr ("vraySettings.vfbOn"):
-					mel.eval("vrend -cloneVFB")                                              
+		#the cache key is taken before the visibility of the lights is touched
+		cacheKey = None
+		cachedImage = None
+		if self.useRenderCache:
+			cacheKey = self.contributionKey(lights)
+			cachedImage = self.renderCache.get(cacheKey)
 
+		#the state this contribution is rendered in, for updateContributions
+		self.renderedKey = cacheKey
 		rv = cmds.getPanel(scriptType='renderWindowPanel')
+		cached = cachedImage != None
+		if cached:
+			print self.version, 'Nothing changed for', lightNames[1:], 'reusing', cachedImage
+			cmds.renderWindowEditor(rv, edit=True, loadImage=cachedImage)
+		else:
+			#on its own only these lights are shown for the render and put back right after it
+			restoreVisibility = visibilityState == None
+			if restoreVisibility:
+				visibilityState = LightVisibilityState(lights, self.sceneIndex.types())
+			try:
+				visibilityState.apply(lights)
+				mel.eval("renderIntoNewWindow render")   
+			finally:
+				if restoreVisibility:
+					visibilityState.restore()
+
+			#See if we are rendering with vray frame buffer and save it to the maya render buffer
+			if cmds.getAttr('defaultRenderGlobals.currentRenderer') == 'vray':
+				if self.isRenderEngineInstalled('vray'):
+					if cmds.getAttr ("vraySettings.vfbOn"):
+						mel.eval("vrend -cloneVFB")                                              
+
+			if cacheKey != None:
+				cachePath = self.renderCache.path(cacheKey, self.imageExtension())
+				cmds.renderWindowEditor(rv, e=True, writeImage=cachePath)
+				if self.renderCache.add(cacheKey, cachePath):
+					cachedImage = cachePath
+
 		caption = cmds.renderWindowEditor(rv, query=True, pca=True)            
 		newCaption = caption+' contriburion of '+lightNames.replace('_',' ')
+		if preview:
+			newCaption += ' (preview)'
 		cmds.renderWindowEditor(rv, edit=True, pca= newCaption)
 
 		# save the frame in mel
 		mel.eval("renderWindowMenuCommand keepImageInRenderView renderView;")
 
-		if self.saveImages:
-			self.saveCurrentImageInRenderView('contributionOf'+lightNames)
-
-		for light in lights:
-			if wasHidden:
-				cmds.hide(light)
-				#-Revise!-- if it was the ibl node disable final gather again
-				if cmds.objectType( light, isType='mentalrayIblShape' ) == True:
-					cmds.setAttr('%s.visibleInFinalGather' % light, 0)
-
-
-	def renderAllLights(self, renderLights=[],useGroups=False):  
-		lights = cmds.ls(dag=True,visible=True, type=self.lightTypes)  
+		#previews are only kept in the render view, the saved contributions are the full ones
+		if not preview and (self.saveImages or self.packContributions):
+			#the cache already has the image on disk, the writer copies it from there. Another
+			#session sharing the cache may have evicted it since, the render view is saved then
+			if cachedImage != None and not os.path.exists(cachedImage):
+				cachedImage = None
+			imagePath = self.saveCurrentImageInRenderView('contributionOf'+lightNames, cachedImage, self.packContributions)
+			self.contributions[lightNames[1:]] = {'lights': lights, 'image': imagePath}
+		return cached
+
+	def renderAllLights(self, renderLights=[],useGroups=False,preview=False,groupingKeys=None):  
+		#preview renders every contribution at self.previewScale of the resolution with low sampling,
+		#the render settings are put back when it is done. groupingKeys groups the lights other
+		#than self.groupingKeys
+		if groupingKeys == None:
+			groupingKeys = self.groupingKeys
+		groupingKeys = tuple(groupingKeys)
+		lights = self.sceneIndex.getLights(visibleOnly=True)
 		#Check if there is any lights selected to only do those
 		if renderLights == [] or renderLights == None:
 			renderLights = cmds.ls( dag=True,  sl=True , type=self.lightTypes)
 		#if there isn't any light selected just get all the lights
 		if renderLights == []:
 			renderLights = lights
+		renderLights = self.pruneLights(renderLights)
+		if renderLights == []:
+			print self.version, 'There are no lights to render'
+			return
 
-		lightNames = ""
-		for light in renderLights:
-			lightNames = lightNames + light + '\n' 
+		lightNames = ''.join([light + '\n' for light in renderLights])
 
 
 		windowName = 'ProgressWindow'
@@ -347,56 +2898,443 @@ class LCMT:
 		cmds.columnLayout()
 		cmds.iconTextStaticLabel( st='textOnly', l='Rendering Lights:' )
 		cmds.iconTextStaticLabel( st='textOnly', l=lightNames )
+		if useGroups==True:
+			renderLightsGroups = self.groupLights(renderLights, groupingKeys)
+			contributions = [(group, renderLightsGroups[group]) for group in renderLightsGroups]
+		else:
+			print renderLights
+			contributions = [(cmds.listRelatives(light, p=1)[0], light) for light in renderLights]
+
 		cmds.iconTextStaticLabel( st='textOnly', l='Process Bar' )
-		progressControl = cmds.progressBar(maxValue=len(renderLights), width=300)
+		progressControl = cmds.progressBar(maxValue=len(contributions), width=300)
+		mode = 'interactive'
+		if preview:
+			mode = 'preview'
+		telemetry = self.renderTelemetry(mode, len(contributions))
+		etaText = cmds.text(label=telemetry.progressLabel(), align='left', width=300)
 		cmds.showWindow( window )    
 
-		lights = self.sortLightsByType(lights)
-		#-Revised--hide ibl node that is at the end of lights list (sorted previously)
-		if cmds.objectType( lights[-1], isType='mentalrayIblShape' ) == True:
-			cmds.setAttr('%s.visibleInFinalGather' % lights[-1], 0)
-			cmds.setAttr('%s.visibleInEnvironment' % lights[-1], 0)
-
-		cmds.hide(lights)
+		#every light is turned off but the ones of each contribution, and the scene is
+		#left exactly as it was found even when a render fails or is cancelled
+		visibilityState = LightVisibilityState(lights + list(set(renderLights) - set(lights)), self.sceneIndex.types())
 		lightCount = 0
-
-		if useGroups==True:
-			renderLightsGroups = self.groupLightsByName(renderLights)
-			cmds.progressBar(progressControl,edit=True, maxValue=len(renderLightsGroups.keys()), width=300)
-			for group in renderLightsGroups:
-				self.renderOnlyThisLight(renderLightsGroups[group]) 
+		if preview:
+			self.renderSettingsOverride = RenderSettingsOverride.preview(self.previewScale)
+			self.previewContributions = contributions
+			self.previewUseGroups = useGroups
+			self.previewGroupingKeys = groupingKeys
+
+		packed = []
+		try:
+			if preview:
+				self.renderSettingsOverride.apply()
+			#the scene part of the render cache keys is the same for every contribution of this run
+			if self.useRenderCache:
+				self.renderSceneFingerprint = self.sceneFingerprint()
+			for name, contribution in contributions:
+				startTime = time.time()
+				cached = self.renderOnlyThisLight(contribution, visibilityState, preview) 
+				telemetry.record(name, contribution, time.time() - startTime, cached)
+				if not preview:
+					self.contributionRendered(contribution, useGroups, groupingKeys)
+				if self.packContributions and not preview:
+					packed.append((name, self.contributions[self.contributionName(contribution)]['image']))
 				progressInc = cmds.progressBar(progressControl, edit=True, pr=lightCount+1) 
+				cmds.text(etaText, edit=True, label=telemetry.progressLabel())
 				lightCount+=1
+			#updateContributions compares it with the scene then, taken after the renders so
+			#whatever the renderer itself touches isn't seen as a change
+			if not preview:
+				if om2 != None:
+					self.sceneIndex.watchScene(self.litGeometry())
+				self.renderedFingerprint = self.changesFingerprint()
+		finally:
+			self.renderSceneFingerprint = None
+			visibilityState.restore()
+			if preview:
+				self.renderSettingsOverride.restore()
+				self.renderSettingsOverride = None
+			self.renderCache.flush()
+			if packed:
+				self.packImages(cmds.workspace(q=True, rd=True) + 'images/tmp/%s_contributions_%s.exr' % (telemetry.scene, time.strftime('%Y%m%d_%H%M%S')), packed)
+		print self.version, 'Rendered', lightCount, 'contributions in', RenderTelemetry.formatSeconds(time.time() - telemetry.started), 'log:', telemetry.path
+
+	def litGeometry(self):
+		#the shapes the rendered contributions light, with their light links
+		lights = sorted(set(sum([contribution['lights'] for contribution in self.renderedContributions.values()], [])))
+		if not lights:
+			return []
+		return cmds.lightlink(query=True, light=lights, shapes=True, transforms=False) or []
+
+	def lightAttributeChanged(self, node, plug):
+		#SceneIndex listener for the lights and their transforms, the visibility is what renderAllLights
+		#toggles for every contribution so it doesn't make them dirty
+		if plug.partialName(useLongNames=True) not in LCMT.visibilityAttributes:
+			self.dirtyNodes.add(node)
+
+	def contributionRendered(self, lights, useGroups, groupingKeys=None):
+		#kept by contributionName like self.contributions and the relight engine, not by group name,
+		#with the keys the lights were grouped by so they are updated in the same groups
+		if type(lights)!=list:
+			lights = [lights]
+		if not useGroups:
+			groupingKeys = None
+		self.renderedContributions[self.contributionName(lights)] = {'lights': lights, 'groups': useGroups, 'groupingKeys': groupingKeys, 'key': self.renderedKey}
+		for light in lights:
+			self.dirtyNodes.discard(light)
+			self.dirtyNodes.discard(self.sceneIndex.lightTransform(light))
+
+	def dirtyContributions(self):
+		#names of the rendered contributions that are out of date
+		for name in list(self.renderedContributions):
+			if not all([cmds.objExists(light) for light in self.renderedContributions[name]['lights']]):
+				#a light was deleted, that contribution can't be rendered the same way again
+				del self.renderedContributions[name]
+				self.contributions.pop(name, None)
+		if self.renderedFingerprint == None:
+			return sorted(self.renderedContributions)
+		if self.renderedFingerprint != self.changesFingerprint():
+			print self.version, 'The renderer, resolution, camera or geometry changed, every contribution is out of date'
+			return sorted(self.renderedContributions)
+		if om2 == None:
+			#without attribute callbacks the render cache keys tell which lights changed,
+			#the ones rendered with the cache off are always out of date
+			return sorted([name for name in self.renderedContributions if self.renderedContributions[name]['key'] == None
+						or self.renderedContributions[name]['key'] != self.contributionKey(self.renderedContributions[name]['lights'])])
+		dirty = []
+		for name in self.renderedContributions:
+			for light in self.renderedContributions[name]['lights']:
+				if light in self.dirtyNodes or self.sceneIndex.lightTransform(light) in self.dirtyNodes:
+					dirty.append(name)
+					break
+		return sorted(dirty)
+
+	def updateContributions(self):
+		#renders again only the contributions whose lights changed since they were rendered,
+		#the images of the others are reused and the relight composite is refreshed
+		if not self.renderedContributions:
+			print self.version, 'There are no contributions to update, render the lights first'
+			return []
+		dirty = self.dirtyContributions()
+		if dirty == []:
+			print self.version, 'Every contribution is up to date'
+			return []
+		print self.version, 'Updating', len(dirty), 'of', len(self.renderedContributions), 'contributions:', ', '.join(dirty)
+		#grouped again with the keys they were rendered with, not the ones of the menu now
+		renders = dict()
+		for name in dirty:
+			contribution = self.renderedContributions[name]
+			renders.setdefault((contribution['groups'], contribution['groupingKeys']), []).extend(contribution['lights'])
+		for useGroups, groupingKeys in sorted(renders):
+			self.renderAllLights(renders[(useGroups, groupingKeys)], useGroups, groupingKeys=groupingKeys)
+		if self.relightEngine != None:
+			self.imageWriter.wait()
+			for name in dirty:
+				if name in self.relightEngine.names and name in self.contributions and os.path.exists(self.contributions[name]['image']):
+					self.relightEngine.updateImage(self.relightEngine.names.index(name), self.contributions[name]['image'], self.contributions[name].get('part'))
+			self.showRelightComposite()
+		return dirty
+
+	def refineContributions(self, renderLights=None, background=False):
+		#renders the previewed contributions again with the real render settings: only the ones
+		#with some of renderLights (all of them if None), in the render view or with batch Render processes.
+		#They are grouped like the preview was, whatever "Group by" is now
+		if not self.previewContributions:
+			print self.version, 'There is no preview to refine, render a preview first'
+			return None
+		lights = []
+		for name, contribution in self.previewContributions:
+			if type(contribution)!=list:
+				contribution = [contribution]
+			if renderLights == None or set(contribution) & set(renderLights):
+				lights.extend([light for light in contribution if light not in lights])
+		if lights == []:
+			print self.version, 'None of the selected lights were previewed'
+			return None
+		if background:
+			return self.renderAllLightsBatch(lights, self.previewUseGroups, groupingKeys=self.previewGroupingKeys)
+		return self.renderAllLights(lights, self.previewUseGroups, groupingKeys=self.previewGroupingKeys)
+
+	def sceneName(self):
+		path = cmds.file(query=True,sceneName=True)
+		if path:
+			return os.path.split(path)[1].rsplit('.')[0]
+		return 'untitled'
+
+	def renderTelemetry(self, mode, total):
+		#one JSON lines log per run in images/lcmt_logs/
+		return RenderTelemetry(cmds.workspace(q=True, rd=True) + 'images/lcmt_logs/', self.sceneName(), mode, total)
+
+	def statistics(self):
+		#the statistics of the scene opened now, read from disk the first time they are needed
+		path = cmds.workspace(q=True, rd=True) + 'images/lcmt_logs/' + self.sceneName() + '_statistics.json'
+		if self.contributionStatistics == None or self.contributionStatistics.path != path:
+			self.contributionStatistics = ContributionStatistics(path)
+		return self.contributionStatistics
+
+	def analyzeContributions(self):
+		#statistics of the saved contributions, printed brightest first per contribution and per light group
+		if numpy == None:
+			print self.version, 'ERROR: the contribution statistics need numpy, which is not available in this Maya'
+			return None
+		self.imageWriter.wait()
+		saved = dict((name, self.contributions[name]) for name in self.contributions if os.path.exists(self.contributions[name]['image']))
+		if not saved:
+			print self.version, 'There are no saved contributions, render the lights with "Save Images?" on first'
+			return None
+		statistics = self.statistics()
+		frame = cmds.currentTime(query=True)
+		try:
+			statistics.analyze(saved, frame)
+		except IOError, e:
+			print self.version, 'ERROR: the contributions can\'t be analyzed:', e
+			return None
+		lights = []
+		for name in saved:
+			lights.extend(saved[name]['lights'])
+		for title, rows in [('contribution', statistics.rank(frame=frame)),
+							('light group', statistics.rank(self.groupLights(lights), frame))]:
+			print self.version, '%-40s %10s %10s %8s' % (title, 'mean', 'peak', 'share')
+			for name, rowLights, mean, peak, share in rows:
+				flag = ''
+				if share < self.pruneThreshold:
+					flag = ' negligible'
+				print self.version, '%-40s %10.4f %10.4f %7.2f%%%s' % (name, mean, peak, share * 100, flag)
+		print self.version, 'Statistics saved to', statistics.path
+		return statistics.stats
+
+	def pruneLights(self, lights):
+		#the lights without the negligible ones when pruning is on
+		if not self.pruneNegligible or not lights:
+			return lights
+		negligible = self.statistics().negligibleLights(self.pruneThreshold)
+		skipped = [light for light in lights if light in negligible]
+		if skipped:
+			print self.version, 'Skipping', len(skipped), 'lights under %g%% of the energy:' % (self.pruneThreshold * 100), ', '.join(skipped)
+		return [light for light in lights if light not in negligible]
+
+	def togglePruneNegligible(self):
+		self.pruneNegligible = not(self.pruneNegligible)
+
+	def setPruneThreshold(self):
+		result = cmds.promptDialog(
+					title='Negligible Lights',
+					message='Share of the energy (%) under which a light is skipped:',
+					text='%g' % (self.pruneThreshold * 100),
+					button=['OK', 'Cancel'],
+					defaultButton='OK',
+					cancelButton='Cancel',
+					dismissString='Cancel')
+		if result == 'OK':
+			try:
+				self.pruneThreshold = float(cmds.promptDialog(query=True, text=True)) / 100.0
+			except ValueError:
+				print self.version, 'ERROR: the threshold should be a number'
+
+	def contributionMel(self, lights, allLights, visibilityState=None):
+		#MEL run before a batch render: same visibility setup renderAllLights does interactively,
+		#every light off but the ones of this contribution
+		if visibilityState == None:
+			visibilityState = LightVisibilityState(allLights + list(set(lights) - set(allLights)), self.sceneIndex.types())
+		return visibilityState.mel(lights)
+
+	def batchScene(self, batchFolder):
+		#the render processes read the scene from disk, if it has unsaved changes we export a snapshot
+		path = cmds.file(query=True,sceneName=True)
+		if path and not cmds.file(query=True, modified=True):
+			return path
+		sceneName = 'untitled'
+		if path:
+			sceneName = os.path.split(path)[1].rsplit('.')[0]
+		snapshot = batchFolder + sceneName + '_lcmtBatch.mb'
+		print self.version, 'Exporting the current scene for the batch render to', snapshot
+		cmds.file(snapshot, force=True, exportAll=True, preserveReferences=True, type='mayaBinary')
+		return snapshot
+
+	def renderAllLightsBatch(self, renderLights=[], useGroups=False, workers=0, runner=None, wait=False, frames=None, framesPerJob=1, memoryLimit=0, groupingKeys=None):
+		#same lights and groups as renderAllLights but rendered headless by several Render processes at once,
+		#groupingKeys groups the lights other than self.groupingKeys
+		#frames (first, last, step) renders every contribution over that range instead of the current frame,
+		#memoryLimit is the MB each Render process is expected to use (see CommandLineRenderRunner)
+		lights = self.sceneIndex.getLights(visibleOnly=True)
+		if renderLights == [] or renderLights == None:
+			renderLights = cmds.ls( dag=True,  sl=True , type=self.lightTypes)
+		if renderLights == []:
+			renderLights = lights
+		renderLights = self.pruneLights(renderLights)
+		if renderLights == []:
+			print self.version, 'There are no lights to render'
+			return []
+
+		projectSpace = cmds.workspace(q=True, rd=True)
+		batchFolder = projectSpace + 'images/tmp/lcmt_batch/'
+		if not os.path.exists(batchFolder):
+			os.makedirs(batchFolder)
+		scene = self.batchScene(batchFolder)
+		sceneName = os.path.split(scene)[1].rsplit('.')[0]
+
+		if useGroups==True:
+			contributions = self.groupLights(renderLights, groupingKeys)
 		else:
-			print renderLights
+			contributions = dict()
 			for light in renderLights:
-				self.renderOnlyThisLight(light) 
-				progressInc = cmds.progressBar(progressControl, edit=True, pr=lightCount+1) 
-				lightCount+=1
-
-		cmds.showHidden(lights)  
-		#-Revised--since we sorted the lights by type we know that the lastone will be the IBL
-		if cmds.objectType( lights[-1], isType='mentalrayIblShape' ) == True:
-			cmds.setAttr('%s.visibleInFinalGather' % lights[-1], 1)
-			cmds.setAttr('%s.visibleInEnvironment' % lights[-1], 1)
+				contributions[cmds.listRelatives(light, p=1)[0]] = [light]
+
+		#the visibility MEL of a contribution is the same for every frame, it is only built once
+		visibilityState = LightVisibilityState(lights + list(set(renderLights) - set(lights)), self.sceneIndex.types())
+		preRenders = dict()
+		#a:b and a_b would overwrite each other's images and MEL
+		fileNames = self.fileNames(contributions)
+		imageNames = dict([(name, sceneName + '_contributionOf_' + fileNames[name]) for name in contributions])
+		#the images are kept by contributionName like the interactive renders, not by group name,
+		#named now as the jobs are reported after the scene may have changed
+		contributionNames = dict([(name, self.contributionName(contributions[name])) for name in contributions])
+		def frameSuffix(frame):
+			if frame == None:
+				return ''
+			return '_f%s' % ('%g' % frame).replace('.', '_')
+
+		def makeJob(name, contributionLights, jobFrames):
+			if name not in preRenders:
+				preRenders[name] = self.contributionMel(contributionLights, lights, visibilityState)
+			imageName = imageNames[name]
+			if jobFrames != None:
+				imageName += frameSuffix(jobFrames[0])
+			return RenderJob(name, contributionLights, preRenders[name], batchFolder, imageName, jobFrames)
+
+		chunks = [None]
+		if frames != None:
+			if len(frames) == 2:
+				frames = (frames[0], frames[1], 1)
+			chunks = ContributionScheduler.frameChunks(frames[0], frames[1], frames[2], framesPerJob)
+		telemetry = self.renderTelemetry('batch', len(contributions) * len(chunks))
+		scheduler = ContributionScheduler(telemetry.folder, telemetry.scene)
+		jobs = scheduler.jobs(contributions, chunks, makeJob)
+
+		batch = BatchRenderer(runner, workers, memoryLimit)
+		frameText = ''
+		if frames != None:
+			frameText = ' over frames %g-%g' % (frames[0], frames[1])
+		print self.version, 'Batch rendering', len(contributions), 'contributions' + frameText, 'in', len(jobs), 'jobs with', batch.workers, 'workers into', batchFolder
+
+		def reportJob(result):
+			job = result['job']
+			telemetry.record(job.name, job.lights, result['time'], returnCode=result['returnCode'], frames=job.frameCount())
+			status = 'done'
+			if result['returnCode'] != 0:
+				status = 'FAILED (%s)' % result['returnCode']
+			elif job.frames == None:
+				#the frame range images aren't relit, only the contributions of one frame are kept
+				image = jobImages(job).get(None)
+				if image != None:
+					self.contributions[contributionNames[job.name]] = {'lights': job.lights, 'image': image}
+			frameText = ''
+			if job.frames != None:
+				frameText = ' frames %g-%g' % (job.frames[0], job.frames[1])
+			print self.version, 'contribution of', job.name + frameText, status, 'in %.1fs' % result['time'] + ',', telemetry.progressLabel()
+
+		#the image names of this run, an image of key_2 also starts with key
+		jobNames = set([job.imageName for job in jobs])
+		def jobImages(job):
+			#{frame: image} the Render process wrote, the frame is None when the job renders the saved frame
+			images = []
+			for image in glob.glob(os.path.join(job.outputDir, job.imageName + '*')):
+				if image.endswith('.mel') or image.endswith('.npy'):
+					continue
+				fileName = os.path.basename(image)
+				if not any(fileName[:end] in jobNames for end in range(len(job.imageName) + 1, len(fileName) + 1)):
+					images.append(image)
+			if not images:
+				return {}
+			if job.frames == None:
+				return {None: sorted(images)[0]}
+			first, last, step = job.frames
+			frames = [first + index * step for index in range(job.frameCount())]
+			#name.0003.exr is frame 3, names without the frame number go in the order of the frames
+			numbered = dict()
+			for image in images:
+				match = re.search('[._](-?[0-9]+)\.[^.]+$', os.path.basename(image)[len(job.imageName):])
+				if match and float(match.group(1)) in frames:
+					numbered[float(match.group(1))] = image
+			if len(numbered) == len(images):
+				return numbered
+			return dict(zip(frames, sorted(images)))
+
+		def packResults(results):
+			#the images the Render processes wrote, packed by the writer threads, one EXR per frame
+			frameLayers = dict()
+			for result in results:
+				if result['returnCode'] == 0:
+					for frame, image in jobImages(result['job']).items():
+						frameLayers.setdefault(frame, []).append((result['job'].name, image))
+			for frame in sorted(frameLayers):
+				self.packImages(batchFolder + sceneName + '_contributions' + frameSuffix(frame) + '.exr', sorted(frameLayers[frame]))
+
+		if wait:
+			results = batch.run(jobs, scene, reportJob)
+			if self.packContributions:
+				packResults(results)
+			return results
+
+		#keep the UI responsive: the pool is driven from a thread and the results printed from the main one
+		import maya.utils
+		def runInBackground():
+			results = batch.run(jobs, scene, lambda result: maya.utils.executeDeferred(reportJob, result))
+			failed = len([result for result in results if result['returnCode'] != 0])
+			maya.utils.executeDeferred(lambda: sys.stdout.write('%s Batch render finished, %d failed\n' % (self.version, failed)))
+			if self.packContributions:
+				maya.utils.executeDeferred(packResults, results)
+		thread = threading.Thread(target=runInBackground)
+		thread.daemon = True
+		thread.start()
+		return jobs
 
 	def updateScollList(self, mode, listName):
 
-		lights = cmds.ls(dag =True,visible=True,type=self.lightTypes)  
-		lightGroups = self.groupLightsByName(lights)
+		self.listModes[listName] = mode
 		if mode:
-		   cmds.iconTextScrollList(listName,edit=True, ra=True)
-		   cmds.iconTextScrollList(listName,edit=True, allowMultiSelection=True, append=lightGroups.keys())
+		   items = self.getLightGroups().keys()
+		else:
+		   items = self.sceneIndex.getLights(visibleOnly=True)
+		if listName in self.virtualLists:
+		   #only the page shown goes to the control
+		   self.virtualLists[listName].setItems(items)
 		else:
 		   cmds.iconTextScrollList(listName,edit=True, ra=True)
-		   cmds.iconTextScrollList(listName,edit=True, allowMultiSelection=True, append=lights)
-
-		
+		   cmds.iconTextScrollList(listName,edit=True, allowMultiSelection=True, append=items)
+
+	def virtualList(self, selectCommand=None):
+		#paged and searchable scroll list in the current layout, used by name like any other
+		view = VirtualList(selectCommand=selectCommand)
+		listName = view.create()
+		self.virtualLists[listName] = view
+		return listName
+
+	def getScrollListSelection(self, listName):
+		if listName in self.virtualLists:
+			return self.virtualLists[listName].selection() or None
+		return cmds.iconTextScrollList(listName, query=True, si=True )
+
+	def selectListedLights(self, added, removed, useGroups):
+		#items of the light list (lights or groups) picked or dropped, only those change the selection
+		if cmds.checkBox(useGroups, query=True, value=True):
+			lightGroups = self.getLightGroups()
+			added = [light for group in added for light in lightGroups.get(group, [])]
+			removed = [light for group in removed for light in lightGroups.get(group, [])]
+		if removed:
+			cmds.select(removed, deselect=True)
+		if added:
+			cmds.select(added, add=True, vis=True)
+
+	def selectListedGeometry(self, added, removed):
+		if removed:
+			cmds.select(removed, deselect=True)
+		if added:
+			cmds.select(added, add=True)
 
 	def getElementsFromLightScrollList(self, listName, useGroups):
-		lights = cmds.ls(dag =True,visible=True,type=self.lightTypes)  
-		lightGroups = self.groupLightsByName(lights)
-		selectedGroups = cmds.iconTextScrollList(listName, query=True, si=True )  
+		lightGroups = self.getLightGroups()
+		selectedGroups = self.getScrollListSelection(listName)
 		if selectedGroups == None:
 			return None  
 		if cmds.checkBox(useGroups, query=True, value=True):
@@ -410,7 +3348,7 @@ class LCMT:
 	def addLightTypes(self):
 		result = cmds.promptDialog(
 					title='New Light Types',
-					message='Add New Light Types (Separated by comas):',
+					message='Add New Light Types (Separated by comas, keyword:priority to match it first):',
 					button=['OK', 'Cancel'],
 					defaultButton='OK',
 					cancelButton='Cancel',
@@ -418,21 +3356,17 @@ class LCMT:
 
 		if result == 'OK':
 			text = cmds.promptDialog(query=True, text=True)
-			text = text.replace(',','|')
 			self.addLightTypesToFile(text)
 
 	def displayLightTypes(self):
-		 oldLightTypes = self.lightDB.replace('|',',')
+		 oldLightTypes = ', '.join(['%s:%d' % entry if entry[1] else entry[0] for entry in self.lightDB.load()])
 		 cmds.confirmDialog(message='The Light Types in the DB are:\n'+oldLightTypes)
 
 	def resetLightTypesToDefault(self):
 
 		result = cmds.confirmDialog( title='Confirm', message='Are you sure?', button=['Yes','No'], defaultButton='Yes', cancelButton='No', dismissString='No' )
 		if result == 'Yes':
-			f = open(self.fullPath, 'w')
-			f.write('key|bounce|rim|background|wall|kick')
-			f.close()
-			self.lightDB='key|bounce|rim|background|wall|kick'
+			self.lightDB.reset()
 
 	def toggleSaveImages(self):
 
@@ -440,16 +3374,50 @@ class LCMT:
 
 	def isLightVray(self, light):
 		#Fixes Bug 9 fixed
-		for type in self.VrayLightTypes:
-			if cmds.objectType( light, isAType=type ) == True:
-				return True
-		return False
-
+		return self.sceneIndex.types().isA(light, self.VrayLightTypes)
+
+
+	def parameterAttribute(self, light, parameter):
+		attribute = self.lightParameterEditor.attribute(parameter, self.sceneIndex.types().nodeType(light))[0]
+		if attribute == None:
+			return None
+		return '%s.%s' % (light, attribute)
+
+	def intensityAttribute(self, light):
+		#Bug 9 fixed
+		return self.parameterAttribute(light, 'intensity')
+
+	def colorAttribute(self, light):
+		return self.parameterAttribute(light, 'color')
+
+	def parseParameterValue(self, parameter, text):
+		#"2" sets the value, "*1.2" scales it and "+=0.5"/"-=0.5" offsets it
+		text = text.strip()
+		operation = 'set'
+		sign = 1.0
+		if text[:1] in ('*', 'x'):
+			operation = 'scale'
+			text = text[1:]
+		elif text[:2] in ('+=', '-='):
+			operation = 'offset'
+			if text[0] == '-':
+				sign = -1.0
+			text = text[2:]
+		if parameter == 'color' and ',' in text:
+			value = [sign * float(channel) for channel in text.split(',')]
+			if len(value) != 3:
+				raise ValueError('a color has 3 channels, not %d' % len(value))
+		else:
+			value = sign * float(text)
+		return operation, value
 
-	def changeLightParams(self,lightList,useGroupLights ,parameter):
+	def changeLightParams(self,lightList,useGroupLights ,parameter, value=None, lights=None):
 
 		print "Parameter to Change", parameter
-		lightsSelected = self.getElementsFromLightScrollList(lightList,useGroupLights)
+		if lights != None:
+			lightsSelected = lights
+		else:
+			lightsSelected = self.getElementsFromLightScrollList(lightList,useGroupLights)
 
 		if lightsSelected !=None and lightsSelected !=[]:
 			selectedLights = lightsSelected
@@ -462,37 +3430,287 @@ class LCMT:
 			print "Please Select some lights"
 			return
 
+		if value != None:
+			#value given by the caller (the prompt text, a number or {light: value}), no need to ask for it
+			text = value
+		else:
+			message = 'Enter '+parameter+' value to change:'
+			if parameter == 'rename':
+				message += '\n({name} {group} {index} {type} are replaced, e.g. {group}_{index:03d})'
+			else:
+				message += '\n(2 sets it, *1.2 scales it, +=0.5 or -=0.5 offsets it'
+				if parameter == 'color':
+					message += ', r,g,b for colors'
+				message += ')'
+			result = cmds.promptDialog(
+						title='Enter '+parameter+' value to change',
+						message=message,
+						button=['OK', 'Cancel'],
+						defaultButton='OK',
+						cancelButton='Cancel',
+						dismissString='Cancel')
+
+			if result == 'OK':
+				text = cmds.promptDialog(query=True, text=True)
+			elif result == 'Cancel':
+				return
+
+		if parameter in LightParameterEditor.attributes:
+			operation = 'set'
+			if isinstance(text, basestring):
+				try:
+					operation, text = self.parseParameterValue(parameter, text)
+				except ValueError:
+					print self.version, 'ERROR:', text, 'is not a valid', parameter, 'value'
+					return
+			#every light of the same type at once, the whole edit undoes in one step
+			edited = self.lightParameterEditor.apply(selectedLights, parameter, text, operation)
+			print self.version, parameter, 'changed on', edited, 'lights'
+			return
+
+		if parameter == "rename":
+			#all the lights in one pass and the list refreshed once at the end
+			self.renameLights(selectedLights, text)
+			if lightList != None:
+				self.refreshList(lightList)
+
+	def searchReplaceLightNames(self, lightList, useGroupLights):
+		selectedLights = self.getElementsFromLightScrollList(lightList,useGroupLights)
+		if selectedLights == None or selectedLights == []:
+			selectedLights = cmds.ls(dag=True, selection=True, type=self.lightTypes)
+		if selectedLights == []:
+			print "Please Select some lights"
+			return
 		result = cmds.promptDialog(
-					title='Enter '+parameter+' value to change',
-					message='Enter '+parameter+' value to change:',
+					title='Search and Replace',
+					message='search=replace ({keyword} replaces the light type keyword found in the name):',
 					button=['OK', 'Cancel'],
 					defaultButton='OK',
 					cancelButton='Cancel',
 					dismissString='Cancel')
-
-		if result == 'OK':
-			text = cmds.promptDialog(query=True, text=True)
-		elif result == 'Cancel':
-			return
-
-		for light in selectedLights:
-			if parameter == "intensity":
-				#Bug 9 fixed
-				if self.isLightVray(light) == True:
-					cmds.setAttr('%s.intensityMult' % light, float(text))
-				else:	
-					cmds.setAttr('%s.intensity' % light, float(text))
-			if parameter == "rename":
-				#
-				light = cmds.listRelatives(light, p=1) 
-				cmds.rename(light, text, ignoreShape = False)
-				self.refreshList(lightList)
-
-
-
-	def refreshList(self,list):
-			self.updateScollList(True, list)
-			self.updateScollList(False, list)
+		if result != 'OK':
+			return
+		text = cmds.promptDialog(query=True, text=True)
+		if '=' not in text:
+			print self.version, 'ERROR: use search=replace'
+			return
+		search, replace = text.split('=', 1)
+		self.renameLights(selectedLights, '{name}', search, replace)
+		self.refreshList(lightList)
+
+	def lightNewNames(self, lights, template='{name}', search='', replace=''):
+		#{transform: new name} for the transforms of the lights, already free of collisions
+		#template fields: {name} {group} {index} (1, 2... inside each group) and {type}.
+		#The template only names the node, it stays in its namespace. Referenced and locked
+		#lights can't be renamed, they are left out
+		if not lights:
+			return dict()
+		self.lightNameClassifier.setKeywords(self.lightDB.load())
+		types = self.sceneIndex.types().resolve(lights)
+		parents = dict()
+		for light in lights:
+			parents[light] = cmds.listRelatives(light, p=1)[0]
+		nodes = list(parents) + list(set(parents.values()))
+		readOnly = set(cmds.ls(nodes, referencedNodes=True) or [])
+		readOnly.update([node for node, locked in zip(nodes, cmds.lockNode(nodes, q=True, lock=True) or []) if locked])
+		skipped = [light for light in lights if light in readOnly or parents[light] in readOnly]
+		if skipped:
+			print self.version, 'Can\'t rename', len(skipped), 'referenced or locked lights:', ', '.join(skipped)
+		transforms = []
+		newNames = []
+		groupCount = dict()
+		for light in lights:
+			transform = parents[light]
+			if transform in transforms or light in skipped:
+				continue
+			namespace, separator, name = transform.split('|')[-1].rpartition(':')
+			if search == '{keyword}':
+				match = self.lightNameClassifier.findKeyword(name)
+				if match != None:
+					name = name[:match.start()] + replace + name[match.end():]
+			elif search != '':
+				name = name.replace(search, replace)
+			group = self.lightNameClassifier.classify(light)
+			groupCount[group] = groupCount.get(group, 0) + 1
+			try:
+				newName = template.format(name=name, group=group, index=groupCount[group], type=types.get(light))
+			except (KeyError, IndexError, ValueError), e:
+				raise ValueError('Invalid rename template %s: %s' % (template, e))
+			#only letters, numbers and _ are valid in maya names and they can't start with a number
+			newName = re.sub('[^A-Za-z0-9_]', '_', newName)
+			if newName == '' or newName[0].isdigit():
+				newName = '_' + newName
+			transforms.append(transform)
+			newNames.append(namespace + separator + newName)
+
+		#names taken by nodes that are not being renamed
+		taken = set(cmds.ls(newNames) or []) - set(transforms)
+		result = dict()
+		for index in range(len(transforms)):
+			newName = newNames[index]
+			candidate = newName
+			count = 1
+			while candidate in taken or (candidate != newName and cmds.objExists(candidate)):
+				candidate = '%s_%d' % (newName, count)
+				count += 1
+			taken.add(candidate)
+			result[transforms[index]] = candidate
+		return result
+
+	def renameLights(self, lights, template='{name}', search='', replace=''):
+		try:
+			newNames = self.lightNewNames(lights, template, search, replace)
+		except ValueError, e:
+			print self.version, 'ERROR:', e
+			return {}
+		transforms = [transform for transform in newNames if transform.split('|')[-1] != newNames[transform]]
+		if transforms == []:
+			return newNames
+		#the nodes are followed by uuid since their names change on the way, the first pass moves
+		#them to temporary names (in their own namespace) so a light can take the name another one
+		#of the batch is leaving
+		uuids = cmds.ls(transforms, uuid=True)
+		previousNames = [transform.split('|')[-1] for transform in transforms]
+		temporaryNames = [name[:len(name) - len(name.rpartition(':')[2])] + '__lcmtRename%d' % index for index, name in enumerate(previousNames)]
+		moved = 0
+		cmds.undoInfo(openChunk=True, chunkName='LCMT rename lights')
+		try:
+			try:
+				for index in range(len(uuids)):
+					cmds.rename(cmds.ls(uuids[index])[0], temporaryNames[index], ignoreShape = False)
+					moved += 1
+				for index in range(len(uuids)):
+					cmds.rename(cmds.ls(uuids[index])[0], newNames[transforms[index]], ignoreShape = False)
+			except RuntimeError, e:
+				#the lights renamed so far get their names back, through the temporary names
+				#again as some may have the name another one had
+				for restoreNames in (temporaryNames, previousNames):
+					for index in range(moved):
+						cmds.rename(cmds.ls(uuids[index])[0], restoreNames[index], ignoreShape = False)
+				print self.version, 'ERROR: the lights couldn\'t be renamed:', e
+				return {}
+		finally:
+			cmds.undoInfo(closeChunk=True)
+		print self.version, 'Renamed', len(transforms), 'lights'
+		return newNames
+
+
+
+	def relightContributions(self):
+		#load the saved contributions and open the sliders to relight them
+		if numpy == None:
+			print self.version, 'ERROR: relighting needs numpy, which is not available in this Maya'
+			return
+		#the images of the last run may still be being written
+		self.imageWriter.wait()
+		names = sorted(name for name in self.contributions if os.path.exists(self.contributions[name]['image']))
+		if names == []:
+			print self.version, 'There are no saved contributions, render the lights with "Save Images?" on first'
+			return
+		projectSpace = cmds.workspace(q=True, rd=True)
+		stackFolder = projectSpace + 'images/tmp/'
+		if not os.path.exists(stackFolder):
+			os.makedirs(stackFolder)
+		self.closeRelight()
+		try:
+			self.relightEngine = RelightEngine(names, [self.contributions[name]['image'] for name in names], stackFolder,
+											[self.contributions[name].get('part') for name in names])
+		except (IOError, ValueError), e:
+			print self.version, 'ERROR: the contributions can\'t be relit:', e
+			return
+		#intensities and colours the contributions were rendered with, the sliders multiply them
+		self.relightBase = dict()
+		for name in names:
+			for light in self.contributions[name]['lights']:
+				baseIntensity = baseColor = None
+				if self.intensityAttribute(light) != None:
+					baseIntensity = cmds.getAttr(self.intensityAttribute(light))
+				if self.colorAttribute(light) != None:
+					baseColor = cmds.getAttr(self.colorAttribute(light))[0]
+				self.relightBase[light] = (baseIntensity, baseColor)
+		self.displayRelightUI()
+		self.showRelightComposite()
+
+	def closeRelight(self):
+		#the stack of the last engine is unmapped and deleted
+		if self.relightEngine != None:
+			self.relightEngine.close()
+			self.relightEngine = None
+
+	def showRelightComposite(self):
+		self.relightShown = time.time()
+		projectSpace = cmds.workspace(q=True, rd=True)
+		if oiio != None:
+			compositePath = projectSpace + 'images/tmp/lcmt_relight.exr'
+		else:
+			compositePath = projectSpace + 'images/tmp/lcmt_relight.iff'
+		RelightEngine.writeImage(compositePath, self.relightEngine.composite)
+		cmds.renderWindowEditor('renderView', e=True, loadImage=compositePath)
+
+	def relightChanged(self, index, intensitySlider, colorSlider, dragging=False):
+		#while a slider is dragged the composite is written at most every relightInterval seconds,
+		#when it is released it is summed again exactly and always written
+		intensity = cmds.floatSliderGrp(intensitySlider, query=True, value=True)
+		color = cmds.colorSliderGrp(colorSlider, query=True, rgbValue=True)
+		self.relightEngine.setGain(index, intensity, color, exact=not dragging)
+		if not dragging or time.time() - self.relightShown >= self.relightInterval:
+			self.showRelightComposite()
+
+	def relightCallback(self, index, intensitySlider, colorSlider, dragging=False):
+		return lambda *args: self.relightChanged(index, intensitySlider, colorSlider, dragging)
+
+	def applyRelight(self):
+		#send the multipliers to the lights, relative to the values they were rendered with
+		engine = self.relightEngine
+		cmds.undoInfo(openChunk=True, chunkName='LCMT relight')
+		try:
+			self.applyRelightGains(engine)
+		finally:
+			cmds.undoInfo(closeChunk=True)
+
+	def applyRelightGains(self, engine):
+		#the value of every light worked out first and each parameter set on all of them at once
+		intensities = dict()
+		colors = dict()
+		for index in range(len(engine.names)):
+			intensity = float(engine.intensities[index])
+			color = engine.colors[index]
+			for light in self.contributions[engine.names[index]]['lights']:
+				baseIntensity, baseColor = self.relightBase[light]
+				if baseIntensity != None:
+					intensities[light] = baseIntensity * intensity
+				if baseColor != None:
+					colors[light] = [baseColor[channel] * float(color[channel]) for channel in range(3)]
+		for parameter, values in (('intensity', intensities), ('color', colors)):
+			if values:
+				self.lightParameterEditor.apply(values.keys(), parameter, values)
+		print self.version, 'Relight applied to', len(set(intensities) | set(colors)), 'lights'
+
+	def displayRelightUI(self):
+		windowName = 'LCMTRelightWindow'
+		if cmds.window(windowName, exists=True):
+			cmds.deleteUI(windowName)
+		window = cmds.window(windowName, t=self.version+' Relight Contributions')
+		cmds.columnLayout(adjustableColumn=True)
+		for index in range(len(self.relightEngine.names)):
+			cmds.text(label=self.relightEngine.names[index], align='left')
+			intensitySlider = cmds.floatSliderGrp(label='Intensity', field=True, minValue=0.0, maxValue=4.0, fieldMaxValue=100.0, value=1.0)
+			colorSlider = cmds.colorSliderGrp(label='Color', rgb=(1.0, 1.0, 1.0))
+			dragged = self.relightCallback(index, intensitySlider, colorSlider, True)
+			changed = self.relightCallback(index, intensitySlider, colorSlider)
+			cmds.floatSliderGrp(intensitySlider, edit=True, dragCommand=dragged, changeCommand=changed)
+			cmds.colorSliderGrp(colorSlider, edit=True, dragCommand=dragged, changeCommand=changed)
+		cmds.button(label='Apply to Lights', command=lambda *args: self.applyRelight())
+		#the stack file is deleted with the window
+		cmds.scriptJob(uiDeleted=[window, self.closeRelight], runOnce=True)
+		cmds.showWindow(window)
+
+	def refreshList(self,list, rescan=False):
+			#the Refresh! button lists the whole scene again in case something slipped through the index
+			if rescan:
+				self.sceneIndex.invalidate()
+			#filled once, with the lights or groups it is showing now
+			self.updateScollList(self.listModes.get(list, False), list)
 
 	def createLight(self, type, lightList):
 
@@ -543,12 +3761,25 @@ class LCMT:
 			return
 		
 
+	def close(self):
+		#removes the Maya callbacks of the scene index (two per light), the registry listener and
+		#the profiler, the window does it when it is closed and scripts using LCMT() as a library when they are done
+		#the profiler first, the listener is looked up by the method it wraps while profiling
+		self.profiler.uninstall()
+		self.sceneIndex.stop()
+		self.rendererRegistry.removeListener(self.renderEnginesChanged)
+
+	def windowClosed(self):
+		self.close()
+
 	def displayUI(self):
 
 		windowName = 'LCMTUIWindow'
 		if cmds.window(windowName, exists=True):
 			cmds.deleteUI(windowName)
 		window = cmds.window(windowName, menuBar = True,t=self.version)
+		#stop listening to the scene and to the plugins once the window is closed
+		cmds.scriptJob(uiDeleted=[window, self.windowClosed], runOnce=True)
 		fileMenu = cmds.menu( label='Manage Light Types')
 		cmds.menuItem( label='Add More Light Types',command=lambda *args:self.addLightTypes()) 
 		cmds.menuItem( label='See Current Light Types', command=lambda *args:self.displayLightTypes()) 
@@ -556,7 +3787,22 @@ class LCMT:
 
 		changesMenu = cmds.menu( label='Edit Multiple Light Param')
 		cmds.menuItem( label='Intensity',command=lambda *args:self.changeLightParams(lightList,useGroupLights,"intensity")) 
-		cmds.menuItem( label='Rename',command=lambda *args:self.changeLightParams(lightList,useGroupLights,"rename")) 
+		cmds.menuItem( label='Exposure',command=lambda *args:self.changeLightParams(lightList,useGroupLights,"exposure")) 
+		cmds.menuItem( label='Color',command=lambda *args:self.changeLightParams(lightList,useGroupLights,"color")) 
+		cmds.menuItem( label='Temperature',command=lambda *args:self.changeLightParams(lightList,useGroupLights,"temperature")) 
+		cmds.menuItem( label='Rename ({group}_{index:03d}, {name}...)',command=lambda *args:self.changeLightParams(lightList,useGroupLights,"rename")) 
+		cmds.menuItem( label='Search and Replace in Names',command=lambda *args:self.searchReplaceLightNames(lightList,useGroupLights)) 
+		cmds.menuItem( label='Relight Saved Contributions',command=lambda *args:self.relightContributions()) 
+		cmds.menuItem( label='Clear Render Cache',command=lambda *args:self.clearRenderCache()) 
+		cmds.menuItem( label='Analyze Saved Contributions',command=lambda *args:self.analyzeContributions()) 
+		cmds.menuItem( label='Skip Negligible Lights', checkBox=self.pruneNegligible, command=lambda *args:self.togglePruneNegligible()) 
+		cmds.menuItem( label='Negligible Threshold...',command=lambda *args:self.setPruneThreshold()) 
+
+		profilingMenu = cmds.menu( label='Profiling')
+		cmds.menuItem( label='Profile Maya Calls', checkBox=self.profiler.isInstalled(), command=lambda *args:self.toggleProfiling()) 
+		cmds.menuItem( label='Show Profile Report', command=lambda *args:self.showProfileReport()) 
+		cmds.menuItem( label='Export Profile...', command=lambda *args:self.exportProfile()) 
+		cmds.menuItem( label='Reset Profile', command=lambda *args:self.profiler.reset()) 
 
 		createMenu = cmds.menu( label='Create new lights')
 		cmds.menuItem( label='Area Light',command=lambda *args:self.createLight("area",lightList))
@@ -578,39 +3824,151 @@ class LCMT:
 		lightStageColumn = cmds.columnLayout(adjustableColumn=True)
 		cmds.rowLayout(numberOfColumns = 2)
 		cmds.text('Lights in the SCENE')
-		cmds.button(label='Refresh!', command = lambda *args: self.refreshList(lightList))  
+		cmds.button(label='Refresh!', command = lambda *args: self.refreshList(lightList, True))  
 		cmds.setParent('..')
 		print self.lightTypes
-		lights = cmds.ls(dag =True,visible=True,type =self.lightTypes)  
-		print "lights", lights
-		lightList = cmds.iconTextScrollList(allowMultiSelection=True,  append=lights)
-		cmds.rowLayout(numberOfColumns = 2)
+		#big scenes only put one page of lights in the list, the search finds the others
+		lightList = self.virtualList(lambda added, removed: self.selectListedLights(added, removed, useGroupLights))
+		self.updateScollList(False, lightList)
+		print "lights", len(self.virtualLists[lightList].names)
+		cmds.rowLayout(numberOfColumns = 5)
 		useGroupLights = cmds.checkBox( label='Group Lights', onCommand = lambda *args: self.updateScollList(True, lightList), offCommand = lambda *args: self.updateScollList(False, lightList))    
+		cmds.optionMenu( label='by', changeCommand = lambda label: self.setGroupingKeys(dict(self.groupingModes)[label], lightList, useGroupLights))
+		for label, keys in self.groupingModes:
+			cmds.menuItem( label=label )
 		cmds.checkBox( label='Save Images?', cc = lambda *args: self.toggleSaveImages())  
+		cmds.checkBox( label='Use Render Cache?', value=self.useRenderCache, cc = lambda *args: self.toggleRenderCache())  
+		cmds.checkBox( label='Pack in one EXR?', value=self.packContributions, cc = lambda *args: self.togglePackContributions())  
 
 		cmds.setParent('..')
-		cmds.iconTextScrollList(lightList,edit=True,selectCommand=lambda *args: cmds.select(self.getElementsFromLightScrollList(lightList,useGroupLights),vis=True))    
 		cmds.button(label='Render Lights!', command = lambda *args: self.renderAllLights(self.getElementsFromLightScrollList(lightList,useGroupLights),cmds.checkBox(useGroupLights, query=True, value=True)))  
+		cmds.button(label='Update Changed Contributions', command = lambda *args: self.updateContributions())  
+		cmds.rowLayout(numberOfColumns = 3)
+		cmds.button(label='Preview Lights (1/4 Res)', command = lambda *args: self.renderAllLights(self.getElementsFromLightScrollList(lightList,useGroupLights),cmds.checkBox(useGroupLights, query=True, value=True),True))  
+		cmds.button(label='Refine Selected', command = lambda *args: self.refineContributions(self.getElementsFromLightScrollList(lightList,useGroupLights) or None))  
+		cmds.button(label='Refine All in Background', command = lambda *args: self.refineContributions(None, True))  
+		cmds.setParent('..')
+		cmds.rowLayout(numberOfColumns = 3)
+		batchWorkers = cmds.intFieldGrp(label='Workers', value1=BatchRenderer.defaultWorkers(), columnWidth2=(50, 40))
+		batchMemory = cmds.intFieldGrp(label='MB per Worker (0 no limit)', value1=0, columnWidth2=(140, 60))
+		cmds.button(label='Batch Render Lights!', command = lambda *args: self.renderAllLightsBatch(self.getElementsFromLightScrollList(lightList,useGroupLights),cmds.checkBox(useGroupLights, query=True, value=True),cmds.intFieldGrp(batchWorkers, query=True, value1=True),memoryLimit=cmds.intFieldGrp(batchMemory, query=True, value1=True)))  
+		cmds.setParent('..')
+		cmds.rowLayout(numberOfColumns = 3)
+		batchFrames = cmds.floatFieldGrp(label='Frames', numberOfFields=3, value1=cmds.playbackOptions(query=True, minTime=True), value2=cmds.playbackOptions(query=True, maxTime=True), value3=1, precision=1, columnWidth4=(50, 50, 50, 40))
+		framesPerJob = cmds.intFieldGrp(label='Frames per Job', value1=1, columnWidth2=(80, 40))
+		cmds.button(label='Batch Render Frame Range!', command = lambda *args: self.renderAllLightsBatch(self.getElementsFromLightScrollList(lightList,useGroupLights),cmds.checkBox(useGroupLights, query=True, value=True),cmds.intFieldGrp(batchWorkers, query=True, value1=True),frames=tuple(cmds.floatFieldGrp(batchFrames, query=True, value=True)),framesPerJob=cmds.intFieldGrp(framesPerJob, query=True, value1=True),memoryLimit=cmds.intFieldGrp(batchMemory, query=True, value1=True)))  
+		cmds.setParent('..')
 		cmds.text('more@nestorprado.com')   
 		cmds.setParent('..')
 		#new column    
 		renderLayersColumn = cmds.columnLayout(adjustableColumn=True)
 		cmds.text('Geometry in the SCENE')
 
-		geometry =  cmds.ls(geometry=True)
-
-		#take out the ibl shapes from the geo selection
+		#the index already took out the lights and ibl shapes
 		#											   Bug fix Issue #1 and #8 
-		geometry = list(set(geometry) - set(lights)- set(cmds.ls(type =self.NonGeoTypes)))   
+		geometry =  self.sceneIndex.getGeometry()
 
-		geoList = cmds.iconTextScrollList(allowMultiSelection=True, append=geometry,selectCommand=lambda *args: cmds.select(cmds.iconTextScrollList(geoList, query=True, si=True )) )
+		geoList = self.virtualList(self.selectListedGeometry)
+		self.virtualLists[geoList].setItems(geometry)
 		cmds.text('Create Render Layers from selected geometry and lights')      
-		cmds.button(label='Create Render Layers!', command = lambda *args: self.createLayersFromLights(cmds.iconTextScrollList(geoList, query=True, si=True ),self.getElementsFromLightScrollList(lightList,useGroupLights)))  
+		sharedGeometry = cmds.checkBox( label='Share Geometry between Layers (Render Setup)', value=self.isRenderSetupActive())
+		cmds.button(label='Create Render Layers!', command = lambda *args: self.createLayersFromLights(self.getScrollListSelection(geoList),self.getElementsFromLightScrollList(lightList,useGroupLights),cmds.checkBox(sharedGeometry, query=True, value=True)))  
+		if self.isRenderEngineInstalled('arnold') or self.isRenderEngineInstalled('renderman'):
+			cmds.button(label='Create Light Group AOVs (Arnold/RenderMan)', command = lambda *args: self.createLightGroupAOVsFromLights(self.getElementsFromLightScrollList(lightList,useGroupLights)))  
+			cmds.button(label='Render Light Groups in One Pass (Arnold/RenderMan)', command = lambda *args: self.createLightGroupAOVsFromLights(self.getElementsFromLightScrollList(lightList,useGroupLights), True))  
 		if self.isRenderEngineInstalled('vray'):
-			cmds.button(label='Create Render Elements (VRay Only)', command = lambda *args: self.createRenderElementsFromLights(cmds.iconTextScrollList(geoList, query=True, si=True ),self.getElementsFromLightScrollList(lightList,useGroupLights)))  
+			cmds.button(label='Create Render Elements (VRay Only)', command = lambda *args: self.createRenderElementsFromLights(self.getScrollListSelection(geoList),self.getElementsFromLightScrollList(lightList,useGroupLights)))  
 		cmds.setParent('..')
 
 		cmds.showWindow()
 
-LCMT = LCMT()
-LCMT.displayUI()
+#tool of the Maya session, created the first time the window is opened
+tool = None
+
+def showUI():
+	global tool
+	if tool == None:
+		tool = LCMT()
+	tool.displayUI()
+	return tool
+
+def main(argv=None):
+	"""Headless entry point for mayapy:
+	mayapy lcmtv_current_release.py scene.mb render|layers|elements [options]"""
+	import argparse
+	parser = argparse.ArgumentParser(prog='mayapy lcmtv_current_release.py', description='Light Contribution Management Tool without the UI')
+	parser.add_argument('scene', help='Maya scene to open')
+	parser.add_argument('action', choices=['render', 'layers', 'elements'],
+						help='render the light contributions, create render layers or VRay LightSelect render elements from the lights')
+	parser.add_argument('--lights', default='', help='comma separated lights, all the lights by default')
+	parser.add_argument('--groups', action='store_true', help='render one contribution per light group instead of one per light')
+	parser.add_argument('--group-by', default='keyword', help='comma separated keys of the light groups: %s' % ', '.join(SceneIndex.groupKeys))
+	parser.add_argument('--workers', type=int, default=0, help='Render processes at once, a quarter of the cores by default')
+	parser.add_argument('--frames', default=None, help='frame range to render, like 1-100 or 1-100x2, the current frame by default')
+	parser.add_argument('--frames-per-job', type=int, default=1, help='frames rendered by each Render process')
+	parser.add_argument('--memory', type=int, default=0, help='MB of memory each Render process is expected to use, fewer workers are run if they would not fit')
+	parser.add_argument('--shared-geometry', action='store_true', help='layers select the geometry through one shared set (Render Setup)')
+	parser.add_argument('--pack', action='store_true', help='pack the rendered contributions in one multi-part EXR')
+	parser.add_argument('--skip-negligible', type=float, default=None, metavar='PERCENT',
+						help='leave out the lights under this share of the energy in the last analysis of the scene')
+	parser.add_argument('--project', default=None, help='Maya project of the scene')
+	parser.add_argument('--save', default=None, help='save the scene with the new layers or elements here instead of over the opened one')
+	args = parser.parse_args(argv)
+	frames = None
+	if args.frames:
+		try:
+			frames = ContributionScheduler.parseFrames(args.frames)
+		except ValueError, e:
+			parser.error(str(e))
+	groupKeys = tuple(args.group_by.split(','))
+	for key in groupKeys:
+		if key not in SceneIndex.groupKeys:
+			parser.error('lights can be grouped by %s, not %s' % (', '.join(SceneIndex.groupKeys), key))
+
+	import maya.standalone
+	maya.standalone.initialize(name='python')
+	lcmt = None
+	try:
+		if args.project:
+			cmds.workspace(args.project, openWorkspace=True)
+		cmds.file(args.scene, open=True, force=True)
+		lcmt = LCMT()
+		lcmt.groupingKeys = groupKeys
+		if args.skip_negligible != None:
+			lcmt.pruneNegligible = True
+			lcmt.pruneThreshold = args.skip_negligible / 100.0
+		lights = []
+		if args.lights:
+			#shapes of the lights given, transforms are accepted too
+			lights = cmds.ls(args.lights.split(','), dag=True, type=lcmt.lightTypes)
+			if not lights:
+				print lcmt.version, 'ERROR: none of', args.lights, 'are lights'
+				return 1
+		if args.action == 'render':
+			lcmt.packContributions = args.pack
+			results = lcmt.renderAllLightsBatch(lights, args.groups, args.workers, wait=True, frames=frames, framesPerJob=args.frames_per_job, memoryLimit=args.memory)
+			lcmt.imageWriter.wait()
+			failed = len([result for result in results if result['returnCode'] != 0])
+			print lcmt.version, len(results), 'jobs rendered,', failed, 'failed'
+			return int(failed > 0 or not results)
+		if args.action == 'layers':
+			lcmt.createLayersFromLights([], lights, args.shared_geometry)
+		else:
+			lcmt.createRenderElementsFromLights([], lights)
+		if args.save:
+			cmds.file(rename=args.save)
+		cmds.file(save=True, force=True)
+		print lcmt.version, 'Saved', cmds.file(query=True, sceneName=True)
+		return 0
+	finally:
+		if lcmt != None:
+			lcmt.close()
+		if hasattr(maya.standalone, 'uninitialize'):
+			maya.standalone.uninitialize()
+
+if __name__ == '__main__':
+	#maya.cmds has no commands until maya.standalone is initialized: mayapy (a wrapper of another
+	#python executable on Linux and macOS) runs the command line, the script editor opens the window
+	if not hasattr(cmds, 'about'):
+		sys.exit(main())
+	showUI()
@@ -0,0 +1,45 @@
+"""Shared setup of the LCMT tests, run without Maya:
+
+	python -m unittest discover -s tests
+
+The stand-in maya package of benchmarks/ is put first on the path, the tool is
+loaded once and every test gets a new synthetic scene in a temporary project."""
+
+import imp
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+#the stand-in maya package has to be found before anything imports maya
+sys.path.insert(0, os.path.join(root, 'benchmarks'))
+
+from maya import cmds
+from benchmark_lcmt import Silence
+
+with Silence():
+	lcmt = imp.load_source('lcmt_test_target', os.path.join(root, 'lcmtv_current_release.py'))
+
+
+class LCMTTestCase(unittest.TestCase):
+	"""A scene of lightCount lights and geometryCount shapes, newTool() opens LCMT on it.
+	LCMT prints every step, the output is silenced while a test runs."""
+
+	lightCount = 6
+	geometryCount = 4
+	names = 'keyword'
+
+	def setUp(self):
+		silence = Silence()
+		silence.__enter__()
+		self.addCleanup(silence.__exit__)
+		self.project = tempfile.mkdtemp(prefix='lcmt_test_') + '/'
+		cmds.newScene(lights=self.lightCount, geometry=self.geometryCount, names=self.names, project=self.project)
+
+	def tearDown(self):
+		shutil.rmtree(self.project, ignore_errors=True)
+
+	def newTool(self):
+		return lcmt.LCMT()
@@ -0,0 +1,192 @@
+import json
+import os
+import sys
+import unittest
+
+from lcmtTestCase import LCMTTestCase, cmds, lcmt
+
+Scheduler = lcmt.ContributionScheduler
+
+
+class FrameRangeTest(unittest.TestCase):
+
+	def testParseFrames(self):
+		self.assertEqual(Scheduler.parseFrames('10'), (10.0, 10.0, 1.0))
+		self.assertEqual(Scheduler.parseFrames('1-100'), (1.0, 100.0, 1.0))
+		self.assertEqual(Scheduler.parseFrames(' 1 - 100 x 2 '), (1.0, 100.0, 2.0))
+		self.assertEqual(Scheduler.parseFrames('-5-5'), (-5.0, 5.0, 1.0))
+		self.assertEqual(Scheduler.parseFrames('1.5-3'), (1.5, 3.0, 1.0))
+
+	def testParseFramesRejects(self):
+		for text in ['', 'a-b', '1-', '10-1', '1-10x0', '1-10x-1', '1,10']:
+			self.assertRaises(ValueError, Scheduler.parseFrames, text)
+
+	def testFrameChunks(self):
+		self.assertEqual(Scheduler.frameChunks(1, 10, 2, 2), [(1, 3, 2), (5, 7, 2), (9, 9, 2)])
+		self.assertEqual(Scheduler.frameChunks(1, 3, 1, 1), [(1, 1, 1), (2, 2, 1), (3, 3, 1)])
+		self.assertEqual(Scheduler.frameChunks(1, 3, 1, 0), [(1, 1, 1), (2, 2, 1), (3, 3, 1)])
+		self.assertEqual(Scheduler.frameChunks(1, 4, 1, 10), [(1, 4, 1)])
+
+	def testFrameCount(self):
+		self.assertEqual(lcmt.RenderJob('key', [], '', '', 'key').frameCount(), 1)
+		for first, last, step in Scheduler.frameChunks(1, 10, 2, 2):
+			job = lcmt.RenderJob('key', [], '', '', 'key', (first, last, step))
+			self.assertEqual(job.frameCount(), len(range(first, last + 1, step)))
+
+
+class SchedulerTest(LCMTTestCase):
+
+	def writeLog(self, entries):
+		f = open(os.path.join(self.project, 'shot_batch.jsonl'), 'w')
+		for entry in entries:
+			f.write(json.dumps(entry) + '\n')
+		f.close()
+
+	def makeJob(self, name, lights, frames):
+		return lcmt.RenderJob(name, lights, '', self.project, name, frames)
+
+	def testLongestFirst(self):
+		self.writeLog([{'scene': 'shot', 'name': 'key', 'seconds': 10.0, 'frames': 1},
+					{'scene': 'shot', 'name': 'rim', 'seconds': 40.0, 'frames': 2},
+					{'scene': 'shot', 'name': 'rim', 'seconds': 1000.0, 'mode': 'preview'},
+					{'scene': 'other', 'name': 'key', 'seconds': 1000.0}])
+		scheduler = Scheduler(self.project, 'shot')
+		self.assertEqual(scheduler.secondsPerFrame('rim'), 20.0)
+		jobs = scheduler.jobs({'key': ['a'], 'rim': ['b'], 'new': ['c']}, Scheduler.frameChunks(1, 4, 1, 2), self.makeJob)
+		self.assertEqual([job.name for job in jobs], ['rim', 'rim', 'new', 'new', 'key', 'key'])
+		#never rendered before: the average of the others
+		self.assertEqual(jobs[2].estimate, 30.0)
+
+	def testMalformedEntriesAreSkipped(self):
+		self.writeLog([{'scene': 'shot', 'seconds': 10.0},
+					{'scene': 'shot', 'name': 'key'},
+					{'scene': 'shot', 'name': 'key', 'seconds': None},
+					{'scene': 'shot', 'name': 'key', 'seconds': 'slow'},
+					[1, 2],
+					{'scene': 'shot', 'name': 'key', 'seconds': 6.0, 'frames': 2}])
+		self.assertEqual(Scheduler.loadHistory(self.project, 'shot'), {'key': [1, 3.0]})
+
+	def testNoHistory(self):
+		jobs = Scheduler(self.project, 'shot').jobs({'key': ['a'], 'rim': ['b', 'c']}, [None], self.makeJob)
+		self.assertEqual([job.name for job in jobs], ['rim', 'key'])
+
+
+class StandInRunner:
+	"""Writes an empty image per frame named like Render does instead of rendering."""
+
+	def __init__(self, returnCode=0):
+		self.returnCode = returnCode
+		self.jobs = []
+
+	def __call__(self, job, scene):
+		self.jobs.append(job)
+		if self.returnCode != 0:
+			return self.returnCode, 'stand-in render failed'
+		frames = ['']
+		if job.frames != None:
+			frames = ['.%04d' % (job.frames[0] + index * job.frames[2]) for index in range(job.frameCount())]
+		for frame in frames:
+			open(os.path.join(job.outputDir, job.imageName + frame + '.exr'), 'w').close()
+		return 0, 'stand-in render of ' + scene
+
+
+class BatchRenderTest(LCMTTestCase):
+
+	def setUp(self):
+		LCMTTestCase.setUp(self)
+		self.tool = self.newTool()
+		self.lights = self.tool.sceneIndex.getLights(visibleOnly=True)
+		self.runner = StandInRunner()
+		self.packed = []
+		self.tool.packImages = lambda path, layers: self.packed.append((os.path.basename(path), layers))
+
+	def render(self, lights, **kwargs):
+		return self.tool.renderAllLightsBatch(lights, runner=self.runner, wait=True, workers=2, **kwargs)
+
+	def testOneJobPerContribution(self):
+		self.render(self.lights)
+		self.assertEqual(sorted([job.name for job in self.runner.jobs]), sorted([self.tool.contributionName(light) for light in self.lights]))
+		for job in self.runner.jobs:
+			self.assertTrue(job.imageName.endswith('_contributionOf_' + job.name), job.imageName)
+			self.assertEqual(job.frames, None)
+
+	def testGroupJobs(self):
+		self.render(self.lights, useGroups=True)
+		groups = self.tool.groupLights(self.lights)
+		self.assertEqual(dict([(job.name, sorted(job.lights)) for job in self.runner.jobs]), dict([(group, sorted(groups[group])) for group in groups]))
+
+	def testVisibilityOfEveryJob(self):
+		self.render(self.lights)
+		for job in self.runner.jobs:
+			lines = job.preRender.splitlines()
+			for light in self.lights:
+				self.assertEqual('setAttr %s.visibility 0;' % light in lines, light not in job.lights, light)
+		#the scene itself is left as it was
+		for light in self.lights:
+			self.assertTrue(cmds.getAttr(light + '.visibility'))
+
+	def testImagesAreRecorded(self):
+		results = self.render(self.lights)
+		self.assertEqual([result['returnCode'] for result in results], [0] * len(self.lights))
+		for job in self.runner.jobs:
+			contribution = self.tool.contributions[self.tool.contributionName(job.lights)]
+			self.assertEqual(contribution['lights'], job.lights)
+			self.assertEqual(contribution['image'], os.path.join(job.outputDir, job.imageName + '.exr'))
+
+	def testGroupImagesAreKeptLikeTheInteractiveOnes(self):
+		self.render(self.lights, useGroups=True)
+		groups = self.tool.groupLights(self.lights)
+		self.assertEqual(sorted(self.tool.contributions), sorted([self.tool.contributionName(lights) for lights in groups.values()]))
+
+	def testFailedJobs(self):
+		self.runner = StandInRunner(returnCode=3)
+		results = self.render(self.lights[:2])
+		self.assertEqual([result['returnCode'] for result in results], [3, 3])
+		self.assertEqual(self.tool.contributions, {})
+		logs = lcmt.glob.glob(self.tool.renderTelemetry('batch', 0).folder + '*_batch_*.jsonl')
+		self.assertEqual([json.loads(line)['returnCode'] for line in open(logs[0])], [3, 3])
+
+	def testRunnerErrors(self):
+		def runner(job, scene):
+			raise OSError('Render not found')
+		results = self.tool.renderAllLightsBatch(self.lights[:1], runner=runner, wait=True)
+		self.assertEqual([(result['returnCode'], result['log']) for result in results], [(-1, 'Render not found')])
+
+	def testEveryFrameOfTheJobsIsPacked(self):
+		self.tool.packContributions = True
+		self.render(self.lights[:2], frames=(1, 4, 1), framesPerJob=2)
+		self.assertEqual(len(self.runner.jobs), 4)
+		self.assertEqual([path.rsplit('_', 1)[-1] for path, layers in sorted(self.packed)], ['f1.exr', 'f2.exr', 'f3.exr', 'f4.exr'])
+		for path, layers in self.packed:
+			frame = path.rsplit('_f', 1)[-1].split('.')[0]
+			self.assertEqual(len(layers), 2)
+			for name, image in layers:
+				self.assertTrue(image.endswith('.%04d.exr' % int(frame)), image)
+
+
+	def testRefinedInTheBackgroundWithThePreviewGroups(self):
+		self.tool.renderAllLights(self.lights, True, preview=True)
+		self.tool.setGroupingKeys(('type',))
+		self.tool.renderAllLightsBatch = lambda lights, useGroups, **kwargs: lcmt.LCMT.renderAllLightsBatch(self.tool, lights, useGroups, runner=self.runner, wait=True, **kwargs)
+		self.tool.refineContributions(background=True)
+		self.assertEqual(sorted([job.name for job in self.runner.jobs]), sorted(self.tool.groupLights(self.lights, ('keyword',))))
+
+
+class MemoryLimitTest(unittest.TestCase):
+
+	def testNoLimit(self):
+		runner = lcmt.CommandLineRenderRunner('Render')
+		self.assertEqual(runner.limitMemory(['Render', 'scene.mb']), ['Render', 'scene.mb'])
+
+	@unittest.skipUnless(sys.platform.startswith('linux'), 'the memory limit is only enforced on Linux')
+	def testRenderOverTheCapFails(self):
+		runner = lcmt.CommandLineRenderRunner('Render', memoryLimit=100)
+		allocate = [sys.executable, '-c', 'x = bytearray(%d * 1024 * 1024)']
+		small = runner.limitMemory(allocate[:-1] + [allocate[-1] % 10])
+		large = runner.limitMemory(allocate[:-1] + [allocate[-1] % 1000])
+		self.assertEqual(lcmt.subprocess.call(small), 0)
+		self.assertNotEqual(lcmt.subprocess.call(large, stderr=open(os.devnull, 'w')), 0)
+
+
+if __name__ == '__main__':
+	unittest.main()
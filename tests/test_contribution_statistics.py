@@ -0,0 +1,90 @@
+import os
+import time
+import unittest
+
+from lcmtTestCase import LCMTTestCase, lcmt
+
+#numpy is optional in the tool, these tests only run where it is installed
+numpy = lcmt.numpy
+
+
+@unittest.skipIf(numpy is None, 'the contribution statistics need numpy')
+class ContributionStatisticsTest(LCMTTestCase):
+
+	def setUp(self):
+		LCMTTestCase.setUp(self)
+		self.statistics = lcmt.ContributionStatistics(self.project + 'images/lcmt_logs/shot_statistics.json')
+
+	def contribution(self, name, lights, value):
+		#an image of that constant value, read back from the .npy RelightEngine keeps next to it
+		path = self.project + name + '.exr'
+		open(path, 'w').close()
+		past = time.time() - 10
+		os.utime(path, (past, past))
+		numpy.save(path + '.npy', numpy.full((2, 2, 4), value, numpy.float32))
+		return {name: {'lights': lights, 'image': path}}
+
+	def shares(self, frame=1.0):
+		return dict([(name, round(entry['share'], 6)) for name, entry in self.statistics.frameStats(frame).items()])
+
+	def testShares(self):
+		contributions = self.contribution('key', ['keyShape'], 3.0)
+		contributions.update(self.contribution('rim', ['rimShape'], 1.0))
+		self.statistics.analyze(contributions, 1.0)
+		self.assertEqual(self.shares(), {'key': 0.75, 'rim': 0.25})
+		self.assertEqual([row[0] for row in self.statistics.rank(frame=1.0)], ['key', 'rim'])
+
+	def testLaterAnalysesAreMerged(self):
+		#a light rendered alone afterwards is compared with everything stored for the frame
+		self.statistics.analyze(self.contribution('key', ['keyShape'], 3.0), 1.0)
+		self.statistics.analyze(self.contribution('rim', ['rimShape'], 1.0), 1.0)
+		self.assertEqual(self.shares(), {'key': 0.75, 'rim': 0.25})
+		#and read again by the next sessions
+		self.assertEqual(lcmt.ContributionStatistics(self.statistics.path).frameStats(1.0)['rim']['share'], 0.25)
+
+	def testRenderedAgainReplaces(self):
+		self.statistics.analyze(self.contribution('key', ['keyShape', 'fillShape'], 3.0), 1.0)
+		self.statistics.analyze(self.contribution('rim', ['rimShape'], 1.0), 1.0)
+		#the lights of the group rendered on their own replace it
+		self.statistics.analyze(self.contribution('fill', ['fillShape'], 1.0), 1.0)
+		self.assertEqual(self.shares(), {'fill': 0.5, 'rim': 0.5})
+
+	def testFramesAreApart(self):
+		self.statistics.analyze(self.contribution('key', ['keyShape'], 3.0), 1.0)
+		self.statistics.analyze(self.contribution('rim', ['rimShape'], 1.0), 2.0)
+		self.assertEqual(self.shares(1.0), {'key': 1.0})
+		self.assertEqual(self.shares(2.0), {'rim': 1.0})
+
+	def testSameContributionsAtAnotherFrame(self):
+		#the contributions are named after the lights, the same at every frame
+		for frame, rim in ((1.0, 1.0), (2.0, 3.0)):
+			contributions = self.contribution('key', ['keyShape'], 3.0)
+			contributions.update(self.contribution('rim', ['rimShape'], rim))
+			self.statistics.analyze(contributions, frame)
+		self.assertEqual(self.shares(1.0), {'key': 0.75, 'rim': 0.25})
+		self.assertEqual(self.shares(2.0), {'key': 0.5, 'rim': 0.5})
+		statistics = lcmt.ContributionStatistics(self.statistics.path)
+		self.assertEqual(sorted(statistics.load()['rim']), ['1.0', '2.0'])
+		self.assertEqual(statistics.negligibleLights(0.3), set())
+		self.assertEqual([row[0] for row in statistics.rank(frame=1.0)], ['key', 'rim'])
+
+	def testNegligibleEverywhere(self):
+		contributions = self.contribution('key', ['keyShape'], 99.0)
+		contributions.update(self.contribution('rim', ['rimShape'], 1.0))
+		contributions.update(self.contribution('kick', ['kickShape'], 0.5))
+		self.statistics.analyze(contributions, 1.0)
+		self.assertEqual(self.statistics.negligibleLights(0.02), set(['rimShape', 'kickShape']))
+		#the rim matters on another frame
+		self.statistics.analyze(self.contribution('rim', ['rimShape'], 1.0), 2.0)
+		self.assertEqual(self.statistics.negligibleLights(0.02), set(['kickShape']))
+
+	def testCorruptFile(self):
+		os.makedirs(os.path.dirname(self.statistics.path))
+		open(self.statistics.path, 'w').write('{"key": ')
+		self.assertEqual(self.statistics.load(), {})
+		self.statistics.analyze(self.contribution('key', ['keyShape'], 1.0), 1.0)
+		self.assertEqual(lcmt.ContributionStatistics(self.statistics.path).load().keys(), ['key'])
+
+
+if __name__ == '__main__':
+	unittest.main()
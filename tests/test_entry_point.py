@@ -0,0 +1,41 @@
+import os
+import runpy
+import sys
+import unittest
+from StringIO import StringIO
+
+from lcmtTestCase import LCMTTestCase, cmds, root
+
+
+class EntryPointTest(LCMTTestCase):
+	"""Run as a script the tool picks the command line or the window from the Maya session."""
+
+	def runScript(self, *args):
+		argv = sys.argv
+		sys.argv = ['lcmtv_current_release.py'] + list(args)
+		self.addCleanup(setattr, sys, 'argv', argv)
+		return runpy.run_path(os.path.join(root, 'lcmtv_current_release.py'), run_name='__main__')
+
+	def testWithoutStandaloneItRunsTheCommandLine(self):
+		#maya.cmds before maya.standalone.initialize(), whatever the python executable is called
+		self.assertFalse(hasattr(cmds, 'about'))
+		stdout = sys.stdout
+		sys.stdout = output = StringIO()
+		try:
+			with self.assertRaises(SystemExit) as exit:
+				self.runScript('--help')
+		finally:
+			sys.stdout = stdout
+		self.assertEqual(exit.exception.code, 0)
+		self.assertTrue(output.getvalue().startswith('usage: mayapy lcmtv_current_release.py'))
+
+	def testInsideMayaItOpensTheWindow(self):
+		cmds.about = lambda **kwargs: '2024'
+		self.addCleanup(delattr, cmds, 'about')
+		#without OpenMaya the tool of the script has no callbacks to remove afterwards
+		self.runScript()
+		self.assertTrue(cmds.window('LCMTUIWindow', exists=True))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,36 @@
+import os
+import unittest
+
+from lcmtTestCase import LCMTTestCase, lcmt
+
+
+class ImageWriterTest(LCMTTestCase):
+
+	def testMovesTheImagesAndRemovesTheTempFolder(self):
+		writer = lcmt.ImageWriter()
+		source = writer.tempPath('.exr')
+		self.assertTrue(writer.isTemporary(source))
+		destination = self.project + 'images/tmp/contribution.exr'
+		writer.submit(lcmt.ImageWriter.moveFile, source, destination)
+		tempFolder = writer.tempFolder
+		self.assertEqual(writer.wait(), [])
+		self.assertTrue(os.path.exists(destination))
+		self.assertFalse(os.path.exists(tempFolder))
+		self.assertEqual(writer.tempFolder, None)
+
+	def testErrorsNameTheFileBeingWritten(self):
+		writer = lcmt.ImageWriter()
+		writer.submit(lcmt.ImageWriter.packLayers, self.project + 'packed.exr', [('key', self.project + 'missing.exr')])
+		errors = writer.wait()
+		self.assertEqual([(job, output) for job, output, e in errors], [('packLayers', self.project + 'packed.exr')])
+
+	def testFileNamesAreUnique(self):
+		names = lcmt.LCMT.fileNames(['a:b', 'a_b', 'A_b', 'pointLight/key', 'pointLight_key', 'rim'])
+		self.assertEqual(len(set([name.lower() for name in names.values()])), 6)
+		self.assertEqual(names['rim'], 'rim')
+		for name in names.values():
+			self.assertTrue(name.replace('_', '').isalnum())
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+
+from lcmtTestCase import LCMTTestCase, cmds, lcmt
+
+
+class LightNameClassifierTest(unittest.TestCase):
+
+	def testFirstKeywordFound(self):
+		classifier = lcmt.LightNameClassifier('key|rim')
+		self.assertEqual(classifier.classify('rim_KEY_light'), 'rim')
+		self.assertEqual(classifier.classify('KeyLight'), 'key')
+		self.assertEqual(classifier.classify('fill'), 'fill')
+
+	def testKeywordsAreLiteral(self):
+		classifier = lcmt.LightNameClassifier(['c++', 'a.b'])
+		self.assertEqual(classifier.classify('c++Light'), 'c++')
+		self.assertEqual(classifier.classify('axbLight'), 'axbLight')
+
+	def testHeaviestKeywordWins(self):
+		classifier = lcmt.LightNameClassifier([('key', 0), ('rim', 10)])
+		self.assertEqual(classifier.classify('key_rim_light'), 'rim')
+
+	def testCacheIsDroppedWithTheKeywords(self):
+		classifier = lcmt.LightNameClassifier('key')
+		self.assertEqual(classifier.classify('rimLight'), 'rimLight')
+		classifier.setKeywords('key|rim')
+		self.assertEqual(classifier.classify('rimLight'), 'rim')
+		self.assertEqual(classifier.classify_many(['keyA', 'rimB', 'keyC']), {'key': ['keyA', 'keyC'], 'rim': ['rimB']})
+
+
+class SceneIndexGroupingTest(LCMTTestCase):
+
+	lightCount = 12
+
+	def setUp(self):
+		LCMTTestCase.setUp(self)
+		self.tool = self.newTool()
+		self.index = self.tool.sceneIndex
+		self.lights = self.index.getLights()
+
+	def testKeyword(self):
+		groups = self.tool.groupLights(self.lights, ('keyword',))
+		for group in groups:
+			self.assertTrue(group in self.tool.lightDB.keywords() or groups[group] == [group])
+			for light in groups[group]:
+				self.assertTrue(group in light.lower())
+		self.assertEqual(sorted(sum(groups.values(), [])), sorted(self.lights))
+
+	def testType(self):
+		groups = self.tool.groupLights(self.lights, ('type',))
+		for group in groups:
+			self.assertEqual(set([cmds.objectType(light) for light in groups[group]]), set([group]))
+
+	def testComposite(self):
+		groups = self.tool.groupLights(self.lights, ('type', 'keyword'))
+		keywords = self.tool.groupLights(self.lights, ('keyword',))
+		for group in groups:
+			lightType, keyword = group.split('/')
+			for light in groups[group]:
+				self.assertEqual(cmds.objectType(light), lightType)
+				self.assertTrue(light in keywords[keyword])
+
+	def testTag(self):
+		light = self.lights[0]
+		cmds.setAttr('%s.%s' % (light, lcmt.SceneIndex.tagAttribute), 'hero')
+		self.index.invalidate()
+		groups = self.tool.groupLights(self.lights, ('tag',))
+		self.assertEqual(groups['hero'], [light])
+		self.assertEqual(sorted(groups['untagged']), sorted(self.lights[1:]))
+
+	def testLightGroupAOVsOfNamesAlikeAreKeptApart(self):
+		for light, tag in zip(self.lights, ['a:b', 'a_b', 'type/key', 'type_key']):
+			cmds.setAttr('%s.%s' % (light, lcmt.SceneIndex.tagAttribute), tag)
+		self.index.invalidate()
+		self.tool.setGroupingKeys(('tag',))
+		created = []
+		self.tool.createArnoldLightGroups = created.append
+		cmds.setAttr('defaultRenderGlobals.currentRenderer', 'arnold')
+		self.tool.createLightGroupAOVsFromLights()
+		groups = created[0]
+		self.assertEqual(len(groups), 5)
+		self.assertEqual(sorted(sum(groups.values(), [])), sorted(self.lights))
+		for group in groups:
+			self.assertTrue(group.replace('_', '').isalnum(), group)
+
+	def testUnknownKey(self):
+		self.assertRaises(ValueError, self.index.groupLights, self.lights, ('colour',))
+
+	def testUnindexedLightsAreGroupsOfTheirOwn(self):
+		groups = self.index.groupLights(['notALight'], ('type', 'keyword'))
+		self.assertEqual(groups, {'notALight/notALight': ['notALight']})
+
+
+if __name__ == '__main__':
+	unittest.main()
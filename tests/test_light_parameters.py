@@ -0,0 +1,103 @@
+import unittest
+
+from lcmtTestCase import LCMTTestCase, cmds, lcmt
+
+
+class LightParameterEditorTest(LCMTTestCase):
+	"""Lights split by type, every type mapped to the attribute of its renderer."""
+
+	lightCount = 14
+
+	def setUp(self):
+		LCMTTestCase.setUp(self)
+		self.editor = lcmt.LightParameterEditor()
+		self.lights = cmds.ls(type=['light', 'aiAreaLight', 'VRayLightRectShape', 'VRayLightSphereShape'])
+
+	def lightsOfType(self, nodeType):
+		return [light for light in self.lights if cmds.objectType(light) == nodeType]
+
+	def testPartitionByType(self):
+		partitions = self.editor.partitionByType(self.lights)
+		self.assertEqual(sorted(partitions), sorted(set([cmds.objectType(light) for light in self.lights])))
+		for nodeType in partitions:
+			self.assertEqual(sorted(partitions[nodeType]), sorted(self.lightsOfType(nodeType)))
+		self.assertEqual(self.editor.partitionByType([]), {})
+
+	def testAttributeOfEachRenderer(self):
+		self.assertEqual(self.editor.attribute('intensity', 'pointLight'), ('intensity', None))
+		self.assertEqual(self.editor.attribute('intensity', 'VRayLightRectShape'), ('intensityMult', None))
+		self.assertEqual(self.editor.attribute('color', 'VRayLightSphereShape'), ('lightColor', None))
+		self.assertEqual(self.editor.attribute('exposure', 'aiAreaLight'), ('aiExposure', None))
+
+	def testEnableSwitches(self):
+		self.assertEqual(self.editor.attribute('temperature', 'spotLight'), ('aiColorTemperature', ('aiUseColorTemperature', 1)))
+		self.assertEqual(self.editor.attribute('temperature', 'VRayLightRectShape'), ('temperature', ('colorMode', 1)))
+
+	def testTypesWithoutTheParameter(self):
+		self.assertEqual(self.editor.attribute('exposure', 'VRayLightRectShape'), (None, None))
+		vrayLights = self.lightsOfType('VRayLightRectShape') + self.lightsOfType('VRayLightSphereShape')
+		self.assertEqual(self.editor.apply(self.lights, 'exposure', 1.0), len(self.lights) - len(vrayLights))
+
+	def testSetScaleAndOffset(self):
+		light = self.lightsOfType('pointLight')[0]
+		self.editor.apply([light], 'intensity', 2.0)
+		self.editor.apply([light], 'intensity', 1.5, 'scale')
+		self.editor.apply([light], 'intensity', -0.5, 'offset')
+		self.assertEqual(cmds.getAttr(light + '.intensity'), 2.5)
+
+	def testVRayIntensityAndTemperature(self):
+		light = self.lightsOfType('VRayLightRectShape')[0]
+		self.editor.apply([light], 'intensity', 2.0, 'scale')
+		self.editor.apply([light], 'temperature', 3200.0)
+		self.assertEqual(cmds.getAttr(light + '.intensityMult'), 2.0)
+		self.assertEqual(cmds.getAttr(light + '.temperature'), 3200.0)
+		self.assertEqual(cmds.getAttr(light + '.colorMode'), 1)
+
+	def testColorChannels(self):
+		light = self.lightsOfType('spotLight')[0]
+		self.editor.apply([light], 'color', [0.5, 1.0, 2.0])
+		self.editor.apply([light], 'color', 2.0, 'scale')
+		self.assertEqual(cmds.getAttr(light + '.color'), [(1.0, 2.0, 4.0)])
+
+	def testValuePerLight(self):
+		lights = self.lightsOfType('pointLight') + self.lightsOfType('spotLight')
+		self.editor.apply(lights, 'intensity', {lights[0]: 3.0, lights[1]: 4.0})
+		self.assertEqual([cmds.getAttr(light + '.intensity') for light in lights], [3.0, 4.0])
+
+	def testValuesByLongName(self):
+		lights = self.lightsOfType('pointLight')[:1] + self.lightsOfType('spotLight')[:1]
+		paths = cmds.ls(lights, long=True)
+		self.assertEqual(self.editor.apply(paths, 'intensity', {paths[0]: 3.0, paths[1]: 4.0}), 2)
+		self.assertEqual([cmds.getAttr(light + '.intensity') for light in lights], [3.0, 4.0])
+		#a light without a value is left as it is
+		self.assertEqual(self.editor.apply(lights, 'intensity', {lights[0]: 5.0}), 1)
+		self.assertEqual([cmds.getAttr(light + '.intensity') for light in lights], [5.0, 4.0])
+
+
+class ParameterValueTest(LCMTTestCase):
+	"""What the prompt of changeLightParams accepts."""
+
+	def setUp(self):
+		LCMTTestCase.setUp(self)
+		self.tool = self.newTool()
+
+	def testOperations(self):
+		self.assertEqual(self.tool.parseParameterValue('intensity', '2'), ('set', 2.0))
+		self.assertEqual(self.tool.parseParameterValue('intensity', '*1.5'), ('scale', 1.5))
+		self.assertEqual(self.tool.parseParameterValue('intensity', '-=0.5'), ('offset', -0.5))
+		self.assertEqual(self.tool.parseParameterValue('color', '+=0.5,0,1'), ('offset', [0.5, 0.0, 1.0]))
+
+	def testColorsHaveThreeChannels(self):
+		self.assertRaises(ValueError, self.tool.parseParameterValue, 'color', '1,2')
+		self.assertRaises(ValueError, self.tool.parseParameterValue, 'color', '1,2,3,4')
+
+	def testAnInvalidColorIsNotApplied(self):
+		light = cmds.ls(type='spotLight')[0]
+		color = cmds.getAttr(light + '.color')
+		cmds.scene.promptText = '1,2'
+		self.tool.changeLightParams(None, False, 'color', lights=[light])
+		self.assertEqual(cmds.getAttr(light + '.color'), color)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,109 @@
+import json
+import os
+import stat
+import time
+import unittest
+
+from lcmtTestCase import LCMTTestCase, cmds, lcmt
+
+
+class LightTypeResolverTest(LCMTTestCase):
+
+	lightCount = 16
+
+	def setUp(self):
+		LCMTTestCase.setUp(self)
+		self.tool = self.newTool()
+		self.index = self.tool.sceneIndex
+		self.lights = self.index.getLights()
+
+	def testResolvesInOneQuery(self):
+		resolver = lcmt.LightTypeResolver()
+		cmds.scene.calls.clear()
+		types = resolver.resolve(self.lights + ['notANode'])
+		self.assertEqual(cmds.scene.calls, {'ls': 1})
+		self.assertEqual(types, dict([(light, cmds.objectType(light)) for light in self.lights]))
+
+	def testLightsAskedByPath(self):
+		group = cmds.createNode('transform', name='grp')
+		cmds.createNode('pointLight', name='keyLightShape', parent=group)
+		names = ['|grp|keyLightShape', 'grp|keyLightShape', self.lights[0], '|' + cmds.listRelatives(self.lights[1], p=1)[0] + '|' + self.lights[1]]
+		types = lcmt.LightTypeResolver().resolve(names)
+		self.assertEqual(types, dict([(name, cmds.objectType(name)) for name in names]))
+
+	def testEnvironmentLights(self):
+		environment = self.index.types().environmentLights(self.lights)
+		self.assertEqual(sorted([cmds.objectType(light) for light in environment]), ['VRayLightDomeShape', 'aiSkyDomeLight', 'mentalrayIblShape'])
+		self.assertEqual(self.tool.sortLightsByType(self.lights)[-3:], environment)
+
+	def reuseName(self):
+		#the node of a light name is replaced by one of another type, as after File > Open
+		light = [light for light in self.lights if cmds.objectType(light) == 'pointLight'][0]
+		self.assertFalse(self.tool.isLightVray(light))
+		transform = cmds.listRelatives(light, p=1)[0]
+		cmds.delete(light)
+		cmds.createNode('VRayLightRectShape', name=light, parent=transform)
+		return light
+
+	def testTypesAreAskedAgainAfterASceneChange(self):
+		self.index.suspend()
+		light = self.reuseName()
+		self.index.resume()
+		self.assertTrue(self.tool.isLightVray(light))
+
+	def testTypesAreAskedAgainAfterARefresh(self):
+		light = self.reuseName()
+		self.index.invalidate()
+		self.assertEqual(self.index.types().nodeType(light), 'VRayLightRectShape')
+
+
+class LightTypesDBTest(LCMTTestCase):
+
+	def setUp(self):
+		LCMTTestCase.setUp(self)
+		self.db = lcmt.LightTypesDB(self.project + 'scripts/')
+
+	def testDefaults(self):
+		self.assertEqual(self.db.keywords(), lcmt.LightTypesDB.defaultKeywords)
+		self.assertTrue(os.path.exists(self.db.fullPath))
+
+	def testAddMergesAndSortsByWeight(self):
+		self.db.add('Rim, fill:5,  Bounce  Card :2|key:1')
+		self.assertEqual(self.db.keywords()[:4], ['fill', 'bounce card', 'key', 'bounce'])
+		self.assertEqual(self.db.keywords().count('rim'), 1)
+
+	def testSharedWithTheProject(self):
+		self.db.load()
+		self.assertEqual(stat.S_IMODE(os.stat(self.db.fullPath).st_mode) & 0664, 0664)
+		self.assertEqual([name for name in os.listdir(self.db.path) if name.startswith('.')], [])
+
+	def testAFailedWriteKeepsTheFile(self):
+		self.db.load()
+		content = open(self.db.fullPath).read()
+		self.assertRaises(TypeError, lcmt.writeJSON, self.db.fullPath, {'keywords': object()})
+		self.assertEqual(open(self.db.fullPath).read(), content)
+		self.assertEqual([name for name in os.listdir(self.db.path) if name.startswith('.')], [])
+
+	def testChangesOnDiskAreRead(self):
+		self.db.load()
+		other = lcmt.LightTypesDB(self.db.path)
+		other.add('practical')
+		#the modification time can be the same within a second, the size differs
+		self.assertTrue('practical' in self.db.keywords())
+
+	def testCorruptFile(self):
+		self.db.load()
+		open(self.db.fullPath, 'w').write('{"keywords": [')
+		self.assertEqual(self.db.keywords(), lcmt.LightTypesDB.defaultKeywords)
+		#left as it is for the artist to fix
+		self.assertEqual(open(self.db.fullPath).read(), '{"keywords": [')
+		f = open(self.db.fullPath, 'w')
+		json.dump({'keywords': [{'name': 'hero'}]}, f)
+		f.close()
+		future = time.time() + 10
+		os.utime(self.db.fullPath, (future, future))
+		self.assertEqual(self.db.keywords(), ['hero'])
+
+
+if __name__ == '__main__':
+	unittest.main()
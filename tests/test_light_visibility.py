@@ -0,0 +1,72 @@
+import unittest
+
+from lcmtTestCase import LCMTTestCase, cmds, lcmt
+from test_scene_index import StandInOpenMaya
+
+
+class LightVisibilityStateTest(LCMTTestCase):
+
+	#enough lights for newScene to add the IBL and the domes
+	lightCount = 16
+
+	def setUp(self):
+		LCMTTestCase.setUp(self)
+		self.tool = self.newTool()
+		self.lights = self.tool.sceneIndex.getLights()
+		self.state = lcmt.LightVisibilityState(self.lights, self.tool.sceneIndex.typeResolver)
+
+	def sceneValues(self):
+		return dict([(plug, bool(cmds.getAttr(plug))) for plug in self.state.original])
+
+	def testReadWithoutAQueryPerPlug(self):
+		previous = lcmt.om2
+		lcmt.om2 = StandInOpenMaya()
+		self.addCleanup(setattr, lcmt, 'om2', previous)
+		cmds.scene.calls.clear()
+		state = lcmt.LightVisibilityState(self.lights, self.tool.sceneIndex.typeResolver)
+		self.assertFalse('getAttr' in cmds.scene.calls)
+		self.assertEqual(dict([(plug, bool(value)) for plug, value in state.original.items()]), self.sceneValues())
+
+	def testPlanLeavesOnlyTheseLightsOn(self):
+		light = self.lights[5]
+		target = self.state.plan([light])
+		for other in self.lights:
+			self.assertEqual(target['%s.visibility' % other], int(other == light))
+		self.assertEqual(target['%s.visibility' % self.state.transforms[light]], 1)
+
+	def testEnvironmentFlags(self):
+		ibl = cmds.ls(type='mentalrayIblShape')[0]
+		self.assertEqual(self.state.plan([ibl])['%s.visibleInFinalGather' % ibl], 1)
+		self.assertEqual(self.state.plan([self.lights[5]])['%s.visibleInFinalGather' % ibl], 0)
+		dome = cmds.ls(type='aiSkyDomeLight')[0]
+		self.assertEqual(self.state.plan([dome])['%s.camera' % dome], 0)
+
+	def testApplySequenceMatchesAFullPlan(self):
+		#apply() only looks at the lights that were or will be on after the first call
+		for contribution in [self.lights[:3], [self.lights[7]], self.lights[2:5]]:
+			self.state.apply(contribution)
+			values = self.sceneValues()
+			target = self.state.plan(contribution)
+			for plug in target:
+				self.assertEqual(values[plug], bool(target[plug]), plug)
+
+	def testApplyOnlySetsWhatChanged(self):
+		self.state.apply([self.lights[0]])
+		self.assertEqual(self.state.apply([self.lights[0]]), 0)
+
+	def testRestore(self):
+		original = self.sceneValues()
+		self.state.apply([self.lights[3]])
+		self.assertNotEqual(self.sceneValues(), original)
+		self.state.restore()
+		self.assertEqual(self.sceneValues(), original)
+
+	def testMelOnlyHasTheChanges(self):
+		light = self.lights[4]
+		mel = self.state.mel([light])
+		self.assertFalse('setAttr %s.visibility' % light in mel)
+		self.assertTrue('setAttr %s.visibility 0;' % self.lights[6] in mel)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+from lcmtTestCase import LCMTTestCase, cmds, lcmt
+
+
+class CommandProfilerTest(LCMTTestCase):
+	"""The cmds calls of each LCMT method, with several tools profiling at once."""
+
+	def setUp(self):
+		LCMTTestCase.setUp(self)
+		self.tools = [self.newTool(), self.newTool()]
+		for tool in self.tools:
+			self.addCleanup(tool.close)
+			tool.profiler.reportAfterAction = False
+		self.light = self.tools[0].sceneIndex.getLights()[0]
+
+	def testCommandsAreChargedToTheMethodRunning(self):
+		tool = self.tools[0]
+		tool.toggleProfiling()
+		tool.contributionKey([self.light])
+		self.assertTrue(('contributionKey', 'xform') in tool.profiler.stats)
+		#called from outside of the tool through the module commands
+		lcmt.cmds.ls()
+		self.assertTrue(('<outside LCMT>', 'ls') in tool.profiler.stats)
+
+	def testOnlyTheToolRunningIsCharged(self):
+		first, second = self.tools
+		first.toggleProfiling()
+		second.toggleProfiling()
+		first.contributionKey([self.light])
+		self.assertTrue(('contributionKey', 'xform') in first.profiler.stats)
+		self.assertEqual(second.profiler.stats, {})
+
+	def testTheCommandsAreRestoredByTheLastProfiler(self):
+		first, second = self.tools
+		first.toggleProfiling()
+		second.toggleProfiling()
+		first.toggleProfiling()
+		self.assertTrue(isinstance(lcmt.cmds, lcmt.CommandProxy))
+		second.contributionKey([self.light])
+		self.assertTrue(('contributionKey', 'xform') in second.profiler.stats)
+		second.toggleProfiling()
+		self.assertTrue(lcmt.cmds is cmds)
+		self.assertTrue(lcmt.mel is not None and not isinstance(lcmt.mel, lcmt.CommandProxy))
+		self.assertFalse('contributionKey' in second.__dict__)
+
+	def testClosingTheToolStopsProfiling(self):
+		tool = self.tools[0]
+		tool.toggleProfiling()
+		tool.close()
+		self.assertFalse(tool.profiler.isInstalled())
+		self.assertTrue(lcmt.cmds is cmds)
+
+
+if __name__ == '__main__':
+	unittest.main()
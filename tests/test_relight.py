@@ -0,0 +1,62 @@
+import os
+import time
+import unittest
+
+from lcmtTestCase import LCMTTestCase, cmds, lcmt
+
+#numpy is optional in the tool, these tests only run where it is installed
+numpy = lcmt.numpy
+
+
+@unittest.skipIf(numpy is None, 'relighting needs numpy')
+class RelightTest(LCMTTestCase):
+
+	lightCount = 4
+
+	def setUp(self):
+		LCMTTestCase.setUp(self)
+		self.tool = self.newTool()
+		self.lights = self.tool.sceneIndex.getLights()
+
+	def contribution(self, lights, value):
+		#an image of that constant value, read back from the .npy RelightEngine keeps next to it
+		name = self.tool.contributionName(lights)
+		path = self.project + name + '.exr'
+		open(path, 'w').close()
+		past = time.time() - 10
+		os.utime(path, (past, past))
+		numpy.save(path + '.npy', numpy.full((2, 2, 4), value, numpy.float32))
+		self.tool.contributions[name] = {'lights': lights, 'image': path}
+		return name
+
+	def engine(self):
+		names = [self.contribution(self.lights[:2], 2.0), self.contribution(self.lights[2:], 0.5)]
+		self.tool.relightBase = dict()
+		for light in self.lights:
+			self.tool.relightBase[light] = (cmds.getAttr(self.tool.intensityAttribute(light)), cmds.getAttr(self.tool.colorAttribute(light))[0])
+		return lcmt.RelightEngine(names, [self.tool.contributions[name]['image'] for name in names])
+
+	def testCompositeAboveOne(self):
+		engine = self.engine()
+		self.assertTrue(numpy.allclose(engine.composite, 2.5))
+		engine.setGain(0, 3.0, (1.0, 0.5, 0.0))
+		self.assertTrue(numpy.allclose(engine.composite[0, 0], [6.5, 3.5, 0.5]))
+		self.assertTrue(numpy.allclose(engine.recompute()[0, 0], [6.5, 3.5, 0.5]))
+
+	def testGainsAreAppliedInOneEditPerParameter(self):
+		engine = self.engine()
+		engine.setGain(0, 2.0, (1.0, 0.5, 0.5))
+		base = dict([(light, self.tool.relightBase[light]) for light in self.lights])
+		cmds.scene.calls.clear()
+		self.tool.applyRelightGains(engine)
+		#one ls per parameter to split the lights by type
+		self.assertEqual(cmds.scene.calls.get('ls'), 2)
+		for light in self.lights[:2]:
+			self.assertAlmostEqual(cmds.getAttr(self.tool.intensityAttribute(light)), base[light][0] * 2.0)
+			self.assertTrue(numpy.allclose(cmds.getAttr(self.tool.colorAttribute(light))[0], [base[light][1][0], base[light][1][1] * 0.5, base[light][1][2] * 0.5]))
+		for light in self.lights[2:]:
+			self.assertAlmostEqual(cmds.getAttr(self.tool.intensityAttribute(light)), base[light][0])
+
+
+if __name__ == '__main__':
+	unittest.main()
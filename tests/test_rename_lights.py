@@ -0,0 +1,71 @@
+import unittest
+
+from lcmtTestCase import LCMTTestCase, cmds, lcmt
+
+
+class RenameLightsTest(LCMTTestCase):
+	"""lightNewNames and renameLights over the stand-in scene, the lights are renamed in one pass."""
+
+	lightCount = 6
+
+	def setUp(self):
+		LCMTTestCase.setUp(self)
+		self.tool = self.newTool()
+		self.lights = self.tool.sceneIndex.getLights()
+		self.transforms = [cmds.listRelatives(light, p=1)[0] for light in self.lights]
+
+	def moveToNamespace(self, index, namespace):
+		transform = cmds.rename(self.transforms[index], namespace + ':' + self.transforms[index])
+		light = cmds.rename(self.lights[index], namespace + ':' + self.lights[index])
+		self.transforms[index] = transform
+		self.lights[index] = light
+		return light, transform
+
+	def testTheTemplateOnlyNamesTheNodeInItsNamespace(self):
+		light, transform = self.moveToNamespace(0, 'rig')
+		self.assertEqual(self.tool.lightNewNames([light]), {transform: transform})
+		group = self.tool.groupLights([light]).keys()[0]
+		self.assertEqual(self.tool.lightNewNames([light], '{group}-{index:02d}'), {transform: 'rig:%s_01' % group})
+
+	def testSearchAndReplaceInTheName(self):
+		newNames = self.tool.lightNewNames(self.lights[:1], '{name}', '_0', '_1')
+		self.assertEqual(newNames, {self.transforms[0]: self.transforms[0].replace('_0', '_1')})
+
+	def testCollisionsAreResolvedInTheBatch(self):
+		newNames = self.tool.lightNewNames(self.lights, 'light')
+		self.assertEqual(sorted(newNames.values()), sorted(['light'] + ['light_%d' % index for index in range(1, len(self.lights))]))
+
+	def testLightsCanSwapNames(self):
+		first, second = self.transforms[:2]
+		renamed = self.tool.renameLights(self.lights[:2], '{name}', first, second)
+		self.assertEqual(renamed[first], second)
+		#the name the first one takes was the second one's, which is renamed with a suffix
+		self.assertTrue(cmds.objExists(second))
+		self.assertFalse(cmds.objExists(first))
+
+	def testLockedAndReferencedLightsAreLeftOut(self):
+		cmds.lockNode(self.transforms[0], lock=True)
+		cmds.scene.get(self.lights[1]).referenced = True
+		renamed = self.tool.renameLights(self.lights, 'light')
+		self.assertEqual(sorted(renamed), sorted(self.transforms[2:]))
+		self.assertTrue(cmds.objExists(self.transforms[0]))
+		self.assertTrue(cmds.objExists(self.transforms[1]))
+
+	def testAFailedRenameGivesTheNamesBack(self):
+		rename = cmds.rename
+		calls = []
+
+		def failing(name, newName, **kwargs):
+			calls.append(name)
+			if len(calls) == len(self.lights) + 2:
+				raise RuntimeError('Cannot rename a read only node')
+			return rename(name, newName, **kwargs)
+		lcmt.cmds.rename = failing
+		self.addCleanup(setattr, lcmt.cmds, 'rename', rename)
+		self.assertEqual(self.tool.renameLights(self.lights, 'light'), {})
+		self.assertEqual(sorted(cmds.ls(self.transforms)), sorted(self.transforms))
+		self.assertEqual(cmds.ls('__lcmtRename*'), [])
+
+
+if __name__ == '__main__':
+	unittest.main()
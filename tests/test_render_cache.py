@@ -0,0 +1,159 @@
+import os
+import time
+import unittest
+
+from lcmtTestCase import LCMTTestCase, cmds, lcmt
+
+
+class RenderCacheTest(LCMTTestCase):
+
+	def cacheFile(self, cache, key, size):
+		path = cache.path(key, '.exr')
+		f = open(path, 'w')
+		f.write('x' * size)
+		f.close()
+		cache.add(key, path)
+		return path
+
+	def testEvictsTheLeastRecentlyUsed(self):
+		cache = lcmt.RenderCache(self.project + 'cache/', maxBytes=10)
+		first = self.cacheFile(cache, 'first', 4)
+		second = self.cacheFile(cache, 'second', 4)
+		cache.index['first']['used'] = time.time() - 20
+		cache.index['second']['used'] = time.time() - 10
+		#reading an entry makes it the most recently used one
+		self.assertEqual(cache.get('first'), first)
+		third = self.cacheFile(cache, 'third', 4)
+		self.assertEqual(sorted(cache.index), ['first', 'third'])
+		self.assertFalse(os.path.exists(second))
+		self.assertTrue(os.path.exists(first))
+		self.assertTrue(os.path.exists(third))
+
+	def testTheImageAddedIsNeverEvicted(self):
+		cache = lcmt.RenderCache(self.project + 'cache/', maxBytes=10)
+		self.cacheFile(cache, 'first', 4)
+		self.cacheFile(cache, 'second', 4)
+		#used after the one added, by another session sharing the cache
+		cache.index['first']['used'] = cache.index['second']['used'] = time.time() + 10
+		third = self.cacheFile(cache, 'third', 4)
+		self.assertEqual(cache.get('third'), third)
+		self.assertEqual(len(cache.index), 2)
+
+	def testImagesOverTheLimitAreNotCached(self):
+		cache = lcmt.RenderCache(self.project + 'cache/', maxBytes=10)
+		first = self.cacheFile(cache, 'first', 4)
+		path = cache.path('big', '.exr')
+		f = open(path, 'w')
+		f.write('x' * 20)
+		f.close()
+		self.assertFalse(cache.add('big', path))
+		self.assertFalse(os.path.exists(path))
+		self.assertEqual(sorted(cache.index), ['first'])
+		self.assertTrue(os.path.exists(first))
+
+	def testContributionsOverTheLimitAreSavedFromTheRenderView(self):
+		tool = self.newTool()
+		tool.useRenderCache = True
+		tool.saveImages = True
+		tool.renderCache.maxBytes = 1
+		tool.renderAllLights(tool.sceneIndex.getLights(visibleOnly=True)[:2], False)
+		tool.imageWriter.wait()
+		self.assertEqual(len(tool.contributions), 2)
+		for contribution in tool.contributions.values():
+			self.assertTrue(os.path.exists(contribution['image']))
+		self.assertEqual(tool.renderCache.load(), {})
+
+	def testIndexIsKeptOnDisk(self):
+		cache = lcmt.RenderCache(self.project + 'cache/')
+		path = self.cacheFile(cache, 'key', 4)
+		self.assertEqual(lcmt.RenderCache(self.project + 'cache/').get('key'), path)
+
+	def testDeletedImagesAreMisses(self):
+		cache = lcmt.RenderCache(self.project + 'cache/')
+		os.remove(self.cacheFile(cache, 'key', 4))
+		self.assertEqual(cache.get('key'), None)
+		self.assertFalse('key' in cache.index)
+
+	def testACorruptIndexIsAnEmptyCache(self):
+		cache = lcmt.RenderCache(self.project + 'cache/')
+		self.cacheFile(cache, 'key', 4)
+		f = open(cache.indexPath, 'w')
+		f.write('{"key": {"file": "ke')
+		f.close()
+		cache = lcmt.RenderCache(self.project + 'cache/')
+		self.assertEqual(cache.get('key'), None)
+		path = self.cacheFile(cache, 'other', 4)
+		self.assertEqual(lcmt.RenderCache(self.project + 'cache/').get('other'), path)
+		self.assertEqual(os.listdir(self.project + 'cache/').count('index.json'), 1)
+
+	def testHitsAreSavedOnFlush(self):
+		cache = lcmt.RenderCache(self.project + 'cache/')
+		self.cacheFile(cache, 'key', 4)
+		cache.index['key']['used'] = 0
+		cache.save()
+		cache = lcmt.RenderCache(self.project + 'cache/')
+		cache.get('key')
+		cache.flush()
+		self.assertTrue(lcmt.RenderCache(self.project + 'cache/').load()['key']['used'] > 0)
+
+	def testClear(self):
+		cache = lcmt.RenderCache(self.project + 'cache/')
+		path = self.cacheFile(cache, 'key', 4)
+		cache.clear()
+		self.assertEqual(cache.get('key'), None)
+		self.assertFalse(os.path.exists(path))
+
+
+class ContributionKeyTest(LCMTTestCase):
+
+	def setUp(self):
+		LCMTTestCase.setUp(self)
+		self.tool = self.newTool()
+		self.light = self.tool.sceneIndex.getLights()[0]
+		self.key = self.tool.contributionKey([self.light])
+
+	def assertKeyChanges(self, changed=True):
+		key = self.tool.contributionKey([self.light])
+		if changed:
+			self.assertNotEqual(key, self.key)
+		else:
+			self.assertEqual(key, self.key)
+
+	def testSameStateSameKey(self):
+		self.assertKeyChanges(False)
+
+	def testLightAttribute(self):
+		cmds.setAttr(self.light + '.intensity', 2.0)
+		self.assertKeyChanges()
+
+	def testLightVisibilityIsIgnored(self):
+		#renderAllLights toggles it to isolate the contribution
+		cmds.setAttr(self.light + '.visibility', False)
+		self.assertKeyChanges(False)
+
+	def testLightMoved(self):
+		cmds.setAttr(cmds.listRelatives(self.light, p=1)[0] + '.matrix', [2.0] * 16)
+		self.assertKeyChanges()
+
+	def testCurrentFrame(self):
+		cmds.currentTime(12)
+		self.assertKeyChanges()
+
+	def testGeometryMoved(self):
+		cmds.setAttr('geo_00001.matrix', [2.0] * 16)
+		self.assertKeyChanges()
+
+	def testShaderEdited(self):
+		cmds.setAttr(cmds.ls(materials=True)[0] + '.diffuse', 0.5)
+		self.assertKeyChanges()
+
+	def testRenderSettings(self):
+		cmds.setAttr('defaultRenderQuality.shadingSamples', 4)
+		self.assertKeyChanges()
+
+	def testCacheIsOptIn(self):
+		self.assertFalse(self.tool.useRenderCache)
+
+
+if __name__ == '__main__':
+	unittest.main()
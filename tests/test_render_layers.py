@@ -0,0 +1,27 @@
+import unittest
+
+from lcmtTestCase import LCMTTestCase, cmds
+
+
+class SharedGeometrySetTest(LCMTTestCase):
+
+	def setUp(self):
+		LCMTTestCase.setUp(self)
+		self.tool = self.newTool()
+		self.geometry = self.tool.sceneIndex.getGeometry()
+
+	def testSameGeometryReusesTheSet(self):
+		first = self.tool.sharedGeometrySetOf(self.geometry)
+		self.assertEqual(self.tool.sharedGeometrySetOf(list(reversed(self.geometry))), first)
+		self.assertEqual(sorted(cmds.sets(first, query=True)), sorted(self.geometry))
+
+	def testOtherGeometryLeavesEarlierLayersAlone(self):
+		first = self.tool.sharedGeometrySetOf(self.geometry)
+		second = self.tool.sharedGeometrySetOf(self.geometry[:1])
+		self.assertNotEqual(second, first)
+		self.assertEqual(sorted(cmds.sets(first, query=True)), sorted(self.geometry))
+		self.assertEqual(cmds.sets(second, query=True), self.geometry[:1])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,35 @@
+import json
+import unittest
+
+from lcmtTestCase import LCMTTestCase, cmds, lcmt
+
+
+class RenderTelemetryTest(LCMTTestCase):
+
+	def setUp(self):
+		LCMTTestCase.setUp(self)
+		self.tool = self.newTool()
+		self.lights = self.tool.sceneIndex.getLights(visibleOnly=True)
+
+	def logged(self):
+		path = self.tool.renderTelemetry('interactive', 0).folder
+		records = []
+		for name in sorted(lcmt.glob.glob(path + '*.jsonl')):
+			records.extend([json.loads(line) for line in open(name)])
+		return set([(record['mode'], record['width'], record['height']) for record in records])
+
+	def testPreviewsAreLoggedAtTheirResolution(self):
+		self.tool.renderAllLights(self.lights[:1], preview=True)
+		self.assertEqual(self.logged(), set([('preview', 240, 135)]))
+		self.assertEqual(cmds.getAttr('defaultResolution.width'), 960)
+
+	def testResolutionOfTheRenderer(self):
+		cmds.setAttr('defaultRenderGlobals.currentRenderer', 'vray')
+		cmds.setAttr('vraySettings.width', 1920)
+		cmds.setAttr('vraySettings.height', 1080)
+		self.tool.renderAllLights(self.lights[:1])
+		self.assertEqual(self.logged(), set([('interactive', 1920, 1080)]))
+
+
+if __name__ == '__main__':
+	unittest.main()
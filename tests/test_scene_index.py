@@ -0,0 +1,301 @@
+import unittest
+
+from lcmtTestCase import LCMTTestCase, cmds, lcmt
+
+
+class StandInOpenMaya(object):
+	"""Enough of maya.api.OpenMaya for the scene index to register its callbacks, every
+	callback is recorded as (message, node). Nodes are their names, tests call the
+	callbacks themselves with MObject(name) and MPlug(name, attribute)."""
+
+	def __init__(self):
+		self.callbacks = []
+		stand = self
+
+		def register(message):
+			def add(*args):
+				node = None
+				if args and isinstance(args[0], str):
+					node = args[0]
+				stand.callbacks.append((message, node))
+				return len(stand.callbacks)
+			return staticmethod(add)
+
+		class MMessage(object):
+			@staticmethod
+			def removeCallbacks(ids):
+				for callbackId in ids:
+					stand.callbacks[callbackId - 1] = None
+
+		class MSceneMessage(object):
+			addCallback = register('scene')
+			addStringArrayCallback = register('plugin')
+		for index, name in enumerate(('kBeforeOpen', 'kBeforeNew', 'kBeforeImport', 'kBeforeCreateReference', 'kBeforeLoadReference',
+									'kBeforeUnloadReference', 'kBeforeRemoveReference', 'kAfterOpen', 'kAfterNew', 'kAfterImport',
+									'kAfterCreateReference', 'kAfterLoadReference', 'kAfterUnloadReference', 'kAfterRemoveReference',
+									'kAfterPluginLoad', 'kAfterPluginUnload')):
+			setattr(MSceneMessage, name, index)
+
+		class MDGMessage(object):
+			addNodeAddedCallback = register('nodeAdded')
+			addNodeRemovedCallback = register('nodeRemoved')
+			addConnectionCallback = register('connection')
+
+		class MNodeMessage(object):
+			kAttributeSet = 1
+			addNameChangedCallback = register('nameChanged')
+			addAttributeChangedCallback = register('attributeChanged')
+
+		class MDagMessage(object):
+			addParentAddedCallback = register('parentAdded')
+			addWorldMatrixModifiedCallback = register('worldMatrix')
+
+		class MFn(object):
+			kDagNode = 'dagNode'
+			kShadingEngine = 'shadingEngine'
+
+		class MObject(str):
+			def hasFn(self, fn):
+				return fn in cmds.nodeType(self, inherited=True)
+
+		class MPlug(object):
+			def __init__(self, node, attribute):
+				self.object = MObject(node)
+				self.attribute = attribute
+
+			def node(self):
+				return self.object
+
+			def partialName(self, **kwargs):
+				return self.attribute
+
+			def asDouble(self):
+				return float(cmds.scene.get(self.object).attributes[self.attribute])
+
+		class MFnDependencyNode(object):
+			def __init__(self, node):
+				self.node = node
+
+			def name(self):
+				return str(self.node)
+
+			def findPlug(self, attribute, wantNetworkedPlug):
+				return MPlug(self.node, attribute)
+
+		class MFnDagNode(MFnDependencyNode):
+			def partialPathName(self):
+				return str(self.node)
+
+		class MSelectionList(object):
+			def __init__(self):
+				self.names = []
+
+			def add(self, name):
+				self.names.append(name)
+
+			def length(self):
+				return len(self.names)
+
+			def getDependNode(self, index):
+				return MObject(self.names[index])
+
+			def getDagPath(self, index):
+				return MObject(self.names[index])
+
+		class MObjectHandle(object):
+			def __init__(self, node):
+				self.node = node
+
+			def hashCode(self):
+				return hash(self.node)
+
+			def isValid(self):
+				return cmds.objExists(self.node)
+
+			def object(self):
+				return self.node
+
+		self.MMessage = MMessage
+		self.MSceneMessage = MSceneMessage
+		self.MDGMessage = MDGMessage
+		self.MNodeMessage = MNodeMessage
+		self.MDagMessage = MDagMessage
+		self.MSelectionList = MSelectionList
+		self.MObjectHandle = MObjectHandle
+		self.MObject = MObject
+		self.MFn = MFn
+		self.MPlug = MPlug
+		self.MFnDependencyNode = MFnDependencyNode
+		self.MFnDagNode = MFnDagNode
+
+	def watched(self, message):
+		return sorted([callback[1] for callback in self.callbacks if callback != None and callback[0] == message])
+
+
+class SceneIndexWatchersTest(LCMTTestCase):
+	"""The geometry and shading are only watched once there are contributions to keep up to date."""
+
+	def setUp(self):
+		LCMTTestCase.setUp(self)
+		self.om2 = StandInOpenMaya()
+		previous = lcmt.om2
+		lcmt.om2 = self.om2
+		self.addCleanup(setattr, lcmt, 'om2', previous)
+		self.tool = self.newTool()
+		self.addCleanup(self.tool.close)
+		self.index = self.tool.sceneIndex
+
+	def testListingTheSceneOnlyWatchesTheLights(self):
+		self.index.getLights()
+		self.index.invalidate()
+		self.index.getGeometry()
+		self.assertEqual(self.om2.watched('worldMatrix'), [])
+		self.assertFalse(set(self.index.getGeometry()) & set(self.om2.watched('attributeChanged')))
+
+	def testARenderStartsWatchingTheGeometry(self):
+		lights = self.index.getLights(visibleOnly=True)
+		self.tool.renderAllLights(lights[:2], False, preview=True)
+		self.assertFalse(self.index.watchingScene)
+		self.tool.renderAllLights(lights[:2], False)
+		self.assertTrue(self.index.watchingScene)
+		self.assertEqual(self.om2.watched('worldMatrix'), self.index.getGeometry())
+		#listed again, every shape is watched once
+		self.index.invalidate()
+		geometry = self.index.getGeometry()
+		self.assertEqual(self.om2.watched('worldMatrix'), geometry)
+
+	def testOnlyTheGeometryTheContributionsLightIsWatched(self):
+		lights = self.index.getLights(visibleOnly=True)
+		geometry = self.index.getGeometry()
+		for light in lights[:2]:
+			cmds.scene.lightLinks[light] = geometry[:3]
+		self.tool.renderAllLights(lights[:2], False)
+		self.assertEqual(self.om2.watched('worldMatrix'), geometry[:3])
+		#the contributions rendered next light the rest
+		self.tool.renderAllLights(lights[2:4], False)
+		self.assertEqual(self.om2.watched('worldMatrix'), geometry)
+
+	def testClosingStopsWatching(self):
+		self.index.watchScene(self.index.getGeometry())
+		self.tool.close()
+		self.assertFalse(self.index.watchingScene)
+		self.assertEqual([callback for callback in self.om2.callbacks if callback != None], [])
+
+
+class SceneChangesTest(LCMTTestCase):
+	"""Only the edits of the geometry the contributions light and of its shading make them all dirty."""
+
+	def setUp(self):
+		LCMTTestCase.setUp(self)
+		self.om2 = StandInOpenMaya()
+		previous = lcmt.om2
+		lcmt.om2 = self.om2
+		self.addCleanup(setattr, lcmt, 'om2', previous)
+		self.tool = self.newTool()
+		self.addCleanup(self.tool.close)
+		self.index = self.tool.sceneIndex
+		lights = self.index.getLights(visibleOnly=True)
+		self.geometry = self.index.getGeometry()
+		for light in lights[:2]:
+			cmds.scene.lightLinks[light] = self.geometry[:3]
+		self.tool.renderAllLights(lights[:2], False)
+		self.assertEqual(self.tool.dirtyContributions(), [])
+
+	def add(self, node):
+		self.index.nodeAdded(self.om2.MObject(node))
+
+	def connect(self, source, destination):
+		self.index.connectionChanged(self.om2.MPlug(*source.split('.')), self.om2.MPlug(*destination.split('.')), True)
+
+	def testAddingUnrelatedNodesKeepsTheContributionsClean(self):
+		light = cmds.shadingNode('pointLight', asLight=True)
+		self.add(light)
+		self.add(cmds.listRelatives(light, children=True)[0])
+		camera = cmds.createNode('transform', name='shotCam')
+		self.add(camera)
+		self.add(cmds.createNode('camera', name='shotCamShape', parent=camera))
+		cmds.setAttr('shotCamShape.renderable', False)
+		self.connect(camera + '.translate', light + '.translate')
+		self.assertEqual(self.tool.dirtyContributions(), [])
+		self.index.geometryMoved()
+		self.assertEqual(len(self.tool.dirtyContributions()), 2)
+
+	def testAddingGeometryMakesThemDirty(self):
+		transform = cmds.createNode('transform', name='newGeo')
+		self.add(transform)
+		self.add(cmds.createNode('mesh', name='newGeoShape', parent=transform))
+		self.assertEqual(len(self.tool.dirtyContributions()), 2)
+
+	def testConnectionsOfTheGeometryTheyDontLight(self):
+		shadingGroup = cmds.createNode('shadingEngine', name='chromeSG')
+		self.connect(self.geometry[-1] + '.instObjGroups', shadingGroup + '.dagSetMembers')
+		self.assertEqual(self.tool.dirtyContributions(), [])
+		self.connect(self.geometry[0] + '.instObjGroups', shadingGroup + '.dagSetMembers')
+		self.assertEqual(len(self.tool.dirtyContributions()), 2)
+		#the shading group is watched from then on
+		self.assertTrue(self.index.isWatched(self.om2.MObject(shadingGroup)))
+
+
+class SceneIndexNamesTest(LCMTTestCase):
+	"""The messages give the short name of a node, the index keeps the name ls gives it."""
+
+	def setUp(self):
+		LCMTTestCase.setUp(self)
+		self.tool = self.newTool()
+		self.index = self.tool.sceneIndex
+		self.lights = self.index.getLights()
+
+	def keepByPath(self):
+		#a duplicated light rig: ls names its lights by path, names are unique in the stand-in scene
+		light = self.lights[0]
+		path = '|rig|' + light
+		self.index.lightInfo[path] = self.index.lightInfo.pop(light)
+		self.index.pathNames.add(light)
+		self.index.changed()
+		return light, path
+
+	def testRemovingANodeKeptByPath(self):
+		light, path = self.keepByPath()
+		self.index.removeNode(light)
+		self.assertTrue(self.index.dirty)
+		self.assertEqual(self.index.getLights(), self.lights)
+
+	def testRenamingAParentOfANodeKeptByPath(self):
+		self.keepByPath()
+		self.index.renameNode('rig', 'rigA')
+		self.assertTrue(self.index.dirty)
+
+	def testRenamingToANameThatIsNotUnique(self):
+		self.index.renameNode('group1', 'rig|group1')
+		self.assertTrue(self.index.dirty)
+
+	def testUniqueNamesAreRenamedInPlace(self):
+		light = self.lights[0]
+		transform = self.index.lightTransform(light)
+		self.index.renameNode(transform, cmds.rename(transform, 'hero'))
+		self.assertFalse(self.index.dirty)
+		self.assertEqual(self.index.lightTransform(light), 'hero')
+
+	def testHidingAGroupAboveALight(self):
+		light = self.lights[0]
+		visible = self.index.getLights(visibleOnly=True)
+		groups = self.index.getGroups(visibleOnly=True)
+		self.assertTrue(light in visible)
+		#parented under a group node, the stand-in has no parent command
+		group = cmds.scene.get(cmds.createNode('transform', name='rig'))
+		transform = cmds.scene.get(self.index.lightTransform(light))
+		transform.parent = group
+		group.children.append(transform)
+		cmds.hide('rig')
+		self.assertEqual(self.index.getLights(visibleOnly=True), [name for name in visible if name != light])
+		self.assertFalse(light in sum(self.index.getGroups(visibleOnly=True).values(), []))
+		self.assertTrue(light in sum(groups.values(), []))
+
+	def testCloseRemovesTheListeners(self):
+		self.tool.close()
+		self.assertTrue(self.index.dirty)
+		self.assertFalse([owner for owner, methodName in self.tool.rendererRegistry.listeners if owner() is self.tool])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+from lcmtTestCase import LCMTTestCase, cmds, lcmt
+
+
+class UpdateContributionsTest(LCMTTestCase):
+	"""Without OpenMaya the changed contributions are found from their render cache keys."""
+
+	lightCount = 24
+	names = 'keyword'
+
+	def setUp(self):
+		LCMTTestCase.setUp(self)
+		self.tool = self.newTool()
+		self.tool.useRenderCache = True
+		self.tool.saveImages = True
+		self.lights = self.tool.sceneIndex.getLights(visibleOnly=True)
+		self.groups = self.tool.groupLights(self.lights)
+
+	def render(self, useGroups=True):
+		self.tool.renderAllLights(self.lights, useGroups)
+		self.tool.imageWriter.wait()
+
+	def testGroupsAreKeptLikeTheSavedContributions(self):
+		self.render()
+		self.assertEqual(sorted(self.tool.renderedContributions), sorted(self.tool.contributions))
+		self.assertEqual(sorted(self.tool.renderedContributions), sorted([self.tool.contributionName(lights) for lights in self.groups.values()]))
+
+	def testOnlyTheChangedGroupIsDirty(self):
+		self.render()
+		self.assertEqual(self.tool.dirtyContributions(), [])
+		lights = self.groups.values()[0]
+		cmds.setAttr(lights[0] + '.intensity', 3.0)
+		self.assertEqual(self.tool.dirtyContributions(), [self.tool.contributionName(lights)])
+
+	def testUpdatedWithTheGroupingTheyWereRenderedWith(self):
+		self.render()
+		rendered = sorted(self.tool.renderedContributions)
+		self.tool.setGroupingKeys(('type',))
+		#a keyword group with lights of several types would be split by type
+		lights = [lights for lights in self.groups.values() if len(set([cmds.objectType(light) for light in lights])) > 1][0]
+		cmds.setAttr(lights[0] + '.intensity', 3.0)
+		self.assertEqual(self.tool.updateContributions(), [self.tool.contributionName(lights)])
+		self.assertEqual(sorted(self.tool.renderedContributions), rendered)
+		self.assertEqual(self.tool.dirtyContributions(), [])
+
+	def testRefinedWithTheGroupingTheyWerePreviewedWith(self):
+		self.tool.renderAllLights(self.lights, True, preview=True)
+		self.tool.setGroupingKeys(('type',))
+		self.tool.refineContributions()
+		self.assertEqual(sorted(self.tool.renderedContributions), sorted([self.tool.contributionName(lights) for lights in self.groups.values()]))
+
+	def testGeometryIsNotFingerprintedWithTheCacheOff(self):
+		self.tool.useRenderCache = False
+		cmds.scene.calls.clear()
+		self.render()
+		self.assertEqual(self.tool.dirtyContributions(), sorted(self.tool.renderedContributions))
+		for command in ('exactWorldBoundingBox', 'listHistory', 'listAttr'):
+			self.assertFalse(command in cmds.scene.calls, command)
+
+	def testDeletedLightsForgetTheirContribution(self):
+		self.render(False)
+		light = self.lights[0]
+		name = self.tool.contributionName(light)
+		self.assertTrue(name in self.tool.contributions)
+		cmds.delete(cmds.listRelatives(light, p=1)[0])
+		self.tool.dirtyContributions()
+		self.assertFalse(name in self.tool.renderedContributions)
+		self.assertFalse(name in self.tool.contributions)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+from lcmtTestCase import LCMTTestCase, cmds, lcmt
+
+
+class VirtualListTest(LCMTTestCase):
+
+	def setUp(self):
+		LCMTTestCase.setUp(self)
+		self.changes = []
+		self.view = lcmt.VirtualList(pageSize=2, selectCommand=lambda added, removed: self.changes.append((added, removed)))
+		self.view.create()
+		self.view.setItems(['rimShape', 'keyShape', 'fillShape', 'kickShape', 'Key2Shape'])
+
+	def pick(self, names):
+		#what the artist sees selected in the page shown
+		cmds.iconTextScrollList(self.view.control, edit=True, selectItem=names)
+		self.view.selectionChanged()
+
+	def pageText(self):
+		return cmds.text(self.view.pageText, query=True, label=True)
+
+	def testPrefixAndSubstringSearch(self):
+		self.view.setFilter('k')
+		self.assertEqual(self.view.matches, ['Key2Shape', 'keyShape', 'kickShape'])
+		self.view.setFilter('ke')
+		self.assertEqual(self.view.matches, ['Key2Shape', 'keyShape'])
+		self.view.setFilter('ick', substring=True)
+		self.assertEqual(self.view.matches, ['kickShape'])
+		self.view.setFilter('zz')
+		self.assertEqual(self.pageText(), 'No matches')
+
+	def testPages(self):
+		self.assertEqual(self.view.pageItems, ['fillShape', 'Key2Shape'])
+		self.assertEqual(self.pageText(), '1-2 of 5')
+		self.view.page(1)
+		self.view.page(1)
+		self.assertEqual(self.view.pageItems, ['rimShape'])
+		self.view.page(1)
+		self.assertEqual(self.pageText(), '5-5 of 5')
+
+	def testSelectionOutOfSightIsCounted(self):
+		self.pick(['fillShape'])
+		self.view.setFilter('r')
+		self.assertEqual(self.view.pageItems, ['rimShape'])
+		self.assertEqual(self.pageText(), '1-1 of 1, 1 selected')
+		self.pick(['rimShape'])
+		self.assertEqual(self.view.selection(), ['fillShape', 'rimShape'])
+		self.assertEqual(self.pageText(), '1-1 of 1, 2 selected')
+		self.assertEqual(self.changes, [(['fillShape'], []), (['rimShape'], [])])
+
+	def testClearSelection(self):
+		self.pick(['fillShape', 'Key2Shape'])
+		self.view.setFilter('r')
+		self.view.clearSelection()
+		self.assertEqual(self.view.selection(), [])
+		self.assertEqual(self.pageText(), '1-1 of 1')
+		self.assertEqual(self.changes[-1], ([], ['fillShape', 'Key2Shape']))
+
+	def testRemovedItemsAreNotSelected(self):
+		self.pick(['fillShape', 'Key2Shape'])
+		self.view.setItems(['keyShape', 'Key2Shape'])
+		self.assertEqual(self.view.selection(), ['Key2Shape'])
+
+	def testToolLists(self):
+		tool = self.newTool()
+		listName = tool.virtualList()
+		self.assertTrue(isinstance(tool.virtualLists[listName], lcmt.VirtualList))
+		self.assertEqual(tool.getScrollListSelection(listName), None)
+
+
+if __name__ == '__main__':
+	unittest.main()